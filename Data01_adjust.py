@@ -0,0 +1,179 @@
+# """
+# 复权价格与派生序列：导入日线后按股票计算，写入伴随表 stock_<代码>_adj（合并表结构为 stock_adj）。
+#   adj_factor           累计复权因子
+#   open/high/low/close_hfq  后复权价格 = 价格 × 因子
+#   open/high/low/close_qfq  前复权价格 = 后复权价格 ÷ 最新因子
+#   log_ret / cum_log_ret    对数收益率 ln(收盘 / 昨收) 及其累计
+# 复权因子取自日线文件的 adj_factor 列（下载时由 adj_factor 接口获取）；缺失时由 前一日收盘 / 当日昨收 推算，
+# tushare 的昨收价已按除权除息调整，两者之比就是当天因子的变化。
+# 计算全部为NumPy向量运算。新行到来时只计算表尾：后复权价格和累计收益只依赖之前的行；
+# 最新因子变化（出现新的除权除息）时前复权价格整体按新因子缩放，用一条 UPDATE 完成；
+# 日线表的历史行被修订或补入了更早的行时，整只股票重新计算。
+# """
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import Data01_config
+import Data01_db_utils
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+# 判断最新复权因子是否变化时允许的相对误差
+FACTOR_TOLERANCE = 1e-9
+
+
+def _date_key(value):
+    # 日线文件中的日期为 'YYYYMMDD' 文本，MySQL 的 DATE 列返回 date 对象
+    return value.strftime('%Y%m%d') if isinstance(value, date) else str(value)
+
+
+def _date_keys(series):
+    if len(series) and isinstance(series.iloc[0], date):
+        return series.map(_date_key)
+    return series.astype(str)
+
+
+def _where(*conditions):
+    conditions = [cond for cond in conditions if cond]
+    return f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+
+def adjust_factors(close, pre_close, known):
+#     """
+#     补全复权因子。known 为已知因子（未知为NaN），与 close / pre_close 按日期升序对齐。
+#     未知的因子由相邻的已知因子乘以 前一日收盘 / 当日昨收 的连乘推算；全部未知时以第一行为1。
+#     """
+    ratio = np.ones(len(close))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio[1:] = close[:-1] / pre_close[1:]
+    ratio[~np.isfinite(ratio) | (ratio <= 0)] = 1.0
+    chain = np.cumprod(ratio)
+    # 每个已知因子确定一段连乘的比例，向后填充到下一个已知因子，最前面一段用第一个已知因子
+    anchor = pd.Series(known / chain).ffill().bfill().fillna(1.0).to_numpy()
+    return np.where(np.isnan(known), anchor * chain, known)
+
+
+def compute_adjusted(prices, known):
+#     """
+#     计算一只股票的派生序列。
+#     参数:
+#         prices: 按日期升序的DataFrame，包含 open, high, low, close, pre_close（float）
+#         known: 已知的复权因子数组（未知为NaN）
+#     返回:
+#         DataFrame，列为 ADJ_COLUMNS 中除 trade_date / ts_code 以外的列；
+#         前复权以最后一行的因子为基准，cum_log_ret 从第一行开始累计
+#     """
+    close = prices['close'].to_numpy(dtype=np.float64)
+    pre_close = prices['pre_close'].to_numpy(dtype=np.float64)
+    factors = adjust_factors(close, pre_close, np.asarray(known, dtype=np.float64))
+    latest = factors[-1] if len(factors) else 1.0
+    out = {'adj_factor': factors}
+    for col in PRICE_COLUMNS:
+        hfq = prices[col].to_numpy(dtype=np.float64) * factors
+        out[f'{col}_hfq'] = hfq
+        out[f'{col}_qfq'] = hfq / latest
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_ret = np.log(close / pre_close)
+    log_ret[~np.isfinite(log_ret)] = np.nan
+    out['log_ret'] = log_ret
+    out['cum_log_ret'] = np.nancumsum(log_ret)
+    return pd.DataFrame(out, index=prices.index)
+
+
+def _file_factors(df, keys):
+    # 导入文件中的 adj_factor 列按日期对齐到 keys，没有该列时全部为NaN
+    if df is None or 'adj_factor' not in df.columns or 'trade_date' not in df.columns:
+        return np.full(len(keys), np.nan)
+    factors = pd.Series(pd.to_numeric(df['adj_factor'], errors='coerce').to_numpy(),
+                        index=_date_keys(df['trade_date']))
+    factors = factors[~factors.index.duplicated(keep='last')]
+    return factors.reindex(keys).to_numpy(dtype=np.float64, copy=True)
+
+
+def update_adjusted(conn, stock_code, df=None, full=False, commit=True):
+#     """
+#     导入日线后更新一只股票的复权价格伴随表（由 Data01_db_utils.import_day_data 调用）。
+#     参数:
+#         stock_code: 分表结构下为表名中的6位代码
+#         df: 刚导入的日线数据，提供 adj_factor 列（可选）
+#         full: True 时整只股票重新计算
+#         commit: False 时写入调用方的事务而不提交
+#     返回:
+#         dict，包含 table, rows（写入行数）, mode（'tail' 或 'full'）, rescaled（前复权是否整体缩放）, seconds
+#     """
+    start = time.perf_counter()
+    table = Data01_db_utils.create_adj_table_if_not_exists(conn, stock_code, commit)
+    ph = '?' if Data01_config.DB_TYPE == "sqlite" else '%s'
+    ts_code = stock_code
+    if df is not None and 'ts_code' in df.columns and df['ts_code'].notna().any():
+        ts_code = df['ts_code'].dropna().iloc[0]
+    if Data01_config.DB_SCHEMA == "consolidated":
+        base = Data01_db_utils.CONSOLIDATED_DAY_TABLE
+        cond, params = f"ts_code = {ph}", (ts_code,)
+    else:
+        base = f"stock_{stock_code}_day"
+        cond, params = None, ()
+    cursor = conn.cursor()
+
+    # 一次查询取得伴随表的最后一行，以及两张表中截至该日期的行数（不一致说明日线表有修订或补入）
+    last = None
+    if not full:
+        cursor.execute(
+            f"SELECT t.trade_date, t.adj_factor, t.cum_log_ret, "
+            f"(SELECT COUNT(*) FROM {table}{_where(cond)}), "
+            f"(SELECT COUNT(*) FROM {base}{_where(cond, 'trade_date <= t.trade_date')}) "
+            f"FROM {table} t{_where(cond and f't.{cond}')} ORDER BY t.trade_date DESC LIMIT 1",
+            (*params, *params, *params))
+        row = cursor.fetchone()
+        if row is not None and row[3] == row[4]:
+            last = row
+    mode = 'full' if last is None else 'tail'
+
+    # 表尾计算从伴随表的最后一行开始读，该行提供已存储的因子与累计收益
+    if last is None:
+        where, where_params = _where(cond), params
+    else:
+        where, where_params = _where(cond, f"trade_date >= {ph}"), (*params, last[0])
+    cursor.execute(f"SELECT trade_date, open, high, low, close, pre_close, ts_code FROM {base}{where} "
+                   f"ORDER BY trade_date", where_params)
+    prices = pd.DataFrame.from_records(cursor.fetchall(), columns=['trade_date', *PRICE_COLUMNS, 'pre_close', 'ts_code'])
+    if len(prices) <= (1 if last is not None else 0):
+        return {'table': table, 'rows': 0, 'mode': mode, 'rescaled': False,
+                'seconds': time.perf_counter() - start}
+    for col in [*PRICE_COLUMNS, 'pre_close']:
+        prices[col] = pd.to_numeric(prices[col], errors='coerce').astype(np.float64)
+    keys = _date_keys(prices['trade_date'])
+
+    known = _file_factors(df, keys)
+    if last is not None:
+        known[0] = last[1]
+    else:
+        # 整只股票重新计算时保留已存储的因子（历史因子不随新的除权除息改变），文件中的因子优先
+        cursor.execute(f"SELECT trade_date, adj_factor FROM {table}{_where(cond)}", params)
+        stored = pd.Series(dict((_date_key(day), factor) for day, factor in cursor.fetchall()), dtype=np.float64)
+        if len(stored):
+            known = np.where(np.isnan(known), stored.reindex(keys).to_numpy(dtype=np.float64), known)
+
+    derived = compute_adjusted(prices, known)
+    derived.insert(0, 'trade_date', prices['trade_date'])
+    derived['ts_code'] = prices['ts_code'].fillna(ts_code)
+
+    rescaled = False
+    if last is not None:
+        # 第一行是已存储的最后一行：只写入之后的行，累计收益接在已存储的值之后
+        derived['cum_log_ret'] += (last[2] or 0.0) - derived['cum_log_ret'].iloc[0]
+        derived = derived.iloc[1:]
+        latest = derived['adj_factor'].iloc[-1]
+        if last[1] is None or abs(latest - last[1]) > FACTOR_TOLERANCE * abs(latest):
+            # 出现新的除权除息：已存储行的前复权价格按新的最新因子整体缩放
+            assignments = ', '.join(f"{col}_qfq = {col}_hfq / {ph}" for col in PRICE_COLUMNS)
+            cursor.execute(f"UPDATE {table} SET {assignments}{_where(cond)}",
+                           (*[float(latest)] * len(PRICE_COLUMNS), *params))
+            rescaled = True
+
+    stats = Data01_db_utils.upsert_dataframe(conn, table, derived, Data01_db_utils.ADJ_COLUMNS, commit=commit)
+    Data01_db_utils.notify_write(stock_code, 'adj')
+    return {'table': table, 'rows': stats['rows'], 'mode': mode, 'rescaled': rescaled,
+            'seconds': time.perf_counter() - start}
@@ -0,0 +1,404 @@
+# """
+# 无界面批处理：不依赖 PyQt6，按股票清单完成 下载 → 保存文件 → 导入数据库 全流程，
+# 可由 cron / 任务计划程序在没有显示器的服务器上定时运行。
+# 用法：
+#   python Data01_batch.py --stock-list 股票清单.xlsx [--start 20240101 --end 20241231]
+#                          [--workers 8] [--parser-workers 4] [--db sqlite|mysql|mssql] [--report run.json]
+#   python Data01_batch.py --resume          继续最近一个未完成的下载作业
+#   python Data01_batch.py --retry-failed    重试最近一个作业中失败的任务
+#   加 --indicators 时导入后增量更新技术指标表（Data01_indicators）
+# 运行结束写出JSON运行报告（各阶段用时、数量与失败明细）；有任务失败时退出码为1，整体出错为2。
+# 下载与导入各自另写一个指标文件（Data01_metrics：接口按接口名的调用次数与用时、写文件、解析、写库等），
+# 路径记在报告的 metrics_file 中。
+# 数据库密码可用环境变量 STOCK_DB_PASSWORD 传入，避免出现在命令行中。
+# """
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+import Data01_config
+import Data01_file_utils
+import Data01_tushare_utils
+import Data01_download_engine
+import Data01_download_journal
+import Data01_sync_planner
+import Data01_db_utils
+import Data01_import_pipeline
+import Data01_indicators
+import Data01_metrics
+import Data01_quality
+
+
+class DownloadRunner:
+#    """
+#    下载流程：增量规划 → 作业日志 → 并发下载 → 覆盖清单与Excel日志。与界面无关，Form1 的下载线程也使用它。
+#    log(message) 输出日志；progress(current, total, elapsed_seconds) 报告进度；
+#    metrics(snapshot) 接收本次运行的指标快照（Data01_metrics.snapshot），运行中最多每 METRICS_EMIT_SECONDS 秒一次，
+#    结束时再给出最终快照。剩余时间由 Data01_metrics.eta('download') 按实测的接口请求吞吐量估算。
+#    action: None 按股票清单新建下载作业；'resume' 继续最近一个作业中未完成的任务；
+#    'retry' 同时重试其中失败的任务。
+#    """
+    def __init__(self, save_dir, action=None, workers=None, log=print, progress=None, pro=None, metrics=None):
+        self.save_dir = save_dir
+        self.action = action
+        self.workers = workers
+        self.log = log
+        self.progress = progress
+        self.metrics = metrics
+        self.pro = pro
+        self.scheduler = None
+        self.stopped = threading.Event()
+        self.checkpoint = None
+        self.metrics_emitted = 0.0
+
+    def stop(self):
+        """请求停止下载，已完成的任务和分钟数据窗口保留在作业日志中"""
+        self.stopped.set()
+        if self.scheduler is not None:
+            self.scheduler.stop()
+
+    def load_job_tasks(self, journal):
+        """打开最近一个未完成的作业，返回其待下载任务和对应的清单DataFrame；没有作业时返回None"""
+        info = journal.latest_job()
+        if info is None:
+            self.log("没有未完成的下载作业")
+            return None
+        journal.open_job(info['job_id'])
+        if self.action == 'retry':
+            self.log(f"作业 {info['job_id']}: 重新排队失败任务 {journal.requeue_failed()} 个")
+        tasks = journal.load_tasks()
+        self.log(f"继续作业 {info['job_id']}（{info['created_at']}）: 待下载 {len(tasks)} 个任务，"
+                 f"已完成 {info['done']} 个")
+        stock_list = pd.DataFrame(
+            [(task.stock_code, task.start_date, task.end_date, task.data_type) for task in tasks],
+            columns=['stock_code', 'start_date', 'end_date', 'data_type'])
+        return tasks, stock_list
+
+    def emit_metrics(self, force=False):
+        """把本次运行的指标快照交给 metrics 回调（距上次不足 METRICS_EMIT_SECONDS 秒时跳过，force 除外）"""
+        now = time.monotonic()
+        if self.metrics is None or (not force and now - self.metrics_emitted < Data01_config.METRICS_EMIT_SECONDS):
+            return
+        self.metrics_emitted = now
+        self.metrics(Data01_metrics.snapshot(since=self.checkpoint))
+
+    def finish_metrics(self, report):
+        """运行结束：输出各项用时、写出指标文件（路径记入 report['metrics_file']）并给出最终快照"""
+        snapshot = Data01_metrics.snapshot(since=self.checkpoint)
+        for line in Data01_metrics.summary_lines(snapshot):
+            self.log(f"指标 {line}")
+        try:
+            report['metrics_file'] = Data01_metrics.write_snapshot(snapshot, 'download')
+        except Exception as e:
+            self.log(f"写出指标文件失败: {e}")
+        self.emit_metrics(force=True)
+
+    def run(self, stock_list_df=None):
+        """
+        执行下载，返回统计字典：任务数、成功/失败数、行数、各阶段用时、作业号、
+        成功保存的文件列表 files 和失败明细 failures
+        """
+        start_time = time.time()
+        report = {'job_id': None, 'tasks': 0, 'succeeded': 0, 'failed': 0, 'rows': 0,
+                  'plan_seconds': 0.0, 'download_seconds': 0.0, 'seconds': 0.0,
+                  'files': [], 'failures': [], 'metrics_file': None}
+        self.checkpoint = Data01_metrics.checkpoint()
+        # 初始化tushare
+        if self.pro is None:
+            self.pro = Data01_tushare_utils.init_tushare(Data01_config.TUSHARE_TOKEN)
+
+        # 下载覆盖清单：运行中只在内存中更新并批量落盘，结束时导出一次Excel日志
+        manifest = Data01_file_utils.DownloadManifest()
+        # 作业日志：逐个任务记录完成/失败，分钟数据逐窗口记录，中断后可继续
+        journal = Data01_download_journal.DownloadJournal()
+        try:
+            if self.action:
+                loaded = self.load_job_tasks(journal)
+                if loaded is None:
+                    report['seconds'] = time.time() - start_time
+                    return report
+                tasks, stock_list = loaded
+            else:
+                # 增量规划：只下载日志/数据库尚未覆盖的日期区间
+                stock_list = stock_list_df
+                if Data01_config.SYNC_SOURCE:
+                    stock_list, summary = Data01_sync_planner.plan_downloads(
+                        stock_list_df, source=Data01_config.SYNC_SOURCE, manifest=manifest)
+                    self.log(f"增量规划: 清单 {summary['requested']} 行，已完整覆盖跳过 {summary['skipped']} 只，"
+                             f"部分缺失 {summary['partial']} 只，需下载 {summary['ranges']} 个区间")
+                tasks = Data01_download_engine.build_tasks(stock_list, self.save_dir)
+                journal.create_job(tasks, self.save_dir)
+            report['job_id'] = journal.job_id
+            total = report['tasks'] = len(tasks)
+
+            # 线程池并发下载，按接口令牌桶限流，频率超限自动退避
+            self.scheduler = Data01_download_engine.DownloadScheduler(
+                self.pro, workers=self.workers, log=self.log, journal=journal)
+
+            # 日线获取方式：许多股票×少量交易日时改为按交易日下载全市场，大幅减少调用次数
+            per_stock_tasks = tasks
+            by_date_tasks = []
+            trade_dates = []
+            daily = stock_list[stock_list['data_type'] == '日数据']
+            if Data01_config.DAILY_FETCH_MODE != "per_stock" and not daily.empty:
+                try:
+                    trade_dates = self.scheduler.trade_dates(daily['start_date'].min(), daily['end_date'].max())
+                    by_date, fetch_summary = Data01_sync_planner.choose_fetch_mode(
+                        stock_list, trade_dates, Data01_config.DAILY_FETCH_MODE)
+                    per_stock_tasks = [task for task, flag in zip(tasks, by_date) if not flag]
+                    by_date_tasks = [task for task, flag in zip(tasks, by_date) if flag]
+                    self.log(f"获取方式: 逐股票 {fetch_summary['per_stock_calls']} 次调用，"
+                             f"按交易日 {fetch_summary['by_date_calls']} 次调用覆盖 {fetch_summary['by_date_ranges']} 只，"
+                             f"共 {fetch_summary['calls']} 次（全部逐股票需 {fetch_summary['baseline_calls']} 次）")
+                except Exception as e:
+                    self.log(f"{e}，全部逐股票下载")
+            report['plan_seconds'] = time.time() - start_time
+            Data01_metrics.observe('stage_seconds', report['plan_seconds'], stage='plan')
+
+            self.log(f"开始下载 {total} 只股票，并发数 {self.scheduler.workers}")
+            download_start = time.time()
+            # 工作量（接口请求数）由调度器在提交任务时登记
+            Data01_metrics.start_stage('download')
+            results = iter(())
+            if not self.stopped.is_set():
+                results = itertools.chain(self.scheduler.run(per_stock_tasks),
+                                          self.scheduler.run_by_date(by_date_tasks, trade_dates))
+            for current, result in enumerate(results, start=1):
+                if self.stopped.is_set():
+                    # 下载开始前收到的停止请求会被 run() 清除，这里再次转达
+                    self.scheduler.stop()
+                task = result.task
+                data_type = 'day' if task.data_type == '日数据' else 'min'
+                Data01_metrics.inc('download_tasks_total', data_type=data_type, status='ok' if result.ok else 'failed')
+                if result.ok:
+                    Data01_metrics.inc('download_rows_total', result.rows, data_type=data_type)
+                    # 覆盖清单只在本线程中更新，记录实际下载到的区间：从请求的起始日期到数据中的最新日期，
+                    # 且不晚于最近收盘的交易日（请求的结束日期可能在未来，盘中下载的当天数据也不完整）；
+                    # 没有数据的任务（停牌、没有交易日）整个请求区间已确认为空，同样记为已覆盖
+                    last_date = result.last_date if result.rows else str(task.end_date)
+                    if last_date:
+                        manifest.update(task.stock_code, task.start_date,
+                                        min(last_date, Data01_tushare_utils.last_closed_trade_date()),
+                                        task.data_type)
+                    report['succeeded'] += 1
+                    report['rows'] += result.rows
+                    # 区间内没有交易日或没有数据的任务不写文件
+                    if task.filepath and result.rows:
+                        report['files'].append(task.filepath)
+                    self.log(f"已下载 ({current}/{total}): {task.stock_code}")
+                else:
+                    self.log(f"下载失败: {task.stock_code} {result.error}")
+
+                # 更新进度
+                if self.progress:
+                    self.progress(current, total, time.time() - start_time)
+                self.emit_metrics()
+            report['download_seconds'] = time.time() - download_start
+            Data01_metrics.observe('stage_seconds', report['download_seconds'], stage='download')
+
+            with Data01_metrics.timer('stage_seconds', stage='manifest'):
+                manifest.flush()
+            with Data01_metrics.timer('stage_seconds', stage='excel_log'):
+                for log_file, data_type in ((Data01_config.LOG_DAY_FILE, '日数据'),
+                                            (Data01_config.LOG_MIN_FILE, '分钟数据')):
+                    if any(task.data_type == data_type for task in tasks):
+                        manifest.export_excel(log_file, data_type)
+
+            for stock_code, data_type, reason in journal.failures():
+                self.log(f"失败: {stock_code} {data_type} {reason}")
+                report['failures'].append({'stock_code': stock_code, 'data_type': data_type, 'reason': reason})
+            info = journal.finish_job()
+            report['failed'] = info['failed']
+            report['pending'] = info['pending']
+            self.log(f"作业 {info['job_id']}: 完成 {info['done']}，失败 {info['failed']}，未完成 {info['pending']}")
+        finally:
+            manifest.close()
+            journal.close()
+        report['seconds'] = time.time() - start_time
+        self.finish_metrics(report)
+        return report
+
+
+def import_target(db_type, params=None):
+#     """
+#     返回导入目标 (connect, import_day, import_min, table_for)，供 Data01_import_pipeline.ImportPipeline 使用。
+#     db_type: 'sqlite' / 'mysql' 使用 Data01_db_utils 的导入函数（params 缺省取 Data01_config）；
+#     'mssql' 使用 MERGE 语句逐行写入，params 为 {'server', 'database', 'username', 'password'}。
+#     """
+    if db_type == "sqlite":
+        params = params or {'path': Data01_config.SQLITE_DB_PATH}
+        return (lambda: Data01_db_utils.get_connection_manager("sqlite", params).acquire(),
+                Data01_db_utils.import_day_data, Data01_db_utils.import_min_data, Data01_db_utils.table_for)
+    if db_type == "mysql":
+        params = params or Data01_config.MYSQL_CONFIG
+        return (lambda: Data01_db_utils.connect_mysql(params),
+                Data01_db_utils.import_day_data, Data01_db_utils.import_min_data, Data01_db_utils.table_for)
+    if db_type == "mssql":
+        # MS SQL Server 始终按股票分表
+        return (lambda: Data01_db_utils.connect_mssql(params),
+                Data01_db_utils.import_day_data_mssql, Data01_db_utils.import_min_data_mssql,
+                lambda code, kind: Data01_db_utils.table_for(code, kind, consolidated=False))
+    raise ValueError(f"不支持的数据库类型: {db_type}")
+
+
+def run_import(files, db_type, params=None, parser_workers=None, log=print, force=False):
+#     """
+#     导入数据文件到数据库，返回统计字典：文件数、成功/失败/未变化跳过数、用时、失败明细和质量检查汇总。
+#     自上次导入到同一数据库以来未变化的文件按导入清单跳过，force=True 时全部重新导入。
+#     各项用时见日志与指标文件（metrics_file，由 ImportPipeline 写出）。
+#     """
+    start_time = time.time()
+    connect, import_day, import_min, table_for = import_target(db_type, params)
+    pipeline = Data01_import_pipeline.ImportPipeline(
+        connect, import_day, import_min, parser_workers=parser_workers,
+        target=Data01_db_utils.target_key(db_type, params), table_for=table_for, force=force)
+    failures = []
+
+    def on_done(index, file_path, ok, message):
+        if ok and message:
+            log(f"{os.path.basename(file_path)} {message}")
+        elif ok:
+            log(f"已导入 ({index}/{len(files)}): {os.path.basename(file_path)}")
+        else:
+            log(f"导入失败: {os.path.basename(file_path)} {message}")
+            failures.append({'file': file_path, 'error': message})
+
+    succeeded, failed = pipeline.run(files, on_done=on_done)
+    if pipeline.quality_summary is not None:
+        log(Data01_quality.format_summary(pipeline.quality_summary))
+    for line in Data01_metrics.summary_lines(pipeline.metrics):
+        log(f"指标 {line}")
+    return {'files': len(files), 'succeeded': succeeded, 'failed': failed, 'skipped': pipeline.skipped,
+            'seconds': time.time() - start_time, 'failures': failures, 'quality': pipeline.quality_summary,
+            'metrics_file': pipeline.metrics_file}
+
+
+def run_indicators(db_type, params=None, log=print, rebuild=False):
+#     """导入后增量更新技术指标表，返回统计字典（股票数、写入行数、用时）"""
+    connect = import_target(db_type, params)[0]
+    conn = connect()
+    try:
+        engine = Data01_indicators.IndicatorEngine(conn)
+        return engine.update(rebuild=rebuild, progress=lambda done, total: log(f"技术指标: {done}/{total}"))
+    finally:
+        conn.close()
+
+
+def _db_params(args):
+    # 命令行数据库参数；未指定的项取 Data01_config 中的配置
+    password = args.db_password if args.db_password is not None else os.environ.get("STOCK_DB_PASSWORD")
+    if args.db == "sqlite":
+        return {'path': args.sqlite_path or Data01_config.SQLITE_DB_PATH}
+    if args.db == "mysql":
+        params = dict(Data01_config.MYSQL_CONFIG)
+        for key, value in (('host', args.db_host), ('port', args.db_port), ('user', args.db_user),
+                           ('password', password), ('database', args.db_name)):
+            if value is not None:
+                params[key] = value
+        return params
+    return {'server': args.db_host or '', 'database': args.db_name or '',
+            'username': args.db_user or '', 'password': password or ''}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面批处理：下载股票数据并导入数据库")
+    parser.add_argument("--stock-list", help="股票清单文件（.xlsx / .csv）")
+    job = parser.add_mutually_exclusive_group()
+    job.add_argument("--resume", action="store_true", help="继续最近一个未完成的下载作业")
+    job.add_argument("--retry-failed", action="store_true", help="继续最近的下载作业并重试其中失败的任务")
+    parser.add_argument("--start", help="覆盖清单中的开始日期 YYYYMMDD")
+    parser.add_argument("--end", help="覆盖清单中的结束日期 YYYYMMDD")
+    parser.add_argument("--save-dir", default=Data01_config.STOCK_DATA_DIR, help="数据文件目录")
+    parser.add_argument("--workers", type=int, default=None, help="下载并发线程数")
+    parser.add_argument("--parser-workers", type=int, default=None, help="导入时的解析进程数")
+    parser.add_argument("--skip-download", action="store_true", help="不下载，只导入目录中已有的数据文件")
+    parser.add_argument("--skip-import", action="store_true", help="只下载，不导入数据库")
+    parser.add_argument("--force", action="store_true", help="重新导入全部文件，不跳过自上次导入以来未变化的文件")
+    parser.add_argument("--indicators", action="store_true", help="导入后增量更新技术指标表")
+    parser.add_argument("--rebuild-indicators", action="store_true", help="忽略已保存的指标状态，全部重新计算")
+    parser.add_argument("--db", choices=["sqlite", "mysql", "mssql"], default=Data01_config.DB_TYPE,
+                        help="导入的目标数据库类型")
+    parser.add_argument("--sqlite-path", help="SQLite数据库文件")
+    parser.add_argument("--db-host", help="MySQL主机 / MS SQL Server服务器")
+    parser.add_argument("--db-port", help="MySQL端口")
+    parser.add_argument("--db-user", help="数据库用户名")
+    parser.add_argument("--db-password", help="数据库密码（建议改用环境变量 STOCK_DB_PASSWORD）")
+    parser.add_argument("--db-name", help="数据库名")
+    parser.add_argument("--report", help="JSON运行报告路径，默认写入 <数据目录>/reports/")
+    args = parser.parse_args(argv)
+
+    action = 'resume' if args.resume else 'retry' if args.retry_failed else None
+    if not args.skip_download and action is None and not args.stock_list:
+        parser.error("需要 --stock-list（或使用 --resume / --retry-failed / --skip-download）")
+    if (args.indicators or args.rebuild_indicators) and args.db == "mssql":
+        parser.error("技术指标表只支持 SQLite / MySQL")
+
+    # Data01_db_utils 的建表与导入按 Data01_config.DB_TYPE 区分 SQLite / MySQL
+    if args.db in ("sqlite", "mysql"):
+        Data01_config.DB_TYPE = args.db
+    if args.sqlite_path:
+        Data01_config.SQLITE_DB_PATH = args.sqlite_path
+
+    started = datetime.now()
+    report = {'started_at': started.strftime('%Y-%m-%d %H:%M:%S'),
+              'options': {key: value for key, value in vars(args).items() if key != 'db_password'},
+              'db': args.db, 'stages': {}, 'exit_code': 0}
+    report_path = args.report or os.path.join(
+        args.save_dir, "reports", f"run_report_{started.strftime('%Y%m%d_%H%M%S')}.json")
+    log = lambda message: print(message, flush=True)
+    try:
+        Data01_file_utils.ensure_dir(args.save_dir)
+        files = None
+        if not args.skip_download:
+            stock_list = None
+            if action is None:
+                stage_start = time.time()
+                stock_list = Data01_file_utils.read_stock_list(args.stock_list)
+                if args.start:
+                    stock_list['start_date'] = args.start
+                if args.end:
+                    stock_list['end_date'] = args.end
+                report['stages']['read_stock_list'] = {'rows': len(stock_list),
+                                                       'seconds': time.time() - stage_start}
+            runner = DownloadRunner(args.save_dir, action, workers=args.workers, log=log)
+            download = runner.run(stock_list)
+            files = download.pop('files')
+            report['stages']['download'] = download
+            if download['failed'] or download.get('pending'):
+                report['exit_code'] = 1
+
+        if not args.skip_import:
+            if files is None:
+                files = Data01_file_utils.get_data_files(args.save_dir)
+            imported = run_import(files, args.db, _db_params(args), args.parser_workers, log, args.force)
+            report['stages']['import'] = imported
+            if imported['failed']:
+                report['exit_code'] = 1
+
+        if args.indicators or args.rebuild_indicators:
+            report['stages']['indicators'] = run_indicators(args.db, _db_params(args), log,
+                                                            rebuild=args.rebuild_indicators)
+    except Exception as e:
+        log(f"运行失败: {e}")
+        report['error'] = str(e)
+        report['exit_code'] = 2
+
+    finished = datetime.now()
+    report['finished_at'] = finished.strftime('%Y-%m-%d %H:%M:%S')
+    report['seconds'] = (finished - started).total_seconds()
+    Data01_file_utils.ensure_dir(os.path.dirname(os.path.abspath(report_path)))
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    log(f"运行报告: {report_path}")
+    return report['exit_code']
+
+
+if __name__ == '__main__':
+    sys.exit(main())
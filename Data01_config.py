@@ -9,20 +9,145 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # 下载数据存储文件夹
 STOCK_DATA_DIR = os.path.join(BASE_DIR, "002_StockDownLoad")
 
+# 下载数据的存储格式：
+#   "csv"     - utf-8-sig 文本（默认，兼容旧流程）
+#   "parquet" - 列式、带类型、压缩（需安装 pyarrow）
+#   "feather" - 列式、带类型、读写最快（需安装 pyarrow）
+STORAGE_FORMAT = "csv"
+# 列式格式的压缩算法（parquet: "zstd"/"snappy"；feather: "zstd"/"lz4"）
+STORAGE_COMPRESSION = "zstd"
+
 # 日志文件（Excel格式）
 LOG_DAY_FILE = os.path.join(STOCK_DATA_DIR, "002_StockDownLoad_log_day.xlsx")
 LOG_MIN_FILE = os.path.join(STOCK_DATA_DIR, "002_StockDownLoad_log_min.xlsx")
+# 下载覆盖清单（SQLite），运行中更新，结束时再导出上面的Excel日志
+MANIFEST_DB_PATH = os.path.join(STOCK_DATA_DIR, "002_StockDownLoad_manifest.db")
+# 下载作业日志（断点续传）：每个任务的状态、失败原因、分钟数据已完成的时间窗口
+JOURNAL_DB_PATH = os.path.join(STOCK_DATA_DIR, "002_StockDownLoad_jobs.db")
+# 数据文件索引（Form2文件列表）：按 (路径, 修改时间, 大小) 缓存的行数/日期范围，以及各文件的导入记录
+FILE_INDEX_DB_PATH = os.path.join(STOCK_DATA_DIR, "002_StockDownLoad_files.db")
 
 # tushare token，建议从环境变量获取，避免硬编码
 # 可以在系统环境变量中设置 TUSHARE_TOKEN
-TUSHARE_TOKEN = os.environ.get("TUSHARE_TOKEN", "你的默认token")
-if not TUSHARE_TOKEN:
-    raise ValueError("TUSHARE_TOKEN  未在 .env 文件中设置")
+# Data01_config.TUSHARE_TOKEN 在首次访问（开始下载）时才读取和检查，导入配置本身不需要token
+DEFAULT_TUSHARE_TOKEN = "你的默认token"
+
+
+def get_tushare_token():
+    token = os.environ.get("TUSHARE_TOKEN", DEFAULT_TUSHARE_TOKEN)
+    if not token:
+        raise ValueError("TUSHARE_TOKEN  未在 .env 文件中设置")
+    return token
+
+
+def __getattr__(name):
+    # 模块级 __getattr__：只对未定义的属性调用，用于延迟读取 TUSHARE_TOKEN
+    if name == "TUSHARE_TOKEN":
+        return get_tushare_token()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# 下载并发配置
+# 同时下载的线程数
+DOWNLOAD_WORKERS = 4
+# 各接口每分钟允许的调用次数（令牌桶限流），未列出的接口使用默认值
+API_RATE_LIMITS = {
+    "daily": 500,
+}
+DEFAULT_CALLS_PER_MINUTE = 200
+# 分钟数据：K线周期（1min/5min/15min/30min/60min）与 stk_mins 单次返回的最大行数（超出部分被截断）
+MIN_FREQ = "1min"
+MIN_ROW_LIMIT = 8000
+# 下载日线时同时调用 adj_factor 接口，把复权因子作为 adj_factor 列保存在日线文件中
+DOWNLOAD_ADJ_FACTOR = True
+# 遇到频率超限时的最大重试次数及初始退避秒数（指数增长）
+DOWNLOAD_MAX_RETRIES = 5
+DOWNLOAD_BACKOFF_SECONDS = 2.0
+
+# tushare响应磁盘缓存：已收盘的历史区间永久缓存，包含当天的区间缓存 TTL 秒
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_PATH = os.path.join(BASE_DIR, "cache", "tushare_cache.db")
+RESPONSE_CACHE_MAX_MB = 512
+RESPONSE_CACHE_TTL_SECONDS = 600
+
+# 增量下载规划：已覆盖的日期区间来源，可选 "log"、"db"、"both"，None 表示关闭（总是全量下载）
+SYNC_SOURCE = "both"
+
+# 日线获取方式："auto"（按 股票数×天数 自动选择调用次数最少的方式）、
+# "per_stock"（每只股票调用一次 pro.daily）、"by_date"（每个交易日调用一次全市场 pro.daily）
+DAILY_FETCH_MODE = "auto"
+
+# CSV导入流水线：解析进程数、预解析队列长度（同时在途的文件数）
+IMPORT_PARSER_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+IMPORT_QUEUE_SIZE = 8
+# 大文件流式导入：不小于该大小（MB）的文件按块读取、逐块写库（整个文件仍为一个事务），
+# 峰值内存只与块大小有关；0 表示所有文件都流式导入
+IMPORT_STREAM_THRESHOLD_MB = 64
+# 流式导入每块读取的行数
+IMPORT_CHUNK_ROWS = 100000
+# 写库方式：
+#   "append" - 先用一次查询取得表中最新的几行（键与收盘价/成交量指纹），只写入比表中最新键更新的行；
+#              发现历史数据被修订（指纹不同或重叠区间行数不一致）时自动退回整体upsert
+#   "upsert" - 每次整体 INSERT OR REPLACE / REPLACE INTO / MERGE 文件中的全部行
+IMPORT_MODE = "append"
+# append 模式比对的表尾行数
+IMPORT_APPEND_TAIL_ROWS = 5
+# 写库前的数据质量检查（Data01_quality）：不合格的行（最高价低于最低价、收盘价超出高低区间、
+# 涨跌幅与昨收不符、日期重复、价格缺失等）不写入数据库，连同原因代码记入隔离表
+QUALITY_CHECK = True
+# 隔离表与每次导入的质量汇总保存在本地SQLite中，与目标数据库类型无关
+QUALITY_DB_PATH = os.path.join(STOCK_DATA_DIR, "002_StockDownLoad_quality.db")
+# 涨跌幅与 (收盘价 / 昨收 - 1) × 100 的允许误差（百分点）
+QUALITY_PCT_CHG_TOLERANCE = 0.02
+# 比较最高价、最低价、开盘价、收盘价时允许的误差
+QUALITY_PRICE_TOLERANCE = 1e-6
+# 导入日线后计算复权价格（前复权/后复权OHLC）、对数收益率等派生序列，
+# 写入伴随表 stock_<代码>_adj（合并表结构为 stock_adj），见 Data01_adjust
+DERIVE_ADJUSTED = True
+# 导入分钟数据后由分钟线合成的K线周期（分钟，须能整除半个交易时段的120分钟），
+# 写入 stock_<代码>_min<周期>（合并表结构为 stock_min<周期>），见 Data01_resample；空列表表示不合成
+RESAMPLE_MINUTES = [5, 15, 30, 60]
+
+# 运行指标（Data01_metrics）：每次下载 / 导入结束时写出的指标文件格式，
+#   "json"       - 快照原样保存为JSON
+#   "prometheus" - Prometheus 文本格式（.prom，可由 node_exporter 的 textfile collector 收集；数值为最近一次运行的 gauge）
+#   None         - 不写出文件（界面与日志中的指标不受影响）
+METRICS_FORMAT = "json"
+# 指标文件目录，JSON 文件名为 metrics_<download|import>_<时间>.json（每次运行一个），
+# Prometheus 文件名固定为 metrics_<download|import>.prom（每次运行覆盖上一次的结果）
+METRICS_DIR = os.path.join(STOCK_DATA_DIR, "metrics")
+# 界面实时刷新指标的最短间隔（秒）
+METRICS_EMIT_SECONDS = 1.0
+
+# 技术指标（Data01_indicators）：各指标的周期，MACD 为 [快线, 慢线, 信号线]
+INDICATORS = {
+    "ma": [5, 10, 20, 60],
+    "ema": [12, 26],
+    "rsi": [14],
+    "macd": [[12, 26, 9]],
+    "atr": [14],
+    "vol": [20],
+}
+# 计算指标使用的价格："hfq"（后复权价格，需要 DERIVE_ADJUSTED）或 "raw"（日线表中的原始价格）
+INDICATOR_PRICE = "hfq"
+# 每批一起读取和计算的股票数
+INDICATOR_BATCH_STOCKS = 200
 
 # 数据库配置（以SQLite为例，可以改为MySQL等）
 DB_TYPE = "sqlite"  # 可选 "sqlite", "mysql"
+# 表结构：
+#   "per_stock"    - 每只股票一张表 stock_<代码>_day / stock_<代码>_min（原有方式）
+#   "consolidated" - 全市场一张日线表 stock_day、一张分钟表 stock_min，主键 (ts_code, 日期)
+# 已有数据可用 Data01_migrate_schema.py 迁移到合并表
+DB_SCHEMA = "per_stock"
 # SQLite数据库文件路径
 SQLITE_DB_PATH = os.path.join(BASE_DIR, "stock_data.db")
+# 连接池中保留的空闲连接数；新连接默认应用的性能配置档（见 Data01_db_utils.SQLITE_PROFILES）
+DB_POOL_SIZE = 4
+DB_PROFILE = "safe"
+# 行情读取缓存（Data01_db_query）的内存上限（MB）
+QUERY_CACHE_MAX_MB = 256
+# 批量导入时每次 executemany 写入的行数
+DB_BATCH_SIZE = 5000
 # MySQL配置示例（如果使用MySQL需要配置以下参数）
 MYSQL_CONFIG = {
     "host": "localhost",
@@ -0,0 +1,331 @@
+# """
+# 行情数据读取模块：从数据库读取日线/分钟数据，带LRU内存缓存。
+#   load_day(codes, start, end, fields)  读取日线
+#   load_min(codes, start, end, fields)  读取分钟线
+#   load_adjusted(codes, start, end, fields)  读取复权价格与收益率（导入时计算，见 Data01_adjust）
+#   load_resampled(codes, minutes, start, end, fields)  读取分钟线合成的多周期K线（见 Data01_resample）
+# 多只股票合并为尽量少的查询；结果按 (股票, 区间, 字段) 缓存，
+# 缓存总量受 Data01_config.QUERY_CACHE_MAX_MB 限制，导入程序写入某只股票后自动失效。
+# """
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import Data01_config
+import Data01_db_utils
+
+# 一条 UNION ALL 查询最多包含的表数量（SQLite 复合查询上限为500）
+_UNION_BATCH = 200
+
+# 各数据类型的表后缀、时间列、可查询字段
+_KINDS = {
+    'day': {'suffix': 'day', 'key': 'trade_date', 'columns': Data01_db_utils.DAY_COLUMNS},
+    'min': {'suffix': 'min', 'key': 'trade_time', 'columns': Data01_db_utils.MIN_COLUMNS},
+    'adj': {'suffix': 'adj', 'key': 'trade_date', 'columns': Data01_db_utils.ADJ_COLUMNS},
+}
+
+
+def _kind_spec(kind):
+    # 合成K线 'min<周期>' 的表后缀与数据类型同名，按需登记
+    if kind not in _KINDS and re.fullmatch(r'min\d+', kind):
+        _KINDS[kind] = {'suffix': kind, 'key': 'trade_time', 'columns': Data01_db_utils.RESAMPLED_COLUMNS}
+    return _KINDS[kind]
+
+# 区间未指定时使用的上下界（可与 YYYYMMDD 及 'YYYY-MM-DD HH:MM:SS' 文本比较）
+_MIN_BOUND = ''
+_MAX_BOUND = '99999999'
+
+
+def _code6(stock_code):
+    match = re.search(r'(\d{6})', str(stock_code))
+    if not match:
+        raise ValueError(f"无法识别的股票代码: {stock_code}")
+    return match.group(1)
+
+
+def _bounds(kind, start, end):
+    """把 YYYYMMDD 起止日期转换为与表中时间列可比较的文本区间"""
+    start = str(start) if start else _MIN_BOUND
+    end = str(end) if end else _MAX_BOUND
+    if _KINDS[kind]['key'] == 'trade_time':
+        # 分钟表的 trade_time 形如 'YYYY-MM-DD HH:MM:SS'
+        if re.fullmatch(r'\d{8}', start):
+            start = f"{start[:4]}-{start[4:6]}-{start[6:]} 00:00:00"
+        if re.fullmatch(r'\d{8}', end):
+            end = f"{end[:4]}-{end[4:6]}-{end[6:]} 23:59:59"
+    return start, end
+
+
+def _slice(df, kind, start, end):
+    """从已缓存的更大区间中截取 [start, end]"""
+    values = df[_KINDS[kind]['key']]
+    mask = np.ones(len(df), dtype=bool)
+    if start != _MIN_BOUND:
+        mask &= (values >= pd.Timestamp(start)).to_numpy()
+    if end != _MAX_BOUND:
+        upper = pd.Timestamp(end)
+        if _KINDS[kind]['key'] == 'trade_date':
+            upper += pd.Timedelta(days=1)
+            mask &= (values < upper).to_numpy()
+        else:
+            mask &= (values <= upper).to_numpy()
+    return df[mask].reset_index(drop=True)
+
+
+class PriceCache:
+#    """
+#    LRU缓存：键为 (kind, code, start, end, fields)，值为单只股票的DataFrame。
+#    以DataFrame实际占用字节数计算内存，超过 max_bytes 时淘汰最久未使用的条目。
+#    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()   # key -> (df, nbytes)
+        self.by_code = {}              # (kind, code6) -> set(key)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, kind, code, start, end, fields):
+        """精确命中，或由同字段、区间更大的缓存条目切片得到"""
+        with self.lock:
+            key = (kind, code, start, end, fields)
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            for other in self.by_code.get((kind, _code6(code)), ()):
+                _, other_code, other_start, other_end, other_fields = other
+                if (other_code == code and other_fields == fields
+                        and other_start <= start and other_end >= end):
+                    self.entries.move_to_end(other)
+                    self.hits += 1
+                    return _slice(self.entries[other][0], kind, start, end)
+            self.misses += 1
+            return None
+
+    def put(self, kind, code, start, end, fields, df):
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        with self.lock:
+            key = (kind, code, start, end, fields)
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (df, nbytes)
+            self.by_code.setdefault((kind, _code6(code)), set()).add(key)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        _, nbytes = self.entries.pop(key)
+        self.nbytes -= nbytes
+        keys = self.by_code.get((key[0], _code6(key[1])))
+        if keys is not None:
+            keys.discard(key)
+
+    def invalidate(self, stock_code, kind):
+        """导入程序写入后调用：清除该股票（stock_code为None时清除该类型全部）的缓存"""
+        with self.lock:
+            if stock_code is None:
+                keys = [key for key in self.entries if key[0] == kind]
+            else:
+                keys = list(self.by_code.get((kind, _code6(stock_code)), ()))
+            for key in keys:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.by_code.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {'entries': len(self.entries), 'bytes': self.nbytes,
+                'hits': self.hits, 'misses': self.misses}
+
+
+_CACHE = PriceCache(Data01_config.QUERY_CACHE_MAX_MB * 1024 * 1024)
+Data01_db_utils.add_write_listener(_CACHE.invalidate)
+
+
+def _placeholder():
+    return '?' if Data01_config.DB_TYPE == "sqlite" else '%s'
+
+
+def _to_frame(rows, columns, kind):
+    """查询结果转换为带类型的DataFrame：时间列为datetime64，行情列为float64"""
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    key = _KINDS[kind]['key']
+    for col in columns:
+        if col == key:
+            if key == 'trade_date':
+                # SQLite中为 'YYYYMMDD' 文本，MySQL中为DATE
+                df[col] = pd.to_datetime(df[col].astype(str).str.replace('-', ''), format='%Y%m%d')
+            else:
+                df[col] = pd.to_datetime(df[col].astype(str))
+        elif col not in ('ts_code', '_table'):
+            df[col] = df[col].astype(np.float64)
+    return df
+
+
+def _in_code_order(df, codes, key, columns):
+    """长表按 codes 中的股票顺序、时间升序排列（一次排序，不逐只股票拆分）"""
+    order = pd.Categorical(df['ts_code'], categories=list(dict.fromkeys(codes)))
+    df = df.assign(_order=order.codes).sort_values(['_order', key], kind='stable')
+    return df[columns].reset_index(drop=True)
+
+
+def _query(conn, kind, codes, start, end, fields, split=True):
+    """批量查询多只股票，返回 {code: DataFrame}（按时间升序）；split=False 时返回按股票、时间排列的一张长表"""
+    spec = _KINDS[kind]
+    key = spec['key']
+    columns = ['ts_code', key] + [col for col in fields if col not in ('ts_code', key)]
+    ph = _placeholder()
+    cursor = conn.cursor()
+    frames = {}
+
+    if Data01_config.DB_SCHEMA == "consolidated":
+        table = f"stock_{spec['suffix']}"
+        in_list = ','.join([ph] * len(codes))
+        cursor.execute(f"SELECT {','.join(columns)} FROM {table} "
+                       f"WHERE ts_code IN ({in_list}) AND {key} BETWEEN {ph} AND {ph} "
+                       f"ORDER BY ts_code, {key}", [*codes, start, end])
+        df = _to_frame(cursor.fetchall(), columns, kind)
+        if not split:
+            return _in_code_order(df, codes, key, columns)
+        for code, group in df.groupby('ts_code', sort=False):
+            frames[code] = group.reset_index(drop=True)
+    else:
+        # 分表：每张表一个子查询，用常量列标记来源，合并为 UNION ALL
+        table_codes = {}
+        for code in codes:
+            table_codes.setdefault(f"stock_{_code6(code)}_{spec['suffix']}", []).append(code)
+        existing = set(Data01_db_utils.list_per_stock_tables(conn, spec['suffix']))
+        tables = [table for table in table_codes if table in existing]
+        select_cols = ','.join(columns[1:])
+        parts = []
+        for i in range(0, len(tables), _UNION_BATCH):
+            batch = tables[i:i + _UNION_BATCH]
+            sql = " UNION ALL ".join(
+                f"SELECT '{table}', {select_cols} FROM {table} WHERE {key} BETWEEN {ph} AND {ph}"
+                for table in batch)
+            cursor.execute(sql, [value for _ in batch for value in (start, end)])
+            df = _to_frame(cursor.fetchall(), ['_table'] + columns[1:], kind)
+            if not split:
+                parts.append(df)
+                continue
+            for table, group in df.groupby('_table', sort=False):
+                group = group.drop(columns='_table').sort_values(key).reset_index(drop=True)
+                for code in table_codes[table]:
+                    frames[code] = group.assign(ts_code=code)[columns]
+        if not split:
+            # 表名映射为股票代码（同一张表可能对应多种写法的代码）
+            df = pd.concat(parts, ignore_index=True) if parts else _to_frame([], ['_table'] + columns[1:], kind)
+            pairs = pd.DataFrame([(table, code) for table, table_code_list in table_codes.items()
+                                  for code in table_code_list], columns=['_table', 'ts_code'])
+            return _in_code_order(df.merge(pairs, on='_table'), codes, key, columns)
+
+    # 没有数据的股票返回空表，同样缓存
+    empty = _to_frame([], columns, kind)
+    for code in codes:
+        frames.setdefault(code, empty)
+    return frames
+
+
+def _load(kind, codes, start, end, fields, conn, use_cache):
+    if isinstance(codes, str):
+        codes = [codes]
+    spec = _kind_spec(kind)
+    fields = tuple(fields) if fields else tuple(col for col in spec['columns'] if col != 'ts_code')
+    unknown = [col for col in fields if col not in spec['columns']]
+    if unknown:
+        raise ValueError(f"未知字段: {unknown}")
+    start, end = _bounds(kind, start, end)
+
+    if not use_cache:
+        # 不使用缓存时直接返回查询得到的长表，不必逐只股票拆分再合并
+        own_conn = conn is None
+        if own_conn:
+            conn = Data01_db_utils.get_db_connection()
+        try:
+            return _query(conn, kind, codes, start, end, fields, split=False)
+        finally:
+            if own_conn:
+                conn.close()
+
+    result = {}
+    missing = []
+    for code in codes:
+        cached = _CACHE.get(kind, code, start, end, fields)
+        if cached is None:
+            missing.append(code)
+        else:
+            result[code] = cached
+
+    if missing:
+        own_conn = conn is None
+        if own_conn:
+            conn = Data01_db_utils.get_db_connection()
+        try:
+            fetched = _query(conn, kind, missing, start, end, fields)
+        finally:
+            if own_conn:
+                conn.close()
+        for code, df in fetched.items():
+            _CACHE.put(kind, code, start, end, fields, df)
+            result[code] = df
+
+    frames = [result[code] for code in codes]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def load_day(codes, start=None, end=None, fields=None, conn=None, use_cache=True):
+    """
+    读取日线数据。
+    参数:
+        codes: 股票代码或代码列表（分表结构下可用 '000063.SZ' 或 '000063'，合并表需用 ts_code）
+        start, end: 起止日期 'YYYYMMDD'，None 表示不限
+        fields: 需要的字段列表，默认全部行情字段
+        conn: 可选的数据库连接，默认从连接池获取
+        use_cache: 是否使用内存缓存
+    返回:
+        长表DataFrame：ts_code, trade_date(datetime64), 各字段(float64)，按股票、日期升序
+    """
+    return _load('day', codes, start, end, fields, conn, use_cache)
+
+
+def load_min(codes, start=None, end=None, fields=None, conn=None, use_cache=True):
+    """读取分钟数据，参数与 load_day 相同，时间列为 trade_time"""
+    return _load('min', codes, start, end, fields, conn, use_cache)
+
+
+def load_adjusted(codes, start=None, end=None, fields=None, conn=None, use_cache=True):
+    """
+    读取复权价格伴随表，参数与 load_day 相同。
+    字段：adj_factor, open/high/low/close_hfq（后复权）, open/high/low/close_qfq（前复权）, log_ret, cum_log_ret
+    """
+    return _load('adj', codes, start, end, fields, conn, use_cache)
+
+
+def load_resampled(codes, minutes, start=None, end=None, fields=None, conn=None, use_cache=True):
+    """
+    读取分钟线合成的K线，minutes 为周期（须在 Data01_config.RESAMPLE_MINUTES 中），其余参数与 load_day 相同。
+    时间列为 trade_time（K线结束时间），字段：open, high, low, close, volume, amount, vwap, bars
+    """
+    return _load(f"min{int(minutes)}", codes, start, end, fields, conn, use_cache)
+
+
+def clear_cache():
+    """清空读取缓存"""
+    _CACHE.clear()
+
+
+def cache_stats():
+    """返回缓存统计：条目数、占用字节、命中/未命中次数"""
+    return _CACHE.stats()
@@ -2,34 +2,413 @@
 # 数据库操作工具模块，支持SQLite和MySQL配置。
 # 根据config中的DB_TYPE选择。
 # """
+import os
+import re
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 import pandas as pd
-from datetime import datetime
+from datetime import date, datetime
 import Data01_config
+import Data01_metrics
+
+# SQLite 性能配置档：
+#   safe      - 日常使用：WAL + synchronous=FULL，断电也不丢已提交的数据
+#   bulk-load - 批量导入：关闭同步刷盘、大缓存、内存映射、临时表放内存，导入结束后恢复 safe
+# 注意：journal_mode 切换需要独占数据库，这里两个配置档都使用持久化的 WAL，避免来回切换
+SQLITE_PROFILES = {
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -2000,          # 负数表示KB，约2MB（SQLite默认值）
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+    },
+    "bulk-load": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -262144,        # 约256MB
+        "mmap_size": 268435456,       # 256MB
+        "temp_store": "MEMORY",
+    },
+}
+
+# MySQL 会话级配置档：批量导入时关闭唯一性/外键检查
+MYSQL_PROFILES = {
+    "safe": {"unique_checks": 1, "foreign_key_checks": 1},
+    "bulk-load": {"unique_checks": 0, "foreign_key_checks": 0},
+}
+
+
+def apply_profile(conn, profile):
+#     """
+#     对连接应用命名配置档（SQLite PRAGMA / MySQL 会话变量）。
+#     不提交也不回滚调用方的事务：SQLite 的 journal_mode / synchronous 不能在事务中修改，有未提交的事务时报错。
+#     """
+    raw = getattr(conn, 'raw', conn)
+    if isinstance(raw, sqlite3.Connection):
+        if raw.in_transaction:
+            raise ValueError(f"不能在未提交的事务中切换配置档: {profile}")
+        for name, value in SQLITE_PROFILES[profile].items():
+            raw.execute(f"PRAGMA {name} = {value}")
+    else:  # mysql
+        settings = ', '.join(f"{name} = {value}" for name, value in MYSQL_PROFILES[profile].items())
+        cursor = raw.cursor()
+        cursor.execute(f"SET SESSION {settings}")
+
+
+class PooledConnection:
+#    """
+#    连接池中取出的连接：用法与原始连接相同，close() 时归还连接池而不是真正断开。
+#    raw 为底层的 sqlite3 / pymysql 连接。
+#    """
+    def __init__(self, manager, raw):
+        self.manager = manager
+        self.raw = raw
+        self.db_type = manager.db_type
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __enter__(self):
+        return self.raw.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        return self.raw.__exit__(exc_type, exc, tb)
+
+    def close(self):
+        if self.raw is not None:
+            self.manager.release(self.raw)
+            self.raw = None
+
+
+class ConnectionManager:
+#    """
+#    数据库连接管理器：复用空闲连接，避免每次导入都重新建立连接。
+#    db_type: 'sqlite' 或 'mysql'；params: SQLite为 {'path': 文件路径}，MySQL为连接参数字典
+#    每个连接在创建时应用 Data01_config.DB_PROFILE 配置档。
+#    """
+    def __init__(self, db_type, params, pool_size=None, profile=None):
+        self.db_type = db_type
+        self.params = dict(params)
+        self.pool_size = pool_size or Data01_config.DB_POOL_SIZE
+        self.profile = profile or Data01_config.DB_PROFILE
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        if self.db_type == "sqlite":
+            # 连接会在不同线程间复用（同一时间只被一个线程持有）
+            raw = sqlite3.connect(self.params['path'], check_same_thread=False)
+            # 启用外键支持（可选）
+            raw.execute("PRAGMA foreign_keys = ON")
+        elif self.db_type == "mysql":
+            # 需要安装pymysql或mysql-connector-python
+            import pymysql
+            raw = pymysql.connect(
+                host=self.params['host'],
+                port=int(self.params['port']),
+                user=self.params['user'],
+                password=self.params['password'],
+                database=self.params['database'],
+                charset='utf8mb4'
+            )
+        else:
+            raise ValueError(f"不支持的数据库类型: {self.db_type}")
+        apply_profile(raw, self.profile)
+        return raw
+
+    def acquire(self):
+        """取出一个连接（优先复用空闲连接），用完调用 close() 归还"""
+        with self.lock:
+            raw = self.idle.pop() if self.idle else None
+        if raw is not None and self.db_type == "mysql":
+            # 空闲期间可能被服务器断开，必要时自动重连
+            raw.ping(reconnect=True)
+        if raw is None:
+            raw = self._connect()
+        return PooledConnection(self, raw)
+
+    def release(self, raw):
+        """归还连接：回滚未提交的事务，空闲连接数超过上限时直接关闭"""
+        try:
+            raw.rollback()
+        except Exception:
+            raw.close()
+            return
+        with self.lock:
+            if len(self.idle) < self.pool_size:
+                self.idle.append(raw)
+                return
+        raw.close()
+
+    def close_all(self):
+        """关闭全部空闲连接"""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for raw in idle:
+            raw.close()
+
+
+_MANAGERS = {}
+_MANAGERS_LOCK = threading.Lock()
+
+
+def get_connection_manager(db_type=None, params=None):
+#     """
+#     取得（必要时创建）连接管理器，相同的数据库类型与参数共用一个连接池。
+#     默认使用 Data01_config 中的 DB_TYPE / SQLITE_DB_PATH / MYSQL_CONFIG。
+#     """
+    db_type = db_type or Data01_config.DB_TYPE
+    if params is None:
+        if db_type == "sqlite":
+            params = {'path': Data01_config.SQLITE_DB_PATH}
+        else:
+            params = Data01_config.MYSQL_CONFIG
+    key = (db_type, tuple(sorted((k, str(v)) for k, v in params.items())))
+    with _MANAGERS_LOCK:
+        manager = _MANAGERS.get(key)
+        if manager is None:
+            manager = ConnectionManager(db_type, params)
+            _MANAGERS[key] = manager
+        return manager
+
+
+@contextmanager
+def bulk_load(conn):
+#     """
+#     批量导入期间切换到 bulk-load 配置档，结束（含异常）后恢复连接原来的配置档。
+#     须在事务之外进入。与 sqlite3 连接的 with 语句一致：块内出现异常时回滚未提交的写入，
+#     正常结束时提交，然后才恢复配置档。非 SQLite/MySQL 连接（如 MS SQL Server）保持不变。
+#     """
+    raw = getattr(conn, 'raw', conn)
+    manager = getattr(conn, 'manager', None)
+    if not isinstance(raw, sqlite3.Connection) and manager is None:
+        yield conn
+        return
+    apply_profile(conn, "bulk-load")
+    try:
+        yield conn
+    except BaseException:
+        raw.rollback()
+        raise
+    else:
+        raw.commit()
+    finally:
+        apply_profile(conn, manager.profile if manager else "safe")
+
 
 def get_db_connection():
-#     """根据配置获取数据库连接"""
-    if Data01_config.DB_TYPE == "sqlite":
-        conn = sqlite3.connect(Data01_config.SQLITE_DB_PATH)
-        # 启用外键支持（可选）
-        conn.execute("PRAGMA foreign_keys = ON")
+#     """根据配置获取数据库连接（来自连接池，close() 后归还复用）"""
+    if Data01_config.DB_TYPE not in ("sqlite", "mysql"):
+        raise ValueError(f"不支持的数据库类型: {Data01_config.DB_TYPE}")
+    return get_connection_manager().acquire()
+
+def target_key(db_type, params=None):
+#     """
+#     目标数据库的标识（导入清单按它区分同一文件导入到的不同数据库），如
+#     sqlite:/path/stock_data.db、mysql:host:3306/stock_db、mssql:SERVER/stock_db
+#     """
+    db_type = db_type or Data01_config.DB_TYPE
+    if db_type == "sqlite":
+        path = (params or {}).get('path') or Data01_config.SQLITE_DB_PATH
+        return f"sqlite:{os.path.abspath(path)}"
+    if db_type == "mysql":
+        params = params or Data01_config.MYSQL_CONFIG
+        return f"mysql:{params['host']}:{params['port']}/{params['database']}"
+    return f"mssql:{params['server']}/{params['database']}"
+
+def table_for(stock_code, data_type, consolidated=None):
+#     """文件导入的目标表：data_type 为 'day' / 'min'，consolidated 默认按 Data01_config.DB_SCHEMA"""
+    if consolidated is None:
+        consolidated = Data01_config.DB_SCHEMA == "consolidated"
+    if consolidated:
+        return CONSOLIDATED_DAY_TABLE if data_type == "day" else CONSOLIDATED_MIN_TABLE
+    return f"stock_{stock_code}_{data_type}"
+
+# ---- MySQL / MS SQL Server 按参数连接（GUI 与命令行共用）----
+def connect_mssql(params):
+#     """根据参数获取MS SQL Server数据库连接"""
+    try:
+        import pyodbc
+        server = params['server']
+        database = params['database']
+        username = params['username']
+        password = params['password']
+        
+        if not all([server, database]):
+            raise ValueError("MS SQL Server参数不完整")
+        
+        # 构建连接字符串
+        if username and password:
+            conn_str = f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password}'
+        else:
+            conn_str = f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};Trusted_Connection=yes;'
+        
+        conn = pyodbc.connect(conn_str)
         return conn
-    elif Data01_config.DB_TYPE == "mysql":
-        # 需要安装pymysql或mysql-connector-python
-        import pymysql
-        conn = pymysql.connect(
-            host=Data01_config.MYSQL_CONFIG['host'],
-            port=Data01_config.MYSQL_CONFIG['port'],
-            user=Data01_config.MYSQL_CONFIG['user'],
-            password=Data01_config.MYSQL_CONFIG['password'],
-            database=Data01_config.MYSQL_CONFIG['database'],
-            charset='utf8mb4'
-        )
+    except ImportError:
+        raise Exception("请安装pyodbc包: pip install pyodbc")
+    except Exception as e:
+        raise Exception(f"MS SQL Server连接失败: {str(e)}")
+
+
+def connect_mysql(params):
+#     """根据参数获取MySQL数据库连接（来自连接池，多次导入复用同一连接）"""
+    try:
+        import pymysql  # noqa: F401  提前检查依赖是否安装
+        int(params['port'])
+        
+        if not all([params['host'], params['user'], params['database']]):
+            raise ValueError("MySQL参数不完整")
+        
+        conn = get_connection_manager("mysql", params).acquire()
+        cursor = conn.cursor()
+        cursor.execute("SELECT DATABASE()")
+        print(f"当前连接的数据库：{cursor.fetchone()[0]}")
         return conn
-    else:
-        raise ValueError(f"不支持的数据库类型: {Data01_config.DB_TYPE}")
+    except ImportError:
+        raise Exception("请安装pymysql包: pip install pymysql")
+    except Exception as e:
+        raise Exception(f"MySQL连接失败: {str(e)}")
 
-def create_day_table_if_not_exists(conn, stock_code):
+
+def _mssql_rows_to_write(cursor, table_name, df, data_type):
+    # IMPORT_MODE = "append" 时只 MERGE 比表中最新键更新的行，历史数据被修订时仍 MERGE 全部行
+    key = APPEND_KEYS[data_type]
+    if Data01_config.IMPORT_MODE != "append" or key not in df.columns or df.empty:
+        return df
+    cursor.execute(build_tail_sql(table_name, data_type, dialect='mssql'), (df[key].min(), df[key].max()))
+    new_rows = diff_append_rows(df, data_type, cursor.fetchall())
+    return df if new_rows is None else new_rows
+
+def import_day_data_mssql(conn, stock_code, df, commit=True):
+#     """导入日线数据到MS SQL Server（commit=False 时写入调用方的事务而不提交）"""
+    table_name = f"stock_{stock_code}_day"
+    
+    # 转换 trade_date 列：从 YYYYMMDD 整数转为 Python date 对象
+    if 'trade_date' in df.columns:
+        # 使用 pandas 将整数（如 20250101）解析为 datetime，再提取 date
+        df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d').dt.date
+
+
+    # 创建表（如果不存在）
+    create_sql = f"""
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{table_name}' AND xtype='U')
+    CREATE TABLE {table_name} (
+        [trade_date] DATE PRIMARY KEY,
+        [open] DECIMAL(10,2),
+        [high] DECIMAL(10,2),
+        [low] DECIMAL(10,2),
+        [close] DECIMAL(10,2),
+        [pre_close] DECIMAL(10,2),
+        [change] DECIMAL(10,2),
+        [pct_chg] DECIMAL(10,2),
+        [vol] BIGINT,
+        [amount] DECIMAL(20,4),
+        [ts_code] VARCHAR(20)
+    )
+    """
+    cursor = conn.cursor()
+    cursor.execute(create_sql)
+    if commit:
+        conn.commit()
+    df = _mssql_rows_to_write(cursor, table_name, df, 'day')
+    
+    # 插入数据 确定DataFrame中存在的列
+    columns = ['trade_date', 'open', 'high', 'low', 'close', 'pre_close', 'change', 'pct_chg', 'vol', 'amount', 'ts_code']
+    cols_present = [col for col in columns if col in df.columns]
+    # 将列名用方括号括起来
+    cols_quoted = [f"[{col}]" for col in cols_present]
+    
+    # 使用MERGE语句实现upsert - 列名加方括号
+    merge_sql = f"""
+    MERGE {table_name} AS target
+    USING (VALUES ({','.join(['?' for _ in cols_present])})) AS source ({','.join(cols_quoted)})
+    ON target.[trade_date] = source.[trade_date]
+    WHEN MATCHED THEN
+        UPDATE SET {','.join([f'target.[{col}] = source.[{col}]' for col in cols_present if col != 'trade_date'])}
+    WHEN NOT MATCHED THEN
+        INSERT ({','.join(cols_quoted)}) VALUES ({','.join([f'source.[{col}]' for col in cols_present])});
+    """
+    
+    for _, row in df.iterrows():
+        values = [row[col] for col in cols_present]
+        cursor.execute(merge_sql, values)
+    if commit:
+        conn.commit()
+
+
+def import_min_data_mssql(conn, stock_code, df, commit=True):
+#     """导入分钟数据到MS SQL Server（commit=False 时写入调用方的事务而不提交）"""
+    table_name = f"stock_{stock_code}_min"
+    
+    # 创建表（如果不存在）
+    create_sql = f"""
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{table_name}' AND xtype='U')
+    CREATE TABLE {table_name} (
+        [trade_time] DATETIME PRIMARY KEY,
+        [open] DECIMAL(10,2),
+        [high] DECIMAL(10,2),
+        [low] DECIMAL(10,2),
+        [close] DECIMAL(10,2),
+        [volume] BIGINT,
+        [amount] DECIMAL(20,4),
+        [ts_code] VARCHAR(20)
+    )
+    """
+    cursor = conn.cursor()
+    cursor.execute(create_sql)
+    if commit:
+        conn.commit()
+    df = _mssql_rows_to_write(cursor, table_name, df, 'min')
+    
+    # 插入数据
+    columns = ['trade_time', 'open', 'high', 'low', 'close', 'volume', 'amount', 'ts_code']
+    cols_present = [col for col in columns if col in df.columns]
+    cols_quoted = [f"[{col}]" for col in cols_present]
+    
+    # 使用MERGE语句实现upsert
+    merge_sql = f"""
+    MERGE {table_name} AS target
+    USING (VALUES ({','.join(['?' for _ in cols_present])})) AS source ({','.join(cols_quoted)})
+    ON target.[trade_time] = source.[trade_time]
+    WHEN MATCHED THEN
+        UPDATE SET {','.join([f'target.[{col}] = source.[{col}]' for col in cols_present if col != 'trade_time'])}
+    WHEN NOT MATCHED THEN
+        INSERT ({','.join(cols_quoted)}) VALUES ({','.join([f'source.[{col}]' for col in cols_present])});
+    """
+    
+    for _, row in df.iterrows():
+        values = [row[col] for col in cols_present]
+        cursor.execute(merge_sql, values)
+    if commit:
+        conn.commit()
+
+def _table_exists(conn, table_name):
+    cursor = conn.cursor()
+    if Data01_config.DB_TYPE == "sqlite":
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (table_name,))
+    else:  # mysql
+        cursor.execute("SELECT 1 FROM information_schema.tables "
+                       "WHERE table_schema = DATABASE() AND table_name = %s", (table_name,))
+    return cursor.fetchone() is not None
+
+def _execute_ddl(conn, table_name, statements, commit):
+#     """
+#     执行建表语句。commit=False 表示处于调用方的事务中：SQLite 的DDL可在事务内执行；
+#     MySQL 的DDL会隐式提交事务，因此表已存在时直接跳过。
+#     """
+    if not commit and Data01_config.DB_TYPE != "sqlite" and _table_exists(conn, table_name):
+        return
+    cursor = conn.cursor()
+    for sql in statements:
+        cursor.execute(sql)
+    if commit:
+        conn.commit()
+
+def create_day_table_if_not_exists(conn, stock_code, commit=True):
 #     """创建日线数据表（如果不存在），主键为日期"""
     table_name = f"stock_{stock_code}_day"
     if Data01_config.DB_TYPE == "sqlite":
@@ -64,11 +443,9 @@ def create_day_table_if_not_exists(conn, stock_code):
             ts_code VARCHAR(20)
         )
         """
-    cursor = conn.cursor()
-    cursor.execute(create_sql)
-    conn.commit()
+    _execute_ddl(conn, table_name, [create_sql], commit)
 
-def create_min_table_if_not_exists(conn, stock_code):
+def create_min_table_if_not_exists(conn, stock_code, commit=True):
 #     """创建分钟数据表（如果不存在），主键为时间"""
     table_name = f"stock_{stock_code}_min"
     # 分钟数据表结构假设包含 trade_time 或类似列
@@ -99,77 +476,521 @@ def create_min_table_if_not_exists(conn, stock_code):
             ts_code VARCHAR(20)
         )
         """
+    _execute_ddl(conn, table_name, [create_sql], commit)
+
+def create_adj_table_if_not_exists(conn, stock_code, commit=True):
+#     """
+#     创建复权价格伴随表（如果不存在）：分表结构为 stock_<代码>_adj，主键为日期；
+#     合并表结构为 stock_adj，主键 (ts_code, 日期)。列见 ADJ_COLUMNS，由 Data01_adjust 写入。
+#     """
+    consolidated = Data01_config.DB_SCHEMA == "consolidated"
+    table_name = CONSOLIDATED_ADJ_TABLE if consolidated else f"stock_{stock_code}_adj"
+    sqlite = Data01_config.DB_TYPE == "sqlite"
+    # MySQL：复权价格不是两位小数，使用 DOUBLE
+    date_type, code_type, real_type = ("TEXT", "TEXT", "REAL") if sqlite else ("DATE", "VARCHAR(20)", "DOUBLE")
+    columns = ', '.join(f"{col} {real_type}" for col in ADJ_COLUMNS[1:-1])
+    if consolidated:
+        create_sql = (f"CREATE TABLE IF NOT EXISTS {table_name} (ts_code {code_type} NOT NULL, "
+                      f"trade_date {date_type} NOT NULL, {columns}, PRIMARY KEY (ts_code, trade_date))"
+                      f"{' WITHOUT ROWID' if sqlite else ''}")
+    else:
+        create_sql = (f"CREATE TABLE IF NOT EXISTS {table_name} (trade_date {date_type} PRIMARY KEY, "
+                      f"{columns}, ts_code {code_type})")
+    _execute_ddl(conn, table_name, [create_sql], commit)
+    return table_name
+
+def create_resampled_table_if_not_exists(conn, stock_code, minutes, commit=True):
+#     """
+#     创建分钟线合成的K线表（如果不存在）：分表结构为 stock_<代码>_min<周期>，主键为K线结束时间；
+#     合并表结构为 stock_min<周期>，主键 (ts_code, 时间)。列见 RESAMPLED_COLUMNS，由 Data01_resample 写入。
+#     """
+    consolidated = Data01_config.DB_SCHEMA == "consolidated"
+    table_name = f"stock_min{minutes}" if consolidated else f"stock_{stock_code}_min{minutes}"
+    sqlite = Data01_config.DB_TYPE == "sqlite"
+    if sqlite:
+        time_type, code_type, price_type, volume_type, amount_type = "TEXT", "TEXT", "REAL", "REAL", "REAL"
+    else:  # mysql：与分钟表相同的类型，VWAP不是两位小数，使用 DOUBLE
+        time_type, code_type, price_type, volume_type, amount_type = (
+            "DATETIME", "VARCHAR(20)", "DECIMAL(10,2)", "BIGINT", "DECIMAL(20,4)")
+    columns = (f"open {price_type}, high {price_type}, low {price_type}, close {price_type}, "
+               f"volume {volume_type}, amount {amount_type}, vwap {'REAL' if sqlite else 'DOUBLE'}, bars INTEGER")
+    if consolidated:
+        create_sql = (f"CREATE TABLE IF NOT EXISTS {table_name} (ts_code {code_type} NOT NULL, "
+                      f"trade_time {time_type} NOT NULL, {columns}, PRIMARY KEY (ts_code, trade_time))"
+                      f"{' WITHOUT ROWID' if sqlite else ''}")
+    else:
+        create_sql = (f"CREATE TABLE IF NOT EXISTS {table_name} (trade_time {time_type} PRIMARY KEY, "
+                      f"{columns}, ts_code {code_type})")
+    _execute_ddl(conn, table_name, [create_sql], commit)
+    return table_name
+
+# 写入通知：读取缓存等模块注册回调 listener(stock_code, kind)，
+# 导入函数写入某只股票后调用，kind 为 'day'、'min'、'adj'（复权价格伴随表）或 'min<周期>'（合成K线）；stock_code 为None表示全部失效
+_WRITE_LISTENERS = []
+
+def add_write_listener(listener):
+#     """注册写入通知回调"""
+    if listener not in _WRITE_LISTENERS:
+        _WRITE_LISTENERS.append(listener)
+
+def notify_write(stock_code, kind):
+#     """通知所有回调：某只股票的数据已被写入"""
+    for listener in _WRITE_LISTENERS:
+        listener(stock_code, kind)
+
+# 日线 / 分钟数据表的标准列（与tushare返回列一致）
+DAY_COLUMNS = ['trade_date', 'open', 'high', 'low', 'close', 'pre_close', 'change', 'pct_chg', 'vol', 'amount', 'ts_code']
+MIN_COLUMNS = ['trade_time', 'open', 'high', 'low', 'close', 'volume', 'amount', 'ts_code']
+# 复权价格伴随表的列（见 Data01_adjust）
+ADJ_COLUMNS = ['trade_date', 'adj_factor', 'open_hfq', 'high_hfq', 'low_hfq', 'close_hfq',
+               'open_qfq', 'high_qfq', 'low_qfq', 'close_qfq', 'log_ret', 'cum_log_ret', 'ts_code']
+# 分钟线合成K线表的列（见 Data01_resample）：trade_time 为K线结束时间，bars 为合成的分钟数
+RESAMPLED_COLUMNS = ['trade_time', 'open', 'high', 'low', 'close', 'volume', 'amount', 'vwap', 'bars', 'ts_code']
+
+# upsert语句缓存：同一张表、同一组列只拼接一次SQL
+_UPSERT_SQL_CACHE = {}
+
+def build_upsert_sql(table_name, cols_present):
+#     """生成（并缓存）指定表的 INSERT OR REPLACE / REPLACE INTO 语句"""
+    key = (Data01_config.DB_TYPE, table_name, tuple(cols_present))
+    sql = _UPSERT_SQL_CACHE.get(key)
+    if sql is None:
+        col_names = ','.join(cols_present)
+        if Data01_config.DB_TYPE == "sqlite":
+            placeholders = ','.join(['?' for _ in cols_present])
+            sql = f"INSERT OR REPLACE INTO {table_name} ({col_names}) VALUES ({placeholders})"
+        else:  # mysql使用 REPLACE INTO，pymysql的占位符为 %s
+            placeholders = ','.join(['%s' for _ in cols_present])
+            sql = f"REPLACE INTO {table_name} ({col_names}) VALUES ({placeholders})"
+        _UPSERT_SQL_CACHE[key] = sql
+    return sql
+
+def dataframe_to_rows(df, cols_present):
+#     """
+#     把DataFrame的指定列一次性转换为元组列表，供executemany使用。
+#     按列调用tolist()得到原生Python类型，NaN统一替换为None（写入为NULL）。
+#     """
+    columns = []
+    for col in cols_present:
+        series = df[col]
+        values = series.tolist()
+        if series.isna().any():
+            mask = series.isna().tolist()
+            values = [None if is_na else v for v, is_na in zip(values, mask)]
+        columns.append(values)
+    return list(zip(*columns))
+
+def upsert_dataframe(conn, table_name, df, columns, chunk_size=None, commit=True):
+#     """
+#     批量upsert：按列转换为元组后，分块executemany写入，整个文件一个事务。
+#     参数:
+#         columns: 候选列顺序，只写入df中实际存在的列
+#         chunk_size: 每批写入行数，默认取 Data01_config.DB_BATCH_SIZE
+#         commit: False 时不提交也不回滚，由调用方控制外层事务（流式导入逐块写入时使用）
+#     返回:
+#         dict，包含 table, rows, seconds, rows_per_sec
+#     """
+    if chunk_size is None:
+        chunk_size = Data01_config.DB_BATCH_SIZE
+    start = time.perf_counter()
+    cols_present = [col for col in columns if col in df.columns]
+    sql = build_upsert_sql(table_name, cols_present)
+    rows = dataframe_to_rows(df, cols_present)
+
     cursor = conn.cursor()
-    cursor.execute(create_sql)
-    conn.commit()
+    if not commit:
+        for i in range(0, len(rows), chunk_size):
+            cursor.executemany(sql, rows[i:i + chunk_size])
+    else:
+        try:
+            for i in range(0, len(rows), chunk_size):
+                cursor.executemany(sql, rows[i:i + chunk_size])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    seconds = time.perf_counter() - start
+    return {
+        'table': table_name,
+        'rows': len(rows),
+        'seconds': seconds,
+        'rows_per_sec': len(rows) / seconds if seconds > 0 else 0.0,
+    }
+
+# append 模式的表尾指纹：每种数据的键列、指纹列，以及比较指纹时允许的误差
+# （MySQL / SQL Server 的价格列为 DECIMAL(10,2)、成交量为 BIGINT，读回的值会有舍入）
+APPEND_KEYS = {'day': 'trade_date', 'min': 'trade_time'}
+APPEND_FINGERPRINT = {'day': ['close', 'vol'], 'min': ['close', 'volume']}
+APPEND_TOLERANCE = {'close': 0.011, 'vol': 1.0, 'volume': 1.0}
 
-def import_day_data(conn, stock_code, df):
+def _key_text(value):
+    # 键统一为与数据文件相同的文本：SQLite 存文本，MySQL / SQL Server 的 DATE / DATETIME 返回日期对象
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y%m%d')
+    return str(value)
+
+def _key_texts(series):
+    # 文件中的键列通常已是文本；MS SQL Server 导入前日期已转为 date 对象，逐个转换
+    if len(series) and not isinstance(series.iloc[0], str):
+        return series.map(_key_text).to_numpy()
+    return series.astype(str).to_numpy()
+
+def build_tail_sql(table_name, data_type, where=None, dialect=None):
 #     """
-#     导入日线数据到对应表。如果表不存在则创建，然后使用INSERT OR REPLACE或类似方式。
-#     假设DataFrame包含列：trade_date, open, high, low, close, ... 
-#     具体列名需与tushare返回一致。
+#     append 模式的一次性查询：按键降序取表尾 IMPORT_APPEND_TAIL_ROWS 行的键和指纹列，
+#     每行末尾附带表中键落在 [文件最早键, 文件最晚键] 内的行数。
+#     where 为附加条件（合并表按 ts_code 过滤），参数顺序：where参数、最早键、最晚键、where参数。
+#     dialect: 'sqlite' / 'mysql' / 'mssql'，默认取 Data01_config.DB_TYPE
 #     """
-    table_name = f"stock_{stock_code}_day"
-    create_day_table_if_not_exists(conn, stock_code)
-    
-    # 处理数据，确保列名匹配
-    # 假设df包含标准tushare daily列，如trade_date, open, high, low, close, pre_close, change, pct_chg, vol, amount, ts_code
-    # 我们需要根据实际列名调整
-    # 将数据写入数据库，使用replace策略（如果主键冲突则替换）
-    df_to_insert = df.copy()
-    # 如果日期列是trade_date，确保为字符串，方便SQLite
+    dialect = dialect or Data01_config.DB_TYPE
+    key = APPEND_KEYS[data_type]
+    placeholder = '%s' if dialect == 'mysql' else '?'
+    prefix = f"{where} AND " if where else ""
+    count_sql = (f"(SELECT COUNT(*) FROM {table_name} WHERE {prefix}"
+                 f"{key} >= {placeholder} AND {key} <= {placeholder})")
+    columns = ', '.join([key] + APPEND_FINGERPRINT[data_type] + [count_sql])
+    where_sql = f" WHERE {where}" if where else ""
+    limit = Data01_config.IMPORT_APPEND_TAIL_ROWS
+    if dialect == 'mssql':
+        return f"SELECT TOP {limit} {columns} FROM {table_name}{where_sql} ORDER BY {key} DESC"
+    return f"SELECT {columns} FROM {table_name}{where_sql} ORDER BY {key} DESC LIMIT {limit}"
+
+def _same_fingerprint(stored, incoming, columns):
+    for col, a, b in zip(columns, stored, incoming):
+        a_missing = a is None or a != a
+        b_missing = b is None or b != b
+        if a_missing or b_missing:
+            if a_missing != b_missing:
+                return False
+        elif abs(float(a) - float(b)) > APPEND_TOLERANCE[col]:
+            return False
+    return True
+
+def diff_append_rows(df, data_type, tail_rows):
+#     """
+#     append 模式的行差异。tail_rows 为 build_tail_sql 的查询结果。
+#     返回需要写入的行：表为空时为全部行；表中已有部分与文件一致时只有比表中最新键更新的行；
+#     发现历史数据被修订（表尾指纹不同，或键范围内的行数与表中不一致）时返回None，由调用方整体upsert。
+#     """
+    if not tail_rows:
+        return df
+    keys = _key_texts(df[APPEND_KEYS[data_type]])
+    max_key = _key_text(tail_rows[0][0])
+    older = keys <= max_key
+    # 文件中不晚于表中最新键的行，应与表中同一键范围内的行一一对应
+    if len(set(keys[older])) != tail_rows[0][-1]:
+        return None
+    tail = {_key_text(row[0]): row[1:-1] for row in tail_rows}
+    columns = [col for col in APPEND_FINGERPRINT[data_type] if col in df.columns]
+    positions = [i for i, k in enumerate(keys) if k in tail]
+    if positions:
+        incoming = df.iloc[positions][columns].itertuples(index=False)
+        for i, values in zip(positions, incoming):
+            stored = dict(zip(APPEND_FINGERPRINT[data_type], tail[keys[i]]))
+            if not _same_fingerprint([stored[col] for col in columns], values, columns):
+                return None
+    return df[~older]
+
+def append_dataframe(conn, table_name, df, columns, data_type, chunk_size=None, commit=True,
+                     where=None, where_params=()):
+#     """
+#     append 模式写入：一次查询取得表尾指纹，只写入比表中最新键更新的行；
+#     历史数据被修订时退回整体upsert。返回写入统计（同 upsert_dataframe，另含 mode 与 skipped_rows）。
+#     """
+    key = APPEND_KEYS[data_type]
+    new_rows = None
+    if key in df.columns and not df.empty:
+        keys = df[key].astype(str)
+        params = (*where_params, keys.min(), keys.max(), *where_params)
+        cursor = conn.cursor()
+        cursor.execute(build_tail_sql(table_name, data_type, where), params)
+        new_rows = diff_append_rows(df, data_type, cursor.fetchall())
+    if new_rows is None:
+        stats = upsert_dataframe(conn, table_name, df, columns, chunk_size, commit)
+        stats.update(mode='upsert', skipped_rows=0)
+    else:
+        stats = upsert_dataframe(conn, table_name, new_rows, columns, chunk_size, commit)
+        stats.update(mode='append', skipped_rows=len(df) - len(new_rows))
+    return stats
+
+def write_dataframe(conn, table_name, df, columns, data_type, chunk_size=None, commit=True,
+                    where=None, where_params=()):
+#     """
+#     按 Data01_config.IMPORT_MODE 选择 append_dataframe 或 upsert_dataframe；
+#     用时与写入行数按数据类型和实际写入方式记入 Data01_metrics
+#     """
+    start = time.perf_counter()
+    if Data01_config.IMPORT_MODE == "append":
+        stats = append_dataframe(conn, table_name, df, columns, data_type, chunk_size, commit,
+                                 where, where_params)
+    else:
+        stats = upsert_dataframe(conn, table_name, df, columns, chunk_size, commit)
+    mode = stats.get('mode', 'upsert')
+    # append 模式的用时包含查询表尾
+    Data01_metrics.observe('db_upsert_seconds', time.perf_counter() - start, data_type=data_type, mode=mode)
+    Data01_metrics.inc('db_rows_total', stats['rows'], data_type=data_type, mode=mode)
+    return stats
+
+# 合并表（DB_SCHEMA = "consolidated"）：全市场一张表，主键 (ts_code, 日期)，日期上建二级索引
+CONSOLIDATED_DAY_TABLE = "stock_day"
+CONSOLIDATED_MIN_TABLE = "stock_min"
+CONSOLIDATED_ADJ_TABLE = "stock_adj"
+
+def create_consolidated_tables(conn, commit=True):
+#     """
+#     创建合并的日线/分钟表（如果不存在）。
+#     SQLite 使用 WITHOUT ROWID，数据按 (ts_code, 日期) 聚簇存放；
+#     日期索引使“某一天全市场”的查询成为一次索引范围扫描。
+#     """
+    if Data01_config.DB_TYPE == "sqlite":
+        statements = [
+            f"""
+            CREATE TABLE IF NOT EXISTS {CONSOLIDATED_DAY_TABLE} (
+                ts_code TEXT NOT NULL,
+                trade_date TEXT NOT NULL,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                pre_close REAL,
+                change REAL,
+                pct_chg REAL,
+                vol REAL,
+                amount REAL,
+                PRIMARY KEY (ts_code, trade_date)
+            ) WITHOUT ROWID
+            """,
+            f"CREATE INDEX IF NOT EXISTS idx_{CONSOLIDATED_DAY_TABLE}_date ON {CONSOLIDATED_DAY_TABLE} (trade_date)",
+            f"""
+            CREATE TABLE IF NOT EXISTS {CONSOLIDATED_MIN_TABLE} (
+                ts_code TEXT NOT NULL,
+                trade_time TEXT NOT NULL,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume REAL,
+                amount REAL,
+                PRIMARY KEY (ts_code, trade_time)
+            ) WITHOUT ROWID
+            """,
+            f"CREATE INDEX IF NOT EXISTS idx_{CONSOLIDATED_MIN_TABLE}_time ON {CONSOLIDATED_MIN_TABLE} (trade_time)",
+        ]
+    else:  # mysql：InnoDB按主键聚簇，索引直接写在建表语句中
+        statements = [
+            f"""
+            CREATE TABLE IF NOT EXISTS {CONSOLIDATED_DAY_TABLE} (
+                ts_code VARCHAR(20) NOT NULL,
+                trade_date DATE NOT NULL,
+                open DECIMAL(10,2),
+                high DECIMAL(10,2),
+                low DECIMAL(10,2),
+                close DECIMAL(10,2),
+                pre_close DECIMAL(10,2),
+                `change` DECIMAL(10,2),
+                pct_chg DECIMAL(10,2),
+                vol BIGINT,
+                amount DECIMAL(20,4),
+                PRIMARY KEY (ts_code, trade_date),
+                INDEX idx_{CONSOLIDATED_DAY_TABLE}_date (trade_date)
+            )
+            """,
+            f"""
+            CREATE TABLE IF NOT EXISTS {CONSOLIDATED_MIN_TABLE} (
+                ts_code VARCHAR(20) NOT NULL,
+                trade_time DATETIME NOT NULL,
+                open DECIMAL(10,2),
+                high DECIMAL(10,2),
+                low DECIMAL(10,2),
+                close DECIMAL(10,2),
+                volume BIGINT,
+                amount DECIMAL(20,4),
+                PRIMARY KEY (ts_code, trade_time),
+                INDEX idx_{CONSOLIDATED_MIN_TABLE}_time (trade_time)
+            )
+            """,
+        ]
+    # 在调用方事务中：MySQL两张表都已存在时不执行DDL（见 _execute_ddl）
+    if not commit and Data01_config.DB_TYPE != "sqlite" and all(
+            _table_exists(conn, table) for table in (CONSOLIDATED_DAY_TABLE, CONSOLIDATED_MIN_TABLE)):
+        return
+    cursor = conn.cursor()
+    for sql in statements:
+        cursor.execute(sql)
+    if commit:
+        conn.commit()
+
+def _with_ts_code(df, stock_code):
+    # 合并表以 ts_code 为主键的一部分，缺失时用股票代码补齐
+    if 'ts_code' in df.columns and not df['ts_code'].isna().any():
+        return df
+    df = df.copy()
+    if 'ts_code' in df.columns:
+        df['ts_code'] = df['ts_code'].fillna(stock_code)
+    else:
+        df['ts_code'] = stock_code
+    return df
+
+def _consolidated_filter(stock_code, df):
+    # 合并表的表尾查询只看本股票的行：(where, where_params)
+    placeholder = '%s' if Data01_config.DB_TYPE == 'mysql' else '?'
+    return f"ts_code = {placeholder}", (df['ts_code'].iloc[0] if len(df) else stock_code,)
+
+def _derive_adjusted(conn, stock_code, df, stats, commit):
+    # DERIVE_ADJUSTED 时更新复权价格伴随表；append 模式发现历史数据被修订（退回upsert）时整只股票重新计算
+    if not Data01_config.DERIVE_ADJUSTED:
+        return
+    import Data01_adjust   # Data01_adjust 依赖本模块，用到时再导入
+    stats['adjusted'] = Data01_adjust.update_adjusted(conn, stock_code, df, full=stats.get('mode') == 'upsert',
+                                                      commit=commit)
+    Data01_metrics.observe('derive_seconds', stats['adjusted']['seconds'], kind='adjusted')
+
+def _invalidate_indicator_state(conn, indicator_code, stats, commit):
+    # 日线整体upsert（历史数据可能被修订）或复权价格整只股票重新计算后，技术指标保存的滚动状态已过时，
+    # 删除该股票的状态，下次更新指标时从头计算（indicator_code 为指标状态表的键，见 Data01_indicators）
+    if stats.get('mode', 'upsert') != 'upsert' and stats.get('adjusted', {}).get('mode') != 'full':
+        return
+    import Data01_indicators   # Data01_indicators 依赖本模块，用到时再导入
+    if not _table_exists(conn, Data01_indicators.STATE_TABLE):
+        return
+    placeholder = '%s' if Data01_config.DB_TYPE == 'mysql' else '?'
+    conn.cursor().execute(f"DELETE FROM {Data01_indicators.STATE_TABLE} WHERE ts_code = {placeholder}",
+                          (indicator_code,))
+    if commit:
+        conn.commit()
+
+def _resample_minutes(conn, stock_code, df, stats, commit):
+    # RESAMPLE_MINUTES 非空时由新导入的分钟线合成各周期K线；整体upsert时从本次数据最早的一天开始重新合成
+    if not Data01_config.RESAMPLE_MINUTES or not stats.get('rows'):
+        return
+    import Data01_resample   # Data01_resample 依赖本模块，用到时再导入
+    since = None
+    if stats.get('mode') != 'append' and 'trade_time' in df.columns and len(df):
+        since = df['trade_time'].min()
+    stats['resampled'] = Data01_resample.update_resampled(conn, stock_code, df, since=since, commit=commit)
+    Data01_metrics.observe('derive_seconds', stats['resampled']['seconds'], kind='resampled')
+
+def import_day_data_consolidated(conn, stock_code, df, chunk_size=None, commit=True):
+#     """导入日线数据到合并表 stock_day，返回写入统计"""
+    create_consolidated_tables(conn, commit)
+    df_to_insert = _with_ts_code(df, stock_code)
     if 'trade_date' in df_to_insert.columns:
+        df_to_insert = df_to_insert.copy()
         df_to_insert['trade_date'] = df_to_insert['trade_date'].astype(str)
-    
-    # 写入数据库，使用pandas的to_sql，设置if_exists='append'，但主键冲突会导致错误，需使用replace
-    # 对于SQLite，可以使用INSERT OR REPLACE，但pandas to_sql不支持。所以手动执行。
-    # 手动逐行插入，使用replace语法。
-    # 简化：使用pandas to_sql并设置if_exists='append'，然后假设主键冲突由数据库处理（需表设置主键，且使用replace？）
-    # 更稳健：手动编写replace语句。
-    # 为了代码简洁，我们使用pandas的to_sql，但需要处理重复主键。SQLite支持INSERT OR REPLACE，但pandas to_sql默认是INSERT。
-    # 我们可以先将数据写入临时表，然后合并，但较复杂。这里采用逐行upsert。
-    # 但数据量可能不大，逐行效率可接受。
+    stats = write_dataframe(conn, CONSOLIDATED_DAY_TABLE, df_to_insert, DAY_COLUMNS, 'day', chunk_size, commit,
+                            *_consolidated_filter(stock_code, df_to_insert))
+    notify_write(stock_code, 'day')
+    _derive_adjusted(conn, stock_code, df_to_insert, stats, commit)
+    _invalidate_indicator_state(conn, _consolidated_filter(stock_code, df_to_insert)[1][0], stats, commit)
+    return stats
+
+def import_min_data_consolidated(conn, stock_code, df, chunk_size=None, commit=True):
+#     """导入分钟数据到合并表 stock_min，返回写入统计"""
+    create_consolidated_tables(conn, commit)
+    df_to_insert = _with_ts_code(df, stock_code)
+    stats = write_dataframe(conn, CONSOLIDATED_MIN_TABLE, df_to_insert, MIN_COLUMNS, 'min', chunk_size, commit,
+                            *_consolidated_filter(stock_code, df_to_insert))
+    notify_write(stock_code, 'min')
+    _resample_minutes(conn, stock_code, df_to_insert, stats, commit)
+    return stats
+
+def list_per_stock_tables(conn, suffix):
+#     """列出数据库中所有按股票分表的表名（suffix 为 'day' 或 'min'）"""
     cursor = conn.cursor()
-    for _, row in df_to_insert.iterrows():
-        # 构建插入语句（适用于SQLite）
-        # 列名需要根据实际df列处理。这里简化，假设df列是固定的
-        # 实际使用时，可能需要更通用处理，如根据df列动态生成。
-        # 假设列列表如下（根据tushare daily文档）：
-        columns = ['trade_date', 'open', 'high', 'low', 'close', 'pre_close', 'change', 'pct_chg', 'vol', 'amount', 'ts_code']
-        # 过滤出df中存在的列
-        cols_present = [col for col in columns if col in df_to_insert.columns]
-        placeholders = ','.join(['?' for _ in cols_present])
-        col_names = ','.join(cols_present)
-        # 生成替换语句
+    # LIKE 中的 _ 是通配符，先粗筛再用正则精确匹配 stock_<6位代码>_<suffix>
+    if Data01_config.DB_TYPE == "sqlite":
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE ?",
+                       (f"stock_%_{suffix}",))
+    else:  # mysql
+        cursor.execute(f"SHOW TABLES LIKE 'stock_%_{suffix}'")
+    pattern = re.compile(rf"^stock_\d{{6}}_{suffix}$")
+    return sorted(row[0] for row in cursor.fetchall() if pattern.match(row[0]))
+
+def migrate_to_consolidated(conn, drop_old=False, progress=None):
+#     """
+#     把已有的 stock_<代码>_day / _min 表批量复制到合并表。
+#     每张表用一条 INSERT ... SELECT 在数据库内部完成复制，不经过Python逐行处理。
+#     参数:
+#         drop_old: 复制成功后删除原来的分表
+#         progress: 回调 progress(已完成表数, 总表数, 表名, 复制行数)
+#     返回:
+#         dict，{'tables': 表数, 'rows': 行数, 'seconds': 耗时}
+#     """
+    start = time.perf_counter()
+    create_consolidated_tables(conn)
+    verb = "INSERT OR REPLACE INTO" if Data01_config.DB_TYPE == "sqlite" else "REPLACE INTO"
+    jobs = [(table, CONSOLIDATED_DAY_TABLE, DAY_COLUMNS) for table in list_per_stock_tables(conn, 'day')]
+    jobs += [(table, CONSOLIDATED_MIN_TABLE, MIN_COLUMNS) for table in list_per_stock_tables(conn, 'min')]
+
+    cursor = conn.cursor()
+    total_rows = 0
+    for done, (table, target, columns) in enumerate(jobs, start=1):
+        # 分表的 ts_code 可能为空，用表名中的6位代码兜底
+        code = table.split('_')[1]
+        select_cols = [f"COALESCE(ts_code, '{code}')" if col == 'ts_code' else col for col in columns]
         if Data01_config.DB_TYPE == "sqlite":
-            sql = f"INSERT OR REPLACE INTO {table_name} ({col_names}) VALUES ({placeholders})"
-        else:  # mysql使用 REPLACE INTO
-            sql = f"REPLACE INTO {table_name} ({col_names}) VALUES ({placeholders})"
-        values = [row[col] for col in cols_present]
-        cursor.execute(sql, values)
-    conn.commit()
+            col_names = ','.join(columns)
+        else:  # mysql中 change 是保留字，列名加反引号
+            col_names = ','.join(f"`{col}`" for col in columns)
+        try:
+            cursor.execute(f"{verb} {target} ({col_names}) SELECT {','.join(select_cols)} FROM {table}")
+            rows = cursor.rowcount
+            if drop_old:
+                cursor.execute(f"DROP TABLE {table}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        total_rows += max(rows, 0)
+        if progress:
+            progress(done, len(jobs), table, rows)
+
+    notify_write(None, 'day')
+    notify_write(None, 'min')
+    return {'tables': len(jobs), 'rows': total_rows, 'seconds': time.perf_counter() - start}
 
-def import_min_data(conn, stock_code, df):
+def import_day_data(conn, stock_code, df, chunk_size=None, commit=True):
 #     """
-#     导入分钟数据到对应表。类似日数据，但主键可能是trade_time。
+#     导入日线数据到对应表。如果表不存在则创建，然后批量 INSERT OR REPLACE
+#     （IMPORT_MODE = "append" 时只写入比表中最新日期更新的行，见 append_dataframe）。
+#     假设DataFrame包含列：trade_date, open, high, low, close, ...
+#     具体列名需与tushare返回一致。
+#     返回写入统计（行数、耗时、行/秒），见 upsert_dataframe。
+#     commit=False 时写入调用方的事务而不提交（流式导入逐块写入时使用）。
+#     """
+    if Data01_config.DB_SCHEMA == "consolidated":
+        return import_day_data_consolidated(conn, stock_code, df, chunk_size, commit)
+    table_name = f"stock_{stock_code}_day"
+    create_day_table_if_not_exists(conn, stock_code, commit)
+
+    df_to_insert = df
+    # 如果日期列是trade_date，确保为字符串，方便SQLite
+    if 'trade_date' in df.columns:
+        df_to_insert = df.copy()
+        df_to_insert['trade_date'] = df_to_insert['trade_date'].astype(str)
+
+    stats = write_dataframe(conn, table_name, df_to_insert, DAY_COLUMNS, 'day', chunk_size, commit)
+    notify_write(stock_code, 'day')
+    _derive_adjusted(conn, stock_code, df_to_insert, stats, commit)
+    _invalidate_indicator_state(conn, stock_code, stats, commit)
+    return stats
+
+def import_min_data(conn, stock_code, df, chunk_size=None, commit=True):
+#     """
+#     导入分钟数据到对应表。类似日数据，但主键是trade_time。
 #     假设df包含列：trade_time, open, high, low, close, volume, amount, ts_code等。
+#     返回写入统计（行数、耗时、行/秒），见 upsert_dataframe。
+#     commit=False 时写入调用方的事务而不提交（流式导入逐块写入时使用）。
 #     """
+    if Data01_config.DB_SCHEMA == "consolidated":
+        return import_min_data_consolidated(conn, stock_code, df, chunk_size, commit)
     table_name = f"stock_{stock_code}_min"
-    create_min_table_if_not_exists(conn, stock_code)
-    
-    cursor = conn.cursor()
-    # 根据tushare分钟数据接口调整列名
-    # 假设列有：trade_time, open, high, low, close, volume, amount, ts_code
-    columns = ['trade_time', 'open', 'high', 'low', 'close', 'volume', 'amount', 'ts_code']
-    cols_present = [col for col in columns if col in df.columns]
-    placeholders = ','.join(['?' for _ in cols_present])
-    col_names = ','.join(cols_present)
-    
-    for _, row in df.iterrows():
-        if Data01_config.DB_TYPE == "sqlite":
-            sql = f"INSERT OR REPLACE INTO {table_name} ({col_names}) VALUES ({placeholders})"
-        else:
-            sql = f"REPLACE INTO {table_name} ({col_names}) VALUES ({placeholders})"
-        values = [row[col] for col in cols_present]
-        cursor.execute(sql, values)
-    conn.commit()
\ No newline at end of file
+    create_min_table_if_not_exists(conn, stock_code, commit)
+
+    stats = write_dataframe(conn, table_name, df, MIN_COLUMNS, 'min', chunk_size, commit)
+    notify_write(stock_code, 'min')
+    _resample_minutes(conn, stock_code, df, stats, commit)
+    return stats
@@ -0,0 +1,603 @@
+# """
+# 并发下载引擎：线程池 + 按接口的令牌桶限流 + 频率超限自动退避。
+# 日线支持两种获取方式：逐股票（run）与按交易日全市场（run_by_date）。
+# 不依赖PyQt，可在GUI线程之外或命令行中使用。
+# """
+import os
+import time
+import queue
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+import Data01_config
+import Data01_file_utils
+import Data01_metrics
+import Data01_tushare_utils
+
+
+class TokenBucket:
+#    """
+#    令牌桶限流器（线程安全）。
+#    rate: 每 per 秒允许的调用次数；capacity: 桶容量（允许的突发调用数）。
+#    """
+    def __init__(self, rate, per=60.0, capacity=1):
+        self.rate = float(rate)
+        self.per = float(per)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+        self.pause_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate / self.per)
+
+    def acquire(self, stop_event=None):
+        """取得一个令牌，不足时阻塞等待；stop_event被设置时返回False"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.pause_until:
+                    wait = self.pause_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return True
+                    wait = (1 - self.tokens) * self.per / self.rate
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+    def penalize(self, seconds):
+        """暂停发放令牌 seconds 秒（收到频率超限错误后调用）"""
+        with self.lock:
+            now = time.monotonic()
+            self.pause_until = max(self.pause_until, now + seconds)
+            self.tokens = 0.0
+            self.last_refill = self.pause_until
+
+
+class DownloadTask:
+#    """一只股票的下载任务"""
+    def __init__(self, stock_code, start_date, end_date, data_type, filepath=None, log_file=None):
+        self.stock_code = stock_code
+        self.start_date = start_date
+        self.end_date = end_date
+        self.data_type = data_type
+        self.filepath = filepath
+        self.log_file = log_file
+        self.task_id = None      # 作业日志中的任务序号（见 Data01_download_journal）
+
+
+def _last_data_date(df):
+    # 数据中最新的日期（YYYYMMDD），没有数据时为None
+    if df is None or df.empty:
+        return None
+    column = 'trade_date' if 'trade_date' in df.columns else 'trade_time'
+    return str(df[column].max()).replace('-', '')[:8]
+
+
+class DownloadResult:
+#    """
+#    下载结果：error为None表示成功。
+#    分钟数据边下载边写入文件，成功时 df 为None（任务没有文件路径时才返回完整DataFrame），rows 为写入行数。
+#    last_date 为实际下载到的最新日期（YYYYMMDD，没有数据时为None），下载覆盖清单据此记录已覆盖的区间。
+#    """
+    def __init__(self, task, df=None, error=None, attempts=0, seconds=0.0, rows=None, last_date=None):
+        self.task = task
+        self.df = df
+        self.error = error
+        self.attempts = attempts
+        self.seconds = seconds
+        self.rows = len(df) if rows is None and df is not None else (rows or 0)
+        self.last_date = last_date or _last_data_date(df)
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class MinuteJob:
+#    """
+#    一只股票分钟数据的分窗口下载状态。
+#    各窗口并发获取、完成顺序不定：已到达的窗口暂存，按窗口时间顺序写盘，
+#    并丢弃与已写入部分重叠的边界K线。所有方法在持有 lock 时调用。
+#    journal: 作业日志，每写完一个窗口记录一次（仅可续写的CSV临时文件）
+#    resume: journal.resume_point 的返回值，从已有临时文件的该位置继续写
+#    """
+    def __init__(self, task, windows, row_limit, journal=None, resume=None):
+        self.task = task
+        self.row_limit = row_limit
+        self.journal = journal
+        self.pending = set(windows)       # 尚未写入的窗口
+        self.ready = {}                   # 已到达、等待前序窗口写入的数据
+        self.outstanding = len(windows)   # 尚未返回的窗口请求数
+        self.last_time = resume['last_time'] if resume else None
+        self.rows = resume['rows'] if resume else 0
+        self.attempts = 0
+        self.error = None
+        self.frames = []                  # 任务没有文件路径时在内存中汇总
+        self.writer = None
+        if task.filepath:
+            self.writer = Data01_file_utils.DataFileWriter(
+                task.filepath, resume_bytes=resume['file_offset'] if resume else None)
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def add(self, window, df):
+        self.ready[window] = df
+        while self.pending:
+            first = min(self.pending)
+            if first not in self.ready:
+                break
+            self.pending.remove(first)
+            self._write(self.ready.pop(first))
+            if self.journal is not None and self.writer is not None and self.writer.resumable:
+                self.journal.window_done(self.task, first, self.rows, self.writer.offset(), self.last_time)
+
+    def split(self, window, halves):
+        self.pending.remove(window)
+        self.pending.update(halves)
+        self.outstanding += len(halves)
+
+    def _write(self, df):
+        if df.empty:
+            return
+        df = df.drop_duplicates('trade_time')
+        if self.last_time is not None:
+            df = df[df['trade_time'] > self.last_time]
+        if df.empty:
+            return
+        self.last_time = df['trade_time'].iloc[-1]
+        self.rows += len(df)
+        if self.writer is not None:
+            self.writer.write(df)
+        else:
+            self.frames.append(df)
+
+    def finish(self):
+        seconds = time.perf_counter() - self.start
+        if self.error is None and self.rows == 0:
+            # 区间内有交易日但各窗口都没有K线（停牌、尚未上市）：与没有交易日的任务一致，以0行完成，不生成文件
+            if self.writer is not None:
+                self.writer.abort()
+            return DownloadResult(self.task, attempts=self.attempts, seconds=seconds, rows=0)
+        if self.error is not None:
+            # 有作业日志时保留已写入的临时文件，继续或重试时从最后完成的窗口接着下载
+            if self.writer is not None and not (self.journal is not None and self.writer.resumable):
+                self.writer.abort()
+            return DownloadResult(self.task, error=self.error, attempts=self.attempts, seconds=seconds)
+        df = None
+        if self.writer is not None:
+            try:
+                self.writer.close()
+            except Exception as e:
+                self.writer.abort()
+                return DownloadResult(self.task, error=f"保存文件失败: {e}", attempts=self.attempts,
+                                      seconds=seconds)
+        else:
+            df = pd.concat(self.frames, ignore_index=True)
+        last_date = str(self.last_time).replace('-', '')[:8] if self.last_time is not None else None
+        return DownloadResult(self.task, df=df, attempts=self.attempts, seconds=seconds, rows=self.rows,
+                              last_date=last_date)
+
+
+def build_tasks(stock_list_df, save_dir):
+#    """
+#    把股票清单DataFrame转换为下载任务列表（文件名、日志文件规则与原下载流程一致）。
+#    增量规划的区间（plan_downloads 计划中 delta 为True的行）写入 <代码>_<day|min>_<起>_<止> 文件，
+#    不覆盖保存该股票完整区间的 <代码>_<day|min> 文件；未经规划的清单中同一股票有多行时同样附加区间。
+#    """
+    tasks = []
+    ext = Data01_file_utils.data_file_ext()
+    if 'delta' in stock_list_df.columns:
+        deltas = stock_list_df['delta'].astype(bool).tolist()
+    else:
+        deltas = stock_list_df.duplicated(['stock_code', 'data_type'], keep=False).tolist()
+    for row, delta in zip(stock_list_df.itertuples(index=False), deltas):
+        if row.data_type == '日数据':
+            suffix = 'day'
+            log_file = Data01_config.LOG_DAY_FILE
+        else:  # 分钟数据
+            suffix = 'min'
+            log_file = Data01_config.LOG_MIN_FILE
+        if delta:
+            filename = f"{row.stock_code}_{suffix}_{row.start_date}_{row.end_date}{ext}"
+        else:
+            filename = f"{row.stock_code}_{suffix}{ext}"
+        filepath = os.path.join(save_dir, filename)
+        tasks.append(DownloadTask(row.stock_code, row.start_date, row.end_date,
+                                  row.data_type, filepath, log_file))
+    return tasks
+
+
+class DownloadScheduler:
+#    """
+#    下载调度器。
+#    使用 workers 个线程并发调用 Data01_tushare_utils.download_stock_data，
+#    每个接口一个令牌桶（rate_limits: {接口名: 每分钟次数}）。
+#    遇到频率超限时暂停该接口的令牌桶，并按指数退避重试；其他错误同样有限次重试，失败原因记入结果。
+#    cache: 响应缓存，默认使用 Data01_tushare_utils.get_response_cache()，传 False 关闭
+#    分钟数据任务按 min_row_limit 切分为多个时间窗口，与其他任务一起在线程池中并发获取。
+#    journal: 可选的作业日志（Data01_download_journal.DownloadJournal），记录每个任务的结果，
+#    分钟任务从上次中断的窗口继续。
+#    提交的请求数登记为 Data01_metrics 的 download 阶段工作量（阶段由调用方 start_stage 开始），
+#    每个请求完成（含缓存命中、失败）时计入完成量，用于按实测吞吐量估算剩余时间。
+#    """
+    def __init__(self, pro, workers=None, rate_limits=None, default_rate=None,
+                 max_retries=None, backoff_seconds=None, per=60.0, log=None, cache=None,
+                 min_freq=None, min_row_limit=None, journal=None):
+        self.pro = pro
+        self.cache = cache
+        self.journal = journal
+        self.min_freq = min_freq or Data01_config.MIN_FREQ
+        self.min_row_limit = min_row_limit or Data01_config.MIN_ROW_LIMIT
+        self.workers = workers or Data01_config.DOWNLOAD_WORKERS
+        self.rate_limits = dict(Data01_config.API_RATE_LIMITS if rate_limits is None else rate_limits)
+        self.default_rate = default_rate or Data01_config.DEFAULT_CALLS_PER_MINUTE
+        self.max_retries = Data01_config.DOWNLOAD_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_seconds = Data01_config.DOWNLOAD_BACKOFF_SECONDS if backoff_seconds is None else backoff_seconds
+        self.per = per
+        self.log = log or print
+        self.buckets = {}
+        self.buckets_lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def bucket_for(self, endpoint):
+        """取得（必要时创建）某接口的令牌桶"""
+        with self.buckets_lock:
+            bucket = self.buckets.get(endpoint)
+            if bucket is None:
+                rate = self.rate_limits.get(endpoint, self.default_rate)
+                bucket = TokenBucket(rate, per=self.per)
+                self.buckets[endpoint] = bucket
+            return bucket
+
+    def stop(self):
+        """请求停止：尚未开始的任务直接返回失败"""
+        self.stop_event.set()
+
+    def _call_with_retry(self, endpoint, label, fetch):
+        """
+        调用 fetch(before_call)，频率超限时暂停该接口令牌桶并指数退避重试；
+        其他错误（网络、超时、权限等）同样按指数退避重试，最多 max_retries 次，之后以异常信息作为失败原因。
+        返回 (df, error, attempts)；error 不为None时表示失败。
+        """
+        bucket = self.bucket_for(endpoint)
+        attempts = 0
+
+        def before_call():
+            # 只有真正请求接口时才取令牌，响应缓存命中不占用调用次数；等待令牌（含退避暂停）的用时按接口记录
+            start = time.perf_counter()
+            acquired = bucket.acquire(self.stop_event)
+            Data01_metrics.observe('api_rate_limit_wait_seconds', time.perf_counter() - start, endpoint=endpoint)
+            if not acquired:
+                raise Data01_tushare_utils.DownloadCancelled()
+
+        try:
+            while True:
+                if self.stop_event.is_set():
+                    return None, "已取消", attempts
+                attempts += 1
+                try:
+                    return fetch(before_call), None, attempts
+                except Data01_tushare_utils.DownloadCancelled:
+                    return None, "已取消", attempts
+                except Data01_tushare_utils.RateLimitError as e:
+                    if attempts > self.max_retries:
+                        return None, f"频率超限，重试{self.max_retries}次后放弃: {e}", attempts
+                    delay = self.backoff_seconds * (2 ** (attempts - 1)) * (1 + random.random() * 0.5)
+                    self.log(f"{endpoint} 接口频率超限，{delay:.1f} 秒后重试: {label}")
+                    bucket.penalize(delay)
+                except Exception as e:
+                    if attempts > self.max_retries:
+                        return None, f"重试{self.max_retries}次后放弃: {e}", attempts
+                    delay = self.backoff_seconds * (2 ** (attempts - 1)) * (1 + random.random() * 0.5)
+                    self.log(f"{endpoint} 接口调用失败，{delay:.1f} 秒后重试: {label} {e}")
+                    if self.stop_event.wait(delay):
+                        return None, "已取消", attempts
+        finally:
+            Data01_metrics.advance('download')
+
+    def _daily_calls(self):
+        # 一次日线请求连带的接口请求数（另取复权因子时为2）
+        return 2 if Data01_config.DOWNLOAD_ADJ_FACTOR else 1
+
+    def _run_task(self, task):
+        start = time.perf_counter()
+        endpoint = Data01_tushare_utils.endpoint_for(task.data_type)
+        df, error, attempts = self._call_with_retry(
+            endpoint, task.stock_code,
+            lambda before_call: Data01_tushare_utils.download_stock_data(
+                self.pro, task.stock_code, task.start_date, task.end_date,
+                task.data_type, raise_rate_limit=True, cache=self.cache,
+                before_call=before_call, raise_errors=True))
+        if error is None and df is None:
+            error = "未下载到数据"
+        if error is not None:
+            if task.data_type == '日数据' and Data01_config.DOWNLOAD_ADJ_FACTOR:
+                Data01_metrics.advance('download')   # 不再请求复权因子
+            return DownloadResult(task, error=error, attempts=attempts,
+                                  seconds=time.perf_counter() - start)
+        if task.data_type == '日数据' and Data01_config.DOWNLOAD_ADJ_FACTOR:
+            factors, factor_attempts = self._fetch_adj_factor(
+                task.stock_code, stock_code=task.stock_code,
+                start_date=task.start_date, end_date=task.end_date)
+            attempts += factor_attempts
+            df = Data01_tushare_utils.merge_adj_factor(df, factors)
+        if task.filepath:
+            try:
+                Data01_tushare_utils.save_data(df, task.filepath)
+            except Exception as e:
+                return DownloadResult(task, error=f"保存文件失败: {e}", attempts=attempts,
+                                      seconds=time.perf_counter() - start)
+        return DownloadResult(task, df=df, attempts=attempts,
+                              seconds=time.perf_counter() - start)
+
+    def trade_dates(self, start_date, end_date):
+        """查询 [start_date, end_date] 内的开市日（经限流与缓存），失败时抛出异常"""
+        df, error, _ = self._call_with_retry(
+            'trade_cal', f"{start_date}-{end_date}",
+            lambda before_call: Data01_tushare_utils.get_trade_dates(
+                self.pro, start_date, end_date, raise_rate_limit=True,
+                cache=self.cache, before_call=before_call))
+        if error is not None:
+            raise Exception(f"获取交易日历失败: {error}")
+        return df
+
+    def _fetch_adj_factor(self, label, **params):
+        """
+        获取复权因子（adj_factor 接口单独限流），返回 (df, attempts)。
+        失败时只记录日志并返回 (None, attempts)：日线照常保存，导入时由收盘价与昨收价推算因子。
+        """
+        df, error, attempts = self._call_with_retry(
+            'adj_factor', label,
+            lambda before_call: Data01_tushare_utils.download_adj_factor(
+                self.pro, **params, raise_rate_limit=True, cache=self.cache,
+                before_call=before_call, raise_errors=True))
+        if error is not None or df is None:
+            self.log(f"获取复权因子失败，导入时将按昨收价推算: {label} {error or ''}")
+            return None, attempts
+        return df, attempts
+
+    def _fetch_date(self, trade_date):
+        df, error, attempts = self._call_with_retry(
+            'daily', trade_date,
+            lambda before_call: Data01_tushare_utils.download_market_daily(
+                self.pro, trade_date, raise_rate_limit=True, cache=self.cache,
+                before_call=before_call, raise_errors=True))
+        if error is None and df is None:
+            error = "未下载到数据"
+        if error is None and not df.empty and Data01_config.DOWNLOAD_ADJ_FACTOR:
+            factors, factor_attempts = self._fetch_adj_factor(trade_date, trade_date=trade_date)
+            attempts += factor_attempts
+            df = Data01_tushare_utils.merge_adj_factor(df, factors)
+        elif Data01_config.DOWNLOAD_ADJ_FACTOR:
+            Data01_metrics.advance('download')   # 不再请求复权因子
+        return trade_date, df, error, attempts
+
+    def _finish_by_date(self, tasks, done, task_days, frames, errors, attempts, seconds):
+        """
+        一批所需交易日已全部完成的任务：合并相关交易日的数据后只排序一次，
+        再按 ts_code 位置切片得到各股票的数据（按tushare习惯日期倒序），写入各自的文件。
+        """
+        ok = [index for index in done if not errors[index]]
+        days = sorted({day for index in ok for day in task_days[index] if day in frames})
+        codes = {tasks[index].stock_code for index in ok}
+        combined = pd.DataFrame()
+        if days:
+            combined = pd.concat([frames[day] for day in days], ignore_index=True)
+            combined = combined[combined['ts_code'].isin(codes)]
+            combined = combined.sort_values(['ts_code', 'trade_date'], ascending=[True, False],
+                                            ignore_index=True)
+        sorted_codes = combined['ts_code'].to_numpy() if not combined.empty else None
+
+        results = []
+        for index in done:
+            task = tasks[index]
+            if errors[index]:
+                results.append(DownloadResult(task, error="; ".join(errors[index][:3]),
+                                              attempts=attempts[index], seconds=seconds))
+                continue
+            if sorted_codes is not None:
+                lo = sorted_codes.searchsorted(task.stock_code, side='left')
+                hi = sorted_codes.searchsorted(task.stock_code, side='right')
+                df = combined.iloc[lo:hi]
+                if len(task_days[index]) < len(days):
+                    # 同一批中有区间更长的任务，截取本任务的区间
+                    dates = df['trade_date']
+                    df = df[(dates >= task.start_date) & (dates <= task.end_date)]
+                df = df.reset_index(drop=True)
+            else:
+                df = pd.DataFrame()
+            # 区间内停牌或尚未上市时 df 为空表：没有数据，但该区间已确认无需再下载
+            if task.filepath and not df.empty:
+                try:
+                    Data01_tushare_utils.save_data(df, task.filepath)
+                except Exception as e:
+                    results.append(DownloadResult(task, error=f"保存文件失败: {e}",
+                                                  attempts=attempts[index], seconds=seconds))
+                    continue
+            results.append(DownloadResult(task, df=df, attempts=attempts[index], seconds=seconds))
+        return results
+
+    def run_by_date(self, tasks, trade_dates):
+        """
+        按交易日获取日线：每个交易日调用一次全市场 pro.daily(trade_date=...)，
+        按 ts_code 路由到各任务，某任务所需的交易日全部完成后立即产出其 DownloadResult。
+        trade_dates 为开市日列表（见 trade_dates 方法），任务区间外的日期不会被请求。
+        与 run 共用停止标志且不重置它，串联在 run 之后时取消请求仍然有效。
+        任务的划分与请求数的登记在调用时立即完成（串联在 run 之后时，剩余时间的估计从一开始就包含这部分），
+        返回的生成器再逐个产出结果。
+        """
+        start = time.perf_counter()
+        calendar = sorted(trade_dates)
+        by_date = {}        # 交易日 -> 需要该日的任务序号
+        task_days = []
+        for index, task in enumerate(tasks):
+            days = [day for day in calendar if task.start_date <= day <= task.end_date]
+            task_days.append(days)
+            for day in days:
+                by_date.setdefault(day, []).append(index)
+        Data01_metrics.add_work('download', len(by_date) * self._daily_calls())
+        return self._by_date_results(tasks, by_date, task_days, start)
+
+    def _by_date_results(self, tasks, by_date, task_days, start):
+        # run_by_date 的结果生成器
+        remaining = [len(days) for days in task_days]
+        users = {day: len(indexes) for day, indexes in by_date.items()}
+        frames = {}         # 交易日 -> 当天数据（只保留本次需要的股票），所有任务用完后释放
+        errors = [[] for _ in tasks]
+        attempts = [0] * len(tasks)
+
+        # 区间内没有交易日的任务直接完成
+        empty = [index for index, count in enumerate(remaining) if count == 0]
+        if empty:
+            for result in self._finish_by_date(tasks, empty, task_days, frames, errors, attempts,
+                                               time.perf_counter() - start):
+                yield self._record(result)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._fetch_date, day) for day in sorted(by_date)]
+            for future in as_completed(futures):
+                day, df, error, day_attempts = future.result()
+                if error is None and not df.empty:
+                    wanted = {tasks[index].stock_code for index in by_date[day]}
+                    frames[day] = df[df['ts_code'].isin(wanted)]
+                done = []
+                for index in by_date[day]:
+                    attempts[index] += day_attempts
+                    if error is not None:
+                        errors[index].append(f"{day} {error}")
+                    remaining[index] -= 1
+                    if remaining[index] == 0:
+                        done.append(index)
+                if not done:
+                    continue
+                for result in self._finish_by_date(tasks, done, task_days, frames, errors, attempts,
+                                                   time.perf_counter() - start):
+                    yield self._record(result)
+                for index in done:
+                    for used in task_days[index]:
+                        users[used] -= 1
+                        if users[used] == 0:
+                            frames.pop(used, None)
+
+    def _fetch_window(self, job, window):
+        """
+        获取分钟任务的一个时间窗口并交给 job 写盘。
+        返回值：任务全部窗口完成时为 DownloadResult；窗口被截断拆分时为需要新提交的 [(job, window)]；否则None。
+        """
+        task = job.task
+        df, error, attempts = None, None, 0
+        if job.error is None:
+            df, error, attempts = self._call_with_retry(
+                'stk_mins', f"{task.stock_code} {window[0][:10]}",
+                lambda before_call: Data01_tushare_utils.download_minute_window(
+                    self.pro, task.stock_code, window[0], window[1], self.min_freq,
+                    raise_rate_limit=True, cache=self.cache, before_call=before_call,
+                    raise_errors=True))
+            if error is None and df is None:
+                error = "未下载到数据"
+        else:
+            Data01_metrics.advance('download')   # 任务已失败，不再请求
+        with job.lock:
+            job.outstanding -= 1
+            job.attempts += attempts
+            if job.error is None and error is not None:
+                job.error = f"{window[0][:10]}~{window[1][:10]} {error}"
+            elif job.error is None:
+                # 返回行数达到上限说明被截断：拆分窗口重新获取
+                halves = None
+                if len(df) >= job.row_limit:
+                    halves = Data01_tushare_utils.split_minute_window(*window)
+                if halves:
+                    job.split(window, halves)
+                    return [(job, half) for half in halves]
+                try:
+                    job.add(window, df)
+                except Exception as e:
+                    job.error = f"保存文件失败: {e}"
+            if job.outstanding == 0:
+                return job.finish()
+        return None
+
+    def _record(self, result):
+        # 有作业日志时记录任务结果（done / failed+原因，取消的任务保持 pending）
+        if self.journal is not None:
+            self.journal.record_result(result)
+        return result
+
+    def _minute_job(self, task):
+        """
+        创建分钟任务的 MinuteJob，返回 (job, windows)；区间内没有交易日时 job 为None（任务以0行完成）。
+        作业日志中有已完成的窗口且临时文件仍在时，从最后完成的窗口之后继续；否则从头开始。
+        """
+        resume = self.journal.resume_point(task) if self.journal is not None else None
+        start_date = task.start_date
+        if resume is not None:
+            part = task.filepath + '.part' if task.filepath else None
+            if (part and resume['file_offset'] and os.path.exists(part)
+                    and os.path.getsize(part) >= resume['file_offset']):
+                start_date = (pd.Timestamp(resume['through']).normalize()
+                              + pd.Timedelta(days=1)).strftime('%Y%m%d')
+            else:
+                resume = None
+                self.journal.reset_windows(task)
+        windows = []
+        if start_date <= str(task.end_date):
+            windows = Data01_tushare_utils.minute_windows(
+                start_date, task.end_date, self.min_freq, self.min_row_limit)
+        if not windows and resume is None:
+            return None, []
+        return MinuteJob(task, windows, self.min_row_limit, self.journal, resume), windows
+
+    def run(self, tasks):
+        """
+        并发执行全部任务，按完成顺序逐个产出 DownloadResult。
+        分钟数据任务拆分为多个时间窗口提交，窗口到达后按顺序流式写入文件。
+        产出发生在调用方线程，可在此安全地更新日志文件或发射信号。
+        """
+        self.stop_event.clear()
+        completed = queue.Queue()
+        outstanding = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            def submit(fn, *args):
+                nonlocal outstanding
+                outstanding += 1
+                executor.submit(fn, *args).add_done_callback(completed.put)
+
+            for task in tasks:
+                if task.data_type == '分钟数据':
+                    job, windows = self._minute_job(task)
+                    if job is None:
+                        # 与按交易日下载的日线一致：区间内没有交易日时直接完成（0行），不记为失败
+                        yield self._record(DownloadResult(task, rows=0))
+                    elif not windows:
+                        # 上次中断时所有窗口都已写入，只差完成文件
+                        yield self._record(job.finish())
+                    Data01_metrics.add_work('download', len(windows))
+                    for window in windows:
+                        submit(self._fetch_window, job, window)
+                else:
+                    Data01_metrics.add_work('download', self._daily_calls() if task.data_type == '日数据' else 1)
+                    submit(self._run_task, task)
+
+            while outstanding:
+                outcome = completed.get().result()
+                outstanding -= 1
+                if isinstance(outcome, DownloadResult):
+                    yield self._record(outcome)
+                elif outcome:
+                    # 被截断的窗口拆分为两半重新获取
+                    Data01_metrics.add_work('download', len(outcome))
+                    for job, window in outcome:
+                        submit(self._fetch_window, job, window)
@@ -0,0 +1,229 @@
+# """
+# 下载任务日志（断点续传）：每次下载运行是一个持久化的作业。
+# 以SQLite记录每个下载任务的状态：pending（未完成）、done（完成）、failed（失败及原因），
+# 以及分钟数据已写入文件的时间窗口。每次状态变化都是一个独立提交的事务，
+# 程序崩溃或断网后，下次可以只继续未完成的任务（resume），或只重试失败的任务（retry failed）。
+# """
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import Data01_config
+import Data01_file_utils
+
+# 作业状态
+JOB_RUNNING = "running"         # 运行中（程序异常退出后也保持该状态）
+JOB_INCOMPLETE = "incomplete"   # 运行结束但仍有未完成或失败的任务
+JOB_FINISHED = "finished"       # 全部任务完成
+
+# 任务状态
+TASK_PENDING = "pending"
+TASK_DONE = "done"
+TASK_FAILED = "failed"
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class DownloadJournal:
+#    """
+#    下载作业日志。一个实例对应一个数据库文件，create_job / open_job 之后操作当前作业。
+#    各方法线程安全（读写都持有 self.lock）：分钟窗口的完成记录来自下载线程，任务结果与查询来自调用方线程，
+#    共用同一个连接。
+#    """
+    def __init__(self, db_path=None):
+        self.db_path = db_path or Data01_config.JOURNAL_DB_PATH
+        self.job_id = None
+        self.lock = threading.Lock()
+        Data01_file_utils.ensure_dir(os.path.dirname(self.db_path))
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # WAL + FULL：每次提交都已落盘，崩溃后日志与已保存的文件一致
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                save_dir TEXT,
+                status TEXT NOT NULL,
+                created_at TEXT,
+                updated_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS job_tasks (
+                job_id INTEGER NOT NULL,
+                task_id INTEGER NOT NULL,
+                stock_code TEXT NOT NULL,
+                data_type TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                end_date TEXT NOT NULL,
+                filepath TEXT,
+                log_file TEXT,
+                status TEXT NOT NULL,
+                reason TEXT,
+                rows INTEGER,
+                attempts INTEGER DEFAULT 0,
+                updated_at TEXT,
+                PRIMARY KEY (job_id, task_id)
+            );
+            CREATE TABLE IF NOT EXISTS job_windows (
+                job_id INTEGER NOT NULL,
+                task_id INTEGER NOT NULL,
+                window_start TEXT NOT NULL,
+                window_end TEXT NOT NULL,
+                rows INTEGER,
+                file_offset INTEGER,
+                last_time TEXT,
+                PRIMARY KEY (job_id, task_id, window_start)
+            );
+        """)
+        self.conn.commit()
+
+    def create_job(self, tasks, save_dir=None):
+        """新建作业并登记全部任务（状态 pending），为每个任务分配 task_id，返回 job_id"""
+        now = _now()
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO jobs (save_dir, status, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (save_dir, JOB_RUNNING, now, now))
+            self.job_id = cursor.lastrowid
+            for task_id, task in enumerate(tasks, start=1):
+                task.task_id = task_id
+            self.conn.executemany(
+                "INSERT INTO job_tasks (job_id, task_id, stock_code, data_type, start_date, end_date, "
+                "filepath, log_file, status, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(self.job_id, task.task_id, task.stock_code, task.data_type, str(task.start_date),
+                  str(task.end_date), task.filepath, task.log_file, TASK_PENDING, now) for task in tasks])
+        return self.job_id
+
+    def latest_job(self):
+        """最近一个未全部完成的作业：{'job_id', 'status', 'created_at', 'pending', 'failed', 'done'}，没有时返回None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT job_id FROM jobs WHERE status != ? ORDER BY job_id DESC LIMIT 1",
+                (JOB_FINISHED,)).fetchone()
+        if row is None:
+            return None
+        return self.job_info(row[0])
+
+    def job_info(self, job_id):
+        with self.lock:
+            status, created_at = self.conn.execute(
+                "SELECT status, created_at FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            counts = self.conn.execute(
+                "SELECT status, COUNT(*) FROM job_tasks WHERE job_id = ? GROUP BY status", (job_id,)).fetchall()
+        info = {'job_id': job_id, 'status': status, 'created_at': created_at,
+                TASK_PENDING: 0, TASK_DONE: 0, TASK_FAILED: 0}
+        for task_status, count in counts:
+            info[task_status] = count
+        return info
+
+    def open_job(self, job_id):
+        """打开已有作业继续运行"""
+        with self.lock, self.conn:
+            self.job_id = job_id
+            self.conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?",
+                              (JOB_RUNNING, _now(), job_id))
+
+    def requeue_failed(self):
+        """把当前作业中失败的任务重新置为 pending，返回数量"""
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "UPDATE job_tasks SET status = ?, reason = NULL, updated_at = ? WHERE job_id = ? AND status = ?",
+                (TASK_PENDING, _now(), self.job_id, TASK_FAILED))
+        return cursor.rowcount
+
+    def load_tasks(self, status=TASK_PENDING):
+        """读取当前作业中指定状态的任务，返回 DownloadTask 列表（带 task_id）"""
+        # 下载引擎依赖pandas，界面启动时只查询作业状态，用到时再导入
+        import Data01_download_engine
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT task_id, stock_code, start_date, end_date, data_type, filepath, log_file "
+                "FROM job_tasks WHERE job_id = ? AND status = ? ORDER BY task_id", (self.job_id, status)).fetchall()
+        tasks = []
+        for task_id, stock_code, start_date, end_date, data_type, filepath, log_file in rows:
+            task = Data01_download_engine.DownloadTask(stock_code, start_date, end_date, data_type,
+                                                       filepath, log_file)
+            task.task_id = task_id
+            tasks.append(task)
+        return tasks
+
+    def failures(self):
+        """当前作业中失败的任务：[(stock_code, data_type, reason)]"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT stock_code, data_type, reason FROM job_tasks WHERE job_id = ? AND status = ? "
+                "ORDER BY task_id", (self.job_id, TASK_FAILED)).fetchall()
+
+    def record_result(self, result):
+        """记录一个 DownloadResult：成功为 done，失败为 failed 并保存原因；被取消的任务保持 pending"""
+        task = result.task
+        if getattr(task, 'task_id', None) is None or self.job_id is None:
+            return
+        if result.ok:
+            status, reason = TASK_DONE, None
+        elif str(result.error).endswith("已取消"):
+            return
+        else:
+            status, reason = TASK_FAILED, result.error
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE job_tasks SET status = ?, reason = ?, rows = ?, attempts = attempts + ?, updated_at = ? "
+                "WHERE job_id = ? AND task_id = ?",
+                (status, reason, result.rows, result.attempts, _now(), self.job_id, task.task_id))
+            if status == TASK_DONE:
+                # 任务完成后窗口记录不再需要
+                self.conn.execute("DELETE FROM job_windows WHERE job_id = ? AND task_id = ?",
+                                  (self.job_id, task.task_id))
+
+    def window_done(self, task, window, rows, file_offset, last_time):
+        """
+        分钟任务的一个时间窗口已写入临时文件：记录累计行数、文件长度和最后一根K线的时间，
+        续传时把临时文件截断到 file_offset 后从下一个窗口继续。
+        """
+        if getattr(task, 'task_id', None) is None or self.job_id is None:
+            return
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO job_windows (job_id, task_id, window_start, window_end, rows, "
+                "file_offset, last_time) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.job_id, task.task_id, window[0], window[1], rows, file_offset, last_time))
+
+    def resume_point(self, task):
+        """
+        分钟任务的续传位置：{'through': 已完成的最后窗口结束时间, 'rows', 'file_offset', 'last_time'}，
+        没有已完成的窗口时返回None
+        """
+        if getattr(task, 'task_id', None) is None or self.job_id is None:
+            return None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT window_end, rows, file_offset, last_time FROM job_windows "
+                "WHERE job_id = ? AND task_id = ? ORDER BY window_end DESC LIMIT 1",
+                (self.job_id, task.task_id)).fetchone()
+        if row is None:
+            return None
+        return {'through': row[0], 'rows': row[1], 'file_offset': row[2], 'last_time': row[3]}
+
+    def reset_windows(self, task):
+        """任务从头开始（临时文件已不存在或格式不支持续传）时清除窗口记录"""
+        if getattr(task, 'task_id', None) is None or self.job_id is None:
+            return
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM job_windows WHERE job_id = ? AND task_id = ?",
+                              (self.job_id, task.task_id))
+
+    def finish_job(self):
+        """运行结束：全部完成为 finished，否则为 incomplete；返回作业统计"""
+        info = self.job_info(self.job_id)
+        status = JOB_FINISHED if info[TASK_PENDING] == 0 and info[TASK_FAILED] == 0 else JOB_INCOMPLETE
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?",
+                              (status, _now(), self.job_id))
+        info['status'] = status
+        return info
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,194 @@
+# """
+# 离线模拟的 tushare pro 对象，用于在没有网络/积分的情况下测试下载吞吐量与限流。
+# 生成与 pro.daily / pro.adj_factor / pro.stk_mins 返回结构一致的合成行情数据，并按接口模拟每分钟调用上限。
+# """
+import time
+import zlib
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+
+def _business_days(start_date, end_date):
+    """返回 [start_date, end_date] 之间的工作日（YYYYMMDD字符串，降序，与tushare一致）"""
+    days = pd.bdate_range(pd.to_datetime(start_date, format='%Y%m%d'),
+                          pd.to_datetime(end_date, format='%Y%m%d'))
+    return days.strftime('%Y%m%d')[::-1]
+
+
+class FakePro:
+#    """
+#    模拟的 pro api。
+#    latency: 每次调用的模拟网络延迟（秒）
+#    rate_limits: {接口名: 窗口内允许的调用次数}，超过时抛出与tushare相同措辞的异常
+#    window: 限流统计窗口（秒），默认60秒；测试时可缩短以加速
+#    min_row_limit: stk_mins 单次最多返回的行数，超出部分与tushare一样被静默截断
+#    market_size / universe: 按交易日全市场查询 daily(trade_date=...) 时返回的股票数量或代码列表
+#    """
+    def __init__(self, latency=0.0, rate_limits=None, window=60.0, seed=0, min_row_limit=8000,
+                 market_size=5000, universe=None):
+        self.latency = latency
+        self.min_row_limit = min_row_limit
+        if universe is None:
+            half = market_size // 2
+            universe = ([f"{600000 + i:06d}.SH" for i in range(half)] +
+                        [f"{i + 1:06d}.SZ" for i in range(market_size - half)])
+        self.universe = list(universe)
+        self.rate_limits = dict(rate_limits or {})
+        self.window = window
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.calls = {}        # 接口名 -> 成功调用的时间戳列表
+        self.rejected = {}     # 接口名 -> 被拒绝次数
+        self._recent = {}      # 接口名 -> 窗口内调用时间戳
+
+    def _check_rate(self, endpoint):
+        limit = self.rate_limits.get(endpoint)
+        now = time.monotonic()
+        with self.lock:
+            recent = self._recent.setdefault(endpoint, deque())
+            while recent and recent[0] <= now - self.window:
+                recent.popleft()
+            if limit is not None and len(recent) >= limit:
+                self.rejected[endpoint] = self.rejected.get(endpoint, 0) + 1
+                raise Exception(f"抱歉，您每分钟最多访问该接口{limit}次，权限的具体详情访问：https://tushare.pro/document/1?doc_id=108。")
+            recent.append(now)
+            self.calls.setdefault(endpoint, []).append(now)
+
+    def max_calls_in_window(self, endpoint):
+        """统计任意一个窗口内的最大成功调用次数，用于验证限流是否合规"""
+        stamps = self.calls.get(endpoint, [])
+        best = 0
+        left = 0
+        for right, stamp in enumerate(stamps):
+            while stamp - stamps[left] >= self.window:
+                left += 1
+            best = max(best, right - left + 1)
+        return best
+
+    def _price_frame(self, ts_code, trade_dates):
+        # 以股票代码为种子生成稳定的随机游走价格
+        rng = np.random.default_rng([self.seed, zlib.crc32(str(ts_code).encode())])
+        n = len(trade_dates)
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))[::-1]
+        pre_close = np.append(close[1:], close[-1] if n else 0)
+        open_ = pre_close * (1 + rng.normal(0, 0.01, n))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+        vol = rng.uniform(1e4, 1e6, n)
+        # 与tushare一致：涨跌额、涨跌幅由两位小数的收盘价、昨收计算
+        close, pre_close = close.round(2), pre_close.round(2)
+        return pd.DataFrame({
+            'ts_code': ts_code,
+            'trade_date': list(trade_dates),
+            'open': open_.round(2),
+            'high': high.round(2),
+            'low': low.round(2),
+            'close': close.round(2),
+            'pre_close': pre_close.round(2),
+            'change': (close - pre_close).round(2),
+            'pct_chg': ((close / pre_close - 1) * 100).round(4),
+            'vol': vol.round(2),
+            'amount': (vol * close / 10).round(3),
+        })
+
+    def _market_frame(self, trade_date):
+        # 全市场某一交易日：每只股票一行，以日期为种子生成
+        n = len(self.universe)
+        if pd.Timestamp(trade_date).weekday() >= 5:
+            n = 0
+        rng = np.random.default_rng([self.seed, zlib.crc32(str(trade_date).encode())])
+        pre_close = rng.uniform(3, 100, n)
+        close = pre_close * (1 + rng.normal(0, 0.02, n))
+        open_ = pre_close * (1 + rng.normal(0, 0.01, n))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+        vol = rng.uniform(1e4, 1e6, n)
+        # 与tushare一致：涨跌额、涨跌幅由两位小数的收盘价、昨收计算
+        close, pre_close = close.round(2), pre_close.round(2)
+        return pd.DataFrame({
+            'ts_code': self.universe[:n],
+            'trade_date': str(trade_date),
+            'open': open_.round(2),
+            'high': high.round(2),
+            'low': low.round(2),
+            'close': close.round(2),
+            'pre_close': pre_close.round(2),
+            'change': (close - pre_close).round(2),
+            'pct_chg': ((close / pre_close - 1) * 100).round(4),
+            'vol': vol.round(2),
+            'amount': (vol * close / 10).round(3),
+        })
+
+    def daily(self, ts_code=None, start_date=None, end_date=None, trade_date=None, **kwargs):
+        self._check_rate('daily')
+        if self.latency:
+            time.sleep(self.latency)
+        if ts_code is None and trade_date is not None:
+            return self._market_frame(trade_date)
+        if trade_date is not None:
+            start_date = end_date = trade_date
+        return self._price_frame(ts_code, _business_days(start_date, end_date))
+
+    def adj_factor(self, ts_code=None, start_date=None, end_date=None, trade_date=None, **kwargs):
+        # 复权因子：每只股票约每250个交易日除权一次，因子按固定比例递增
+        self._check_rate('adj_factor')
+        if self.latency:
+            time.sleep(self.latency)
+        if ts_code is None and trade_date is not None:
+            codes, dates = self.universe, [str(trade_date)] * len(self.universe)
+        else:
+            if trade_date is not None:
+                start_date = end_date = trade_date
+            dates = list(_business_days(start_date, end_date))
+            codes = [ts_code] * len(dates)
+        days = (pd.to_datetime(pd.Series(dates, dtype=str), format='%Y%m%d') - pd.Timestamp('1990-01-01')).dt.days
+        offsets = np.array([zlib.crc32(str(code).encode()) % 350 for code in codes], dtype=np.int64)
+        return pd.DataFrame({
+            'ts_code': codes,
+            'trade_date': dates,
+            'adj_factor': np.round(1.1 ** ((days.to_numpy() + offsets) // 350), 3),
+        })
+
+    def trade_cal(self, exchange='SSE', start_date=None, end_date=None, is_open=None, **kwargs):
+        # 交易日历：以工作日作为开市日（不模拟节假日），与tushare一样按日期倒序
+        self._check_rate('trade_cal')
+        days = pd.date_range(pd.to_datetime(start_date, format='%Y%m%d'),
+                             pd.to_datetime(end_date, format='%Y%m%d'))[::-1]
+        df = pd.DataFrame({
+            'exchange': exchange,
+            'cal_date': days.strftime('%Y%m%d'),
+            'is_open': (days.weekday < 5).astype(int),
+        })
+        if is_open is not None:
+            df = df[df['is_open'] == int(is_open)].reset_index(drop=True)
+        return df
+
+    def stk_mins(self, ts_code=None, freq='1min', start_date=None, end_date=None, **kwargs):
+        self._check_rate('stk_mins')
+        if self.latency:
+            time.sleep(self.latency)
+        start = pd.Timestamp(start_date)
+        end = pd.Timestamp(end_date)
+        step = int(freq.replace('min', ''))
+        times = []
+        for day in pd.bdate_range(start.normalize(), end.normalize()):
+            times.append(_session_minutes(day, step))
+        stamps = pd.DatetimeIndex(np.concatenate(times)) if times else pd.DatetimeIndex([])
+        stamps = stamps[(stamps >= start) & (stamps <= end)]
+        # 与tushare一致：按时间倒序返回，超过单次上限的部分被截断
+        stamps = stamps[::-1][:self.min_row_limit]
+        df = self._price_frame(ts_code, stamps.strftime('%Y-%m-%d %H:%M:%S'))
+        df = df.rename(columns={'trade_date': 'trade_time'})
+        return df[['ts_code', 'trade_time', 'open', 'close', 'high', 'low', 'vol', 'amount']]
+
+
+def _session_minutes(day, step=1):
+    """A股一个交易日的分钟K线时间戳：09:31-11:30、13:01-15:00（按 step 分钟取样）"""
+    morning = pd.date_range(day + pd.Timedelta('09:30:00'), day + pd.Timedelta('11:30:00'),
+                            freq=f'{step}min')[1:]
+    afternoon = pd.date_range(day + pd.Timedelta('13:00:00'), day + pd.Timedelta('15:00:00'),
+                              freq=f'{step}min')[1:]
+    return np.concatenate([morning.values, afternoon.values])
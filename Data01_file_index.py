@@ -0,0 +1,167 @@
+# """
+# 数据文件索引：为Form2的文件列表提供每个文件的行数、日期范围和导入状态。
+# 元数据按需计算（只读取日期一列），以 (路径, 修改时间, 大小) 为键缓存在SQLite中，文件变化后自动重新计算；
+# 导入清单 import_manifest：每个文件导入到每个目标数据库成功时记录大小、修改时间、内容哈希和目标表，
+# 据此区分 未导入 / 已导入 / 导入后已变更，并让导入流水线在解析之前跳过未变化的文件。
+# """
+import os
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+
+import Data01_config
+import Data01_file_utils
+
+# 导入状态
+STATUS_NEW = "未导入"
+STATUS_IMPORTED = "已导入"
+STATUS_CHANGED = "已变更"
+
+# 计算元数据时每块读取的行数（只读日期一列，内存占用很小）
+META_CHUNK_ROWS = 500000
+# 计算内容哈希时每次读取的字节数
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+def content_hash(file_path):
+#     """文件内容的快速哈希（BLAKE2b，128位），用于判断修改时间变化但内容相同的文件"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compute_metadata(file_path):
+#     """
+#     读取数据文件的日期列，返回 (行数, 最早日期, 最晚日期, 错误信息)。
+#     日线文件读 trade_date，分钟文件读 trade_time（文件名规则与导入时相同）。
+#     """
+    import Data01_import_pipeline
+    try:
+        data_type, _ = Data01_import_pipeline.classify_file(file_path)
+        column = 'trade_date' if data_type == 'day' else 'trade_time'
+        rows = 0
+        first = last = None
+        for chunk in Data01_file_utils.iter_data_file(file_path, META_CHUNK_ROWS, columns=[column]):
+            rows += len(chunk)
+            values = chunk[column].dropna().astype(str)
+            if values.empty:
+                continue
+            low, high = values.min(), values.max()
+            first = low if first is None else min(first, low)
+            last = high if last is None else max(last, high)
+        return rows, first, last, None
+    except Exception as e:
+        return None, None, None, str(e)
+
+
+def import_status(imported, path, size, mtime):
+#     """按导入记录 {路径: (大小, 修改时间)} 判断文件的导入状态"""
+    record = imported.get(path)
+    if record is None:
+        return STATUS_NEW
+    return STATUS_IMPORTED if record == (size, mtime) else STATUS_CHANGED
+
+
+class FileIndex:
+#    """
+#    文件索引数据库。file_meta 缓存元数据，import_manifest 以 (路径, 目标数据库) 为键记录导入成功时的文件状态。
+#    各方法线程安全，扫描线程、元数据线程、导入线程可以各自持有实例。
+#    """
+    def __init__(self, db_path=None):
+        self.db_path = db_path or Data01_config.FILE_INDEX_DB_PATH
+        self.lock = threading.Lock()
+        Data01_file_utils.ensure_dir(os.path.dirname(self.db_path))
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS file_meta (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                rows INTEGER,
+                first_date TEXT,
+                last_date TEXT,
+                error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS import_manifest (
+                path TEXT NOT NULL,
+                target TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                content_hash TEXT,
+                target_table TEXT,
+                imported_at TEXT,
+                PRIMARY KEY (path, target)
+            );
+        """)
+        self.conn.commit()
+
+    def load_meta(self):
+        """全部缓存的元数据：{路径: ((大小, 修改时间), (行数, 最早日期, 最晚日期, 错误信息))}"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT path, size, mtime, rows, first_date, last_date, error FROM file_meta").fetchall()
+        return {path: ((size, mtime), (count, first, last, error))
+                for path, size, mtime, count, first, last, error in rows}
+
+    def load_imported(self, target=None):
+        """导入记录：{路径: (大小, 修改时间)}；不指定目标数据库时取每个文件最近一次导入"""
+        sql = "SELECT path, size, mtime FROM import_manifest"
+        params = ()
+        if target is not None:
+            sql += " WHERE target = ?"
+            params = (target,)
+        with self.lock:
+            rows = self.conn.execute(sql + " ORDER BY imported_at", params).fetchall()
+        return {path: (size, mtime) for path, size, mtime in rows}
+
+    def metadata(self, path, size, mtime):
+        """取得文件元数据：缓存的 (大小, 修改时间) 与文件一致时直接返回，否则重新计算并写入缓存"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT rows, first_date, last_date, error FROM file_meta WHERE path = ? AND size = ? AND mtime = ?",
+                (path, size, mtime)).fetchone()
+        if row is not None:
+            return tuple(row)
+        meta = compute_metadata(path)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO file_meta (path, size, mtime, rows, first_date, last_date, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", (path, size, mtime, *meta))
+        return meta
+
+    def unchanged(self, path, target, table, size, mtime):
+        """
+        文件自上次导入到 target 以来是否未变化（按主键查一行，不读文件）：
+        目标表相同、大小和修改时间都相同即视为未变化；大小相同而修改时间不同时（如重新下载了相同内容）
+        再比较内容哈希，相同则更新记录的修改时间，之后又可以直接判断。
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime, content_hash, target_table FROM import_manifest WHERE path = ? AND target = ?",
+                (path, target)).fetchone()
+        if row is None or row[0] != size or row[3] != table:
+            return False
+        if row[1] == mtime:
+            return True
+        if not row[2] or content_hash(path) != row[2]:
+            return False
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE import_manifest SET mtime = ? WHERE path = ? AND target = ?",
+                              (mtime, path, target))
+        return True
+
+    def record_import(self, path, target, table, size, mtime):
+        """记录文件导入成功：size / mtime 为导入前取得的文件状态"""
+        digest = content_hash(path)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO import_manifest "
+                "(path, target, size, mtime, content_hash, target_table, imported_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, target, size, mtime, digest, table, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+    def close(self):
+        self.conn.close()
@@ -3,7 +3,12 @@
 # """
 import os
 import shutil
-import pandas as pd
+import sqlite3
+from datetime import datetime, timedelta
+import Data01_config
+import Data01_metrics
+
+# pandas 在各函数内按需导入：界面启动只用到目录操作，不必为此加载pandas
 
 def ensure_dir(directory):
 #     """确保目录存在，不存在则创建"""
@@ -32,6 +37,227 @@ def get_csv_files(directory):
             files.append(os.path.join(directory, filename))
     return files
 
+# 支持的数据文件格式及扩展名
+DATA_FILE_EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather'}
+
+# 列式文件的固定schema：代码、日期、时间列为字符串，其余行情列统一为float64
+STRING_COLUMNS = ('ts_code', 'trade_date', 'trade_time')
+
+def data_file_ext(fmt=None):
+#     """返回存储格式对应的扩展名，fmt默认取 Data01_config.STORAGE_FORMAT"""
+    fmt = fmt or Data01_config.STORAGE_FORMAT
+    if fmt not in DATA_FILE_EXTENSIONS:
+        raise ValueError(f"不支持的存储格式: {fmt}")
+    return DATA_FILE_EXTENSIONS[fmt]
+
+def get_data_files(directory, formats=None):
+#     """获取指定目录下所有数据文件路径列表（默认包含csv/parquet/feather）"""
+    if not os.path.exists(directory):
+        return []
+    extensions = tuple(DATA_FILE_EXTENSIONS[fmt] for fmt in (formats or DATA_FILE_EXTENSIONS))
+    files = []
+    for filename in os.listdir(directory):
+        if filename.lower().endswith(extensions):
+            files.append(os.path.join(directory, filename))
+    return files
+
+def scan_data_files(directory, formats=None):
+#     """
+#     用 os.scandir 扫描目录中的数据文件，返回按文件名排序的 [(路径, 文件名, 字节数, 修改时间)]。
+#     scandir 在遍历目录时已带回文件属性，数万个文件也只需一次目录读取。
+#     """
+    if not os.path.exists(directory):
+        return []
+    extensions = tuple(DATA_FILE_EXTENSIONS[fmt] for fmt in (formats or DATA_FILE_EXTENSIONS))
+    entries = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.name.lower().endswith(extensions) and entry.is_file():
+                stat = entry.stat()
+                entries.append((entry.path, entry.name, stat.st_size, stat.st_mtime))
+    entries.sort(key=lambda e: e[1])
+    return entries
+
+def apply_schema(df):
+#     """按固定schema转换列类型：字符串列转为str，其余列转为float64"""
+    import pandas as pd
+    converted = {}
+    for col in df.columns:
+        if col in STRING_COLUMNS:
+            converted[col] = df[col].astype(str)
+        else:
+            converted[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+    return pd.DataFrame(converted, index=df.index)
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401  列式格式依赖pyarrow
+    except ImportError:
+        raise Exception("请安装pyarrow包: pip install pyarrow")
+
+def save_data_file(df, filepath, compression=None):
+#     """
+#     按扩展名保存数据文件：.csv 为 utf-8-sig 文本；
+#     .parquet/.feather 先按固定schema转换类型，再压缩写入列式文件。
+#     用时与行数按格式记入 Data01_metrics（file_write_seconds / file_write_rows_total）。
+#     """
+    ext = os.path.splitext(filepath)[1].lower()
+    with Data01_metrics.timer('file_write_seconds', format=ext.lstrip('.')):
+        _save_data_file(df, filepath, ext, compression)
+    Data01_metrics.inc('file_write_rows_total', len(df), format=ext.lstrip('.'))
+
+def _save_data_file(df, filepath, ext, compression):
+    if ext == '.csv':
+        df.to_csv(filepath, index=False, encoding='utf-8-sig')
+        return
+    _require_pyarrow()
+    compression = compression or Data01_config.STORAGE_COMPRESSION
+    typed = apply_schema(df).reset_index(drop=True)
+    if ext == '.parquet':
+        typed.to_parquet(filepath, index=False, compression=compression)
+    elif ext == '.feather':
+        typed.to_feather(filepath, compression=compression)
+    else:
+        raise ValueError(f"不支持的文件格式：{ext}")
+
+class DataFileWriter:
+#    """
+#    分块追加写入数据文件（用于分钟数据等大文件，避免在内存中拼接整张表）。
+#    先写入临时文件 <filepath>.part，close 时原子替换为目标文件，abort 时删除。
+#    .csv 逐块追加；.parquet 每块写为一个row group；.feather 不支持追加，在 close 时一次写入。
+#    resume_bytes：续传时保留已有临时文件的前 resume_bytes 字节（仅 .csv 支持，见 resumable）
+#    """
+    def __init__(self, filepath, compression=None, resume_bytes=None):
+        self.filepath = filepath
+        self.temp_path = filepath + '.part'
+        self.ext = os.path.splitext(filepath)[1].lower()
+        if self.ext not in DATA_FILE_EXTENSIONS.values():
+            raise ValueError(f"不支持的文件格式：{self.ext}")
+        if self.ext != '.csv':
+            _require_pyarrow()
+        self.compression = compression or Data01_config.STORAGE_COMPRESSION
+        self.columns = None
+        self.rows = 0
+        self._parquet = None
+        self._chunks = []
+        if resume_bytes:
+            if not self.resumable or not os.path.exists(self.temp_path):
+                raise ValueError(f"无法续写: {self.temp_path}")
+            # 截掉崩溃时写了一半、尚未记录的部分，表头沿用已有文件
+            with open(self.temp_path, 'r+b') as f:
+                f.truncate(resume_bytes)
+            with open(self.temp_path, encoding='utf-8-sig') as f:
+                self.columns = f.readline().strip().split(',')
+
+    @property
+    def resumable(self):
+        """临时文件能否在中断后截断续写（只有 .csv 是逐块追加的纯文本）"""
+        return self.ext == '.csv'
+
+    def offset(self):
+        """已写入临时文件的字节数（可续写的格式），否则返回None"""
+        if not self.resumable or not os.path.exists(self.temp_path):
+            return None
+        return os.path.getsize(self.temp_path)
+
+    def write(self, df):
+        if df.empty:
+            return
+        with Data01_metrics.timer('file_write_seconds', format=self.ext.lstrip('.')):
+            self._write(df)
+        Data01_metrics.inc('file_write_rows_total', len(df), format=self.ext.lstrip('.'))
+
+    def _write(self, df):
+        first = self.columns is None
+        if first:
+            self.columns = list(df.columns)
+        df = df[self.columns]
+        if self.ext == '.csv':
+            # 只有第一块写BOM和表头
+            df.to_csv(self.temp_path, mode='w' if first else 'a', header=first, index=False,
+                      encoding='utf-8-sig' if first else 'utf-8')
+        elif self.ext == '.parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(apply_schema(df), preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.temp_path, table.schema, compression=self.compression)
+            self._parquet.write_table(table)
+        else:
+            self._chunks.append(apply_schema(df))
+        self.rows += len(df)
+
+    def close(self):
+        """完成写入并替换目标文件；没有写入任何行时不生成文件"""
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        if self._chunks:
+            # .feather 在此一次写入，用时计入写文件
+            import pandas as pd
+            with Data01_metrics.timer('file_write_seconds', format='feather'):
+                pd.concat(self._chunks, ignore_index=True).to_feather(self.temp_path, compression=self.compression)
+            self._chunks = []
+        if os.path.exists(self.temp_path):
+            os.replace(self.temp_path, self.filepath)
+
+    def abort(self):
+        """放弃写入，删除临时文件"""
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        self._chunks = []
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+def read_data_file(file_path, columns=None):
+#     """
+#     按扩展名读取数据文件。CSV 的代码/日期列按字符串读取；
+#     列式文件直接按存储的类型读回，不经过文本解析。
+#     """
+    import pandas as pd
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.csv':
+        return pd.read_csv(file_path, encoding='utf-8-sig', usecols=columns,
+                           dtype={col: str for col in STRING_COLUMNS})
+    _require_pyarrow()
+    if ext == '.parquet':
+        return pd.read_parquet(file_path, columns=columns)
+    if ext == '.feather':
+        return pd.read_feather(file_path, columns=columns)
+    raise ValueError(f"不支持的文件格式：{ext}")
+
+def iter_data_file(file_path, chunk_rows, columns=None):
+#     """
+#     按块读取数据文件，每块最多 chunk_rows 行（类型与 read_data_file 一致），内存占用与文件大小无关。
+#     CSV 用分块解析；parquet 按 row group 流式读取；feather 内存映射后逐批切片。
+#     """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.csv':
+        import pandas as pd
+        with pd.read_csv(file_path, encoding='utf-8-sig', usecols=columns, chunksize=chunk_rows,
+                         dtype={col: str for col in STRING_COLUMNS}) as reader:
+            yield from reader
+        return
+    _require_pyarrow()
+    import pyarrow as pa
+    if ext == '.parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    elif ext == '.feather':
+        import pyarrow.ipc as ipc
+        with pa.memory_map(file_path) as source:
+            reader = ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns:
+                    batch = batch.select(columns)
+                for offset in range(0, batch.num_rows, chunk_rows):
+                    yield batch.slice(offset, chunk_rows).to_pandas()
+    else:
+        raise ValueError(f"不支持的文件格式：{ext}")
+
 def read_stock_list(file_path):
     """
     读取股票清单文件（支持 CSV 或 Excel），返回带标准列名的 DataFrame。
@@ -41,6 +267,8 @@ def read_stock_list(file_path):
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"文件不存在：{file_path}")
 
+    # pandas 与 Excel 读取引擎（openpyxl）在首次读取清单时才加载
+    import pandas as pd
     ext = os.path.splitext(file_path)[1].lower()
     try:
         if ext == '.csv':
@@ -97,6 +325,7 @@ def update_log_file(log_file, stock_code, start_date, end_date, data_type):
 #        如果本次起始日期早于记录中的起始日期，则更新起始日期
 #        如果本次结束日期晚于记录中的结束日期，则更新结束日期
 #     """
+    import pandas as pd
     # 定义列名
     columns = ['stock_code', 'start_date', 'end_date', 'data_type']
     
@@ -125,4 +354,106 @@ def update_log_file(log_file, stock_code, start_date, end_date, data_type):
         df_log = pd.concat([df_log, new_row], ignore_index=True)
     
     # 保存回Excel
-    df_log.to_excel(log_file, index=False)
\ No newline at end of file
+    df_log.to_excel(log_file, index=False)
+
+
+def _merge_intervals(intervals):
+    # 合并重叠或相邻（相差一天）的 [start, end] 日期区间（YYYYMMDD），返回按起始日期排序的新列表
+    merged = []
+    for start, end in sorted(intervals):
+        if merged:
+            next_day = (datetime.strptime(merged[-1][1], '%Y%m%d') + timedelta(days=1)).strftime('%Y%m%d')
+            if start <= next_day:
+                merged[-1][1] = max(merged[-1][1], end)
+                continue
+        merged.append([start, end])
+    return merged
+
+class DownloadManifest:
+#    """
+#    下载覆盖清单：替代逐只股票重写Excel的 update_log_file。
+#    以 (stock_code, data_type) 为键在内存中保存实际下载到的日期区间列表：重叠或相邻的区间合并，
+#    分开几次下载之间的缺口保留为不同的区间，不会被当作已覆盖。
+#    批量写入带主键索引的SQLite表，运行结束时再一次性导出Excel日志（每个区间一行）供人工查看。
+#    旧版本的Excel日志只记录了按请求日期扩展出的起止范围，不能证明其中已下载，因此不导入；
+#    这些股票的覆盖范围由数据库决定（SYNC_SOURCE 含 db 时），否则重新下载一次。
+#    """
+    COLUMNS = ['stock_code', 'start_date', 'end_date', 'data_type']
+
+    def __init__(self, db_path=None, batch_size=200):
+        self.db_path = db_path or Data01_config.MANIFEST_DB_PATH
+        self.batch_size = batch_size
+        self.entries = {}   # (stock_code, data_type) -> [[start_date, end_date], ...]
+        self.dirty = set()
+        ensure_dir(os.path.dirname(self.db_path))
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS download_coverage (
+                stock_code TEXT NOT NULL,
+                data_type TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                end_date TEXT NOT NULL,
+                updated_at TEXT,
+                PRIMARY KEY (stock_code, data_type, start_date)
+            )
+        """)
+        self.conn.commit()
+        self._load()
+
+    def _load(self):
+        rows = self.conn.execute(
+            "SELECT stock_code, data_type, start_date, end_date FROM download_coverage "
+            "ORDER BY stock_code, data_type, start_date").fetchall()
+        for stock_code, data_type, start_date, end_date in rows:
+            self.entries.setdefault((stock_code, data_type), []).append([start_date, end_date])
+
+    def update(self, stock_code, start_date, end_date, data_type):
+        """
+        记录一段实际下载到的日期区间 [start_date, end_date]，与已有区间重叠或相邻时合并。
+        累计 batch_size 个修改后自动写入数据库。
+        """
+        start_date, end_date = str(start_date), str(end_date)
+        if end_date < start_date:
+            return
+        key = (stock_code, data_type)
+        self.entries[key] = _merge_intervals(self.entries.get(key, []) + [[start_date, end_date]])
+        self.dirty.add(key)
+        if len(self.dirty) >= self.batch_size:
+            self.flush()
+
+    def get(self, stock_code, data_type):
+        """返回已下载的日期区间列表 [(start_date, end_date)]，无记录时返回None"""
+        intervals = self.entries.get((stock_code, data_type))
+        return [tuple(interval) for interval in intervals] if intervals else None
+
+    def coverage(self, data_type):
+        """返回某数据类型的覆盖范围 {stock_code: [(start, end), ...]}"""
+        return {code: [tuple(interval) for interval in intervals]
+                for (code, dtype), intervals in self.entries.items() if dtype == data_type}
+
+    def flush(self):
+        """把内存中的修改批量写入数据库（一个事务，修改过的股票整体替换其区间）"""
+        if not self.dirty:
+            return
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = [(code, dtype, start, end, now) for code, dtype in self.dirty
+                for start, end in self.entries[(code, dtype)]]
+        with self.conn:
+            self.conn.executemany("DELETE FROM download_coverage WHERE stock_code = ? AND data_type = ?",
+                                  list(self.dirty))
+            self.conn.executemany(
+                "INSERT INTO download_coverage "
+                "(stock_code, data_type, start_date, end_date, updated_at) VALUES (?,?,?,?,?)",
+                rows)
+        self.dirty.clear()
+
+    def export_excel(self, log_file, data_type):
+        """把某数据类型的全部记录一次性导出为Excel日志（每个已下载区间一行）"""
+        import pandas as pd
+        rows = [[code, start, end, dtype] for (code, dtype), intervals in sorted(self.entries.items())
+                if dtype == data_type for start, end in intervals]
+        pd.DataFrame(rows, columns=self.COLUMNS).to_excel(log_file, index=False)
+
+    def close(self):
+        self.flush()
+        self.conn.close()
@@ -8,7 +8,6 @@
 # """
 import sys
 import os
-import time
 from datetime import timedelta
 from PyQt6.QtWidgets import (QWidget, QLabel, QPushButton, QFileDialog,
                              QVBoxLayout, QMessageBox, QApplication)
@@ -17,73 +16,38 @@ from PyQt6.QtCore import QThread, pyqtSignal
 # 导入自定义模块
 import Data01_config
 import Data01_file_utils
-import Data01_tushare_utils
+import Data01_download_journal
+import Data01_metrics
 
 
 class DownloadWorker(QThread):
 #    """
 #    下载工作线程，避免阻塞GUI。
 #    发射信号更新进度。
+#    action: None 按股票清单新建下载作业；'resume' 继续最近一个作业中未完成的任务；
+#    'retry' 同时重试其中失败的任务。任务状态记录在作业日志中，程序中断后可以继续。
 #    """
     progress = pyqtSignal(int, int, float)  # 当前序号，总数，已用秒数
     log = pyqtSignal(str)                   # 日志消息
     finished = pyqtSignal(int, float)        # 成功下载数量，总用时秒数
+    metrics = pyqtSignal(object)            # 本次运行的指标快照（Data01_metrics.snapshot），约每秒一次
 
-    def __init__(self, stock_list_df, save_dir):
+    def __init__(self, stock_list_df, save_dir, action=None):
         super().__init__()
         self.stock_list = stock_list_df
-        self.save_dir = save_dir
-        self.pro = None
+        # 下载流程与界面无关，见 Data01_batch.DownloadRunner（命令行批处理共用）；
+        # 下载相关模块（pandas、tushare）在开始下载时才导入，窗口启动更快
+        import Data01_batch
+        self.runner = Data01_batch.DownloadRunner(save_dir, action, log=self.log.emit,
+                                                  progress=self.progress.emit, metrics=self.metrics.emit)
+
+    def stop(self):
+        """请求停止下载，已完成的任务和分钟数据窗口保留在作业日志中"""
+        self.runner.stop()
 
     def run(self):
-        start_time = time.time()
-        # 初始化tushare
-        token = Data01_config.TUSHARE_TOKEN
-        self.pro = Data01_tushare_utils.init_tushare(token)
-
-        total = len(self.stock_list)
-        success_count = 0
-
-        for idx, row in self.stock_list.iterrows():
-            current = idx + 1
-            # 更新进度
-            elapsed = time.time() - start_time
-            self.progress.emit(current, total, elapsed)
-
-            stock_code = row['stock_code']
-            start_date = row['start_date']
-            end_date = row['end_date']
-            data_type = row['data_type']
-
-            # 确定文件名
-            if data_type == '日数据':
-                suffix = 'day'
-                log_file = Data01_config.LOG_DAY_FILE
-            else:  # 分钟数据
-                suffix = 'min'
-                log_file = Data01_config.LOG_MIN_FILE
-
-            filename = f"{stock_code}_{suffix}.csv"
-            filepath = os.path.join(self.save_dir, filename)
-
-            # 下载数据
-            self.log.emit(f"正在下载 ({current}/{total}): {stock_code}")
-            df = Data01_tushare_utils.download_stock_data(self.pro, stock_code,
-                                                    start_date, end_date, data_type)
-            if df is not None:
-                Data01_tushare_utils.save_data_to_csv(df, filepath)
-                # 更新日志文件
-                Data01_file_utils.update_log_file(log_file, stock_code,
-                                           start_date, end_date, data_type)
-                success_count += 1
-            else:
-                self.log.emit(f"下载失败: {stock_code}")
-
-            # 可添加短暂延时避免请求频率过高
-            time.sleep(0.5)
-
-        total_time = time.time() - start_time
-        self.finished.emit(success_count, total_time)
+        report = self.runner.run(self.stock_list)
+        self.finished.emit(report['succeeded'], report['seconds'])
 
 
 class Form1(QWidget):
@@ -111,7 +75,16 @@ class Form1(QWidget):
         self.btn_download.setEnabled(True)  # 初始就可用
         self.btn_download.clicked.connect(self.start_download)
 
+        # 上次中断或有失败任务的下载作业
+        self.btn_resume = QPushButton("继续未完成的下载")
+        self.btn_resume.clicked.connect(lambda: self.start_download('resume'))
+        self.btn_retry = QPushButton("重试失败")
+        self.btn_retry.clicked.connect(lambda: self.start_download('retry'))
+
         self.label_status = QLabel("就绪")
+        # 各阶段用时（接口调用按接口区分、写文件、Excel日志等），下载中实时刷新
+        self.label_metrics = QLabel("")
+        self.label_metrics.setWordWrap(True)
         self.btn_to_form2 = QPushButton("更新到SQL数据库")
         self.btn_to_form2.clicked.connect(self.open_form2)
         self.btn_to_form2.setEnabled(True)  # 下载完成前就启用
@@ -122,12 +95,31 @@ class Form1(QWidget):
         vbox.addWidget(self.btn_select)
         vbox.addWidget(self.label_count)
         vbox.addWidget(self.btn_download)
+        vbox.addWidget(self.btn_resume)
+        vbox.addWidget(self.btn_retry)
         vbox.addWidget(self.label_status)
+        vbox.addWidget(self.label_metrics)
         vbox.addWidget(self.btn_to_form2)
         self.setLayout(vbox)
 
         # 下载工作线程
         self.worker = None
+        self.refresh_job_buttons()
+
+    def refresh_job_buttons(self):
+        """根据作业日志中最近一个未完成的作业启用“继续”和“重试失败”按钮"""
+        info = None
+        try:
+            journal = Data01_download_journal.DownloadJournal()
+            info = journal.latest_job()
+            journal.close()
+        except Exception as e:
+            print(f"读取下载作业日志失败: {e}")
+        running = self.worker is not None and self.worker.isRunning()
+        self.btn_resume.setEnabled(not running and info is not None and info['pending'] > 0)
+        self.btn_retry.setEnabled(not running and info is not None and info['failed'] > 0)
+        if info is not None and (info['pending'] or info['failed']):
+            self.label_status.setText(f"上次下载作业未完成：待下载 {info['pending']} 个，失败 {info['failed']} 个")
 
     def check_and_prepare_directory(self):
         """检查并准备下载目录：创建目录，删除历史csv文件"""
@@ -158,32 +150,42 @@ class Form1(QWidget):
         except Exception as e:
             QMessageBox.critical(self, "错误", f"读取股票清单文件失败：{str(e)}")
 
-    def start_download(self):
-        """开始下载，禁用按钮，启动工作线程"""
-        if self.stock_list_df is None or self.stock_list_df.empty:
-            QMessageBox.warning(self, "警告", "请先选择有效的股票清单")
+    def start_download(self, action=None):
+        """开始下载，禁用按钮，启动工作线程；action 为 'resume' / 'retry' 时继续最近的下载作业"""
+        if self.worker is not None and self.worker.isRunning():
             return
+        if not action:
+            action = None
+            if self.stock_list_df is None or self.stock_list_df.empty:
+                QMessageBox.warning(self, "警告", "请先选择有效的股票清单")
+                return
 
-        # 再次确认目录已清理（可能用户手动添加了文件）
-        Data01_file_utils.clear_csv_files(self.save_dir)
+            # 再次确认目录已清理（可能用户手动添加了文件）
+            Data01_file_utils.clear_csv_files(self.save_dir)
 
         self.btn_download.setEnabled(True)
         self.btn_select.setEnabled(True)
         self.btn_to_form2.setEnabled(True)
+        self.btn_resume.setEnabled(False)
+        self.btn_retry.setEnabled(False)
 
-        self.worker = DownloadWorker(self.stock_list_df, self.save_dir)
+        self.worker = DownloadWorker(self.stock_list_df, self.save_dir, action)
         self.worker.progress.connect(self.update_progress)
         self.worker.log.connect(self.update_status)
         self.worker.finished.connect(self.download_finished)
+        self.worker.metrics.connect(self.update_metrics)
+        self.label_metrics.setText("")
         self.worker.start()
 
     def update_progress(self, current, total, elapsed_seconds):
-        """更新进度显示，包括预计剩余时间"""
+        """
+        更新进度显示，包括预计剩余时间：按最近实测的接口请求吞吐量与剩余请求数估算
+        （分钟数据一只股票需要多个时间窗口的请求，不再假设每只股票用时相同）
+        """
         elapsed_str = str(timedelta(seconds=int(elapsed_seconds)))
         if current > 0:
-            avg_time_per = elapsed_seconds / current
-            remaining = avg_time_per * (total - current)
-            remaining_str = str(timedelta(seconds=int(remaining)))
+            remaining = Data01_metrics.eta('download')
+            remaining_str = "计算中..." if remaining is None else str(timedelta(seconds=int(remaining)))
             self.label_status.setText(
                 f"正在下载第 {current} 只 (共 {total} 只)，"
                 f"已用 {elapsed_str}，预计剩余 {remaining_str}"
@@ -191,6 +193,10 @@ class Form1(QWidget):
         else:
             self.label_status.setText(f"已用 {elapsed_str}")
 
+    def update_metrics(self, snapshot):
+        """显示用时最多的几项指标"""
+        self.label_metrics.setText("\n".join(Data01_metrics.summary_lines(snapshot, limit=5)))
+
     def update_status(self, message):
         """更新状态栏消息（可用于日志）"""
         # 这里简单打印到控制台，可根据需要改为显示在界面
@@ -203,8 +209,16 @@ class Form1(QWidget):
         self.btn_download.setEnabled(True)   # 可再次下载
         self.btn_select.setEnabled(True)
         self.btn_to_form2.setEnabled(True)
+        self.refresh_job_buttons()
         QMessageBox.information(self, "完成", f"数据下载完成！成功下载 {success_count} 只股票。")
 
+    def closeEvent(self, event):
+        """关闭窗口时停止下载并等待线程退出，进度已保存在作业日志中，下次可继续"""
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.stop()
+            self.worker.wait()
+        super().closeEvent(event)
+
     def open_form2(self):
         """打开Form2（数据更新到SQL）"""
         # 延迟导入，避免循环依赖
@@ -3,29 +3,289 @@
 # """
 import sys
 import os
-import re
 import time     # 新增：用于时间计算，显示导入时间进度和预计总时间
-import pandas as pd
+import threading
+import itertools
+from collections import deque
+from datetime import datetime
 import PyQt6.QtCore
 from PyQt6.QtWidgets import (QWidget, QLabel, QPushButton, QVBoxLayout,
-                             QListWidget, QListWidgetItem, QCheckBox,
+                             QCheckBox,
                              QMessageBox, QApplication, QHBoxLayout, 
                              QRadioButton, QButtonGroup, QLineEdit, QGroupBox,
-                             QFormLayout, QTextEdit, QAbstractItemView) # 添加了 QTextEdit, QAbstractItemView
-from PyQt6.QtCore import Qt
+                             QFormLayout, QTextEdit, QAbstractItemView, # 添加了 QTextEdit, QAbstractItemView
+                             QTableView, QHeaderView)
+from PyQt6.QtCore import Qt, QThread, pyqtSignal, QAbstractTableModel, QModelIndex
 
 from PyQt6.QtWidgets import QAbstractItemView   # 如果使用 PyQt6
 
 import Data01_config
 import Data01_file_utils
 import Data01_db_utils
+import Data01_import_pipeline
+import Data01_file_index
+import Data01_metrics
+
+
+class ImportWorker(QThread):
+#    """
+#    导入工作线程：本线程独占数据库连接负责写库，
+#    CSV的读取与类型转换由 Data01_import_pipeline 的进程池提前完成。
+#    """
+    file_started = pyqtSignal(int, str)              # 序号，文件名
+    file_done = pyqtSignal(int, str, bool, str)      # 序号，文件名，是否成功，错误信息
+    finished = pyqtSignal(int, int, int, float)      # 成功数，失败数，未变化跳过数，总用时秒数
+    chunk_done = pyqtSignal(int, int, int, float)    # 序号，块号，块行数，行/秒（大文件流式导入）
+    metrics = pyqtSignal(object)                     # 本次导入的指标快照（Data01_metrics.snapshot），约每秒一次
+
+    def __init__(self, files, connect, import_day, import_min, target=None, table_for=None, force=False):
+        super().__init__()
+        self.files = files
+        # target 指定时按导入清单跳过未变化的文件（force=True 时全部重新导入）
+        self.pipeline = Data01_import_pipeline.ImportPipeline(connect, import_day, import_min,
+                                                              target=target, table_for=table_for, force=force)
+        self.cancel_event = threading.Event()
+        self.metrics_emitted = 0.0
+
+    def cancel(self):
+        """请求取消：当前文件写完后停止"""
+        self.cancel_event.set()
+
+    def run(self):
+        start_time = time.time()
+        try:
+            success_count, fail_count = self.pipeline.run(
+                self.files,
+                on_start=lambda idx, path: self.file_started.emit(idx, os.path.basename(path)),
+                on_done=self.on_done,
+                cancel_event=self.cancel_event,
+                on_chunk=lambda idx, path, number, rows, speed: self.chunk_done.emit(idx, number, rows, speed))
+        except Exception as e:
+            # 连接数据库失败等整体性错误
+            self.file_done.emit(0, "", False, str(e))
+            success_count, fail_count = 0, len(self.files)
+        if self.pipeline.metrics is not None:
+            self.metrics.emit(self.pipeline.metrics)
+        self.finished.emit(success_count, fail_count, self.pipeline.skipped, time.time() - start_time)
+
+    def on_done(self, idx, path, ok, msg):
+        self.file_done.emit(idx, os.path.basename(path), ok, msg)
+        now = time.monotonic()
+        if now - self.metrics_emitted >= Data01_config.METRICS_EMIT_SECONDS:
+            self.metrics_emitted = now
+            self.metrics.emit(Data01_metrics.snapshot(since=self.pipeline.checkpoint))
+
+
+class FileScanWorker(QThread):
+#    """
+#    后台扫描数据目录：os.scandir 取得文件名、大小和修改时间，
+#    同时读出文件索引中缓存的元数据和导入记录，一次性交给界面线程。
+#    """
+    scanned = pyqtSignal(object, object, object)   # [(路径, 文件名, 大小, 修改时间)]，元数据缓存，导入记录
+
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+
+    def run(self):
+        entries = Data01_file_utils.scan_data_files(self.directory)
+        file_index = Data01_file_index.FileIndex()
+        try:
+            meta, imported = file_index.load_meta(), file_index.load_imported()
+        finally:
+            file_index.close()
+        self.scanned.emit(entries, meta, imported)
+
+
+class MetadataWorker(QThread):
+#    """
+#    按需计算文件元数据（行数、日期范围）的后台线程。
+#    请求来自视图当前显示的行；后到的请求先处理，快速滚动时优先计算正在查看的文件。
+#    """
+    meta_ready = pyqtSignal(str, object)   # 路径，(行数, 最早日期, 最晚日期, 错误信息)
+
+    def __init__(self):
+        super().__init__()
+        self.requests = deque()
+        self.condition = threading.Condition()
+        self.stopped = False
+
+    def request(self, path, size, mtime):
+        with self.condition:
+            self.requests.append((path, size, mtime))
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def run(self):
+        file_index = Data01_file_index.FileIndex()
+        try:
+            while True:
+                with self.condition:
+                    while not self.requests and not self.stopped:
+                        self.condition.wait()
+                    if self.stopped:
+                        return
+                    path, size, mtime = self.requests.pop()
+                self.meta_ready.emit(path, file_index.metadata(path, size, mtime))
+        finally:
+            file_index.close()
+
+
+class FileListModel(QAbstractTableModel):
+#    """
+#    数据文件列表模型（配合 QTableView 只为可见行取数据，数万个文件也不逐个创建控件）。
+#    勾选状态保存在 bytearray 中，全选、筛选与取得选中文件都是整体操作；
+#    行数和日期范围在行第一次显示时通过 request_meta 回调向后台请求。
+#    """
+    COLUMNS = ["文件名", "大小(KB)", "修改时间", "行数", "日期范围", "导入状态"]
+    check_changed = pyqtSignal()
+
+    def __init__(self, request_meta=None):
+        super().__init__()
+        self.request_meta = request_meta
+        self.entries = []          # [(路径, 文件名, 大小, 修改时间)]
+        self.names = []            # 小写文件名，用于筛选
+        self.checked = bytearray()
+        self.visible = []          # 筛选后显示的条目序号
+        self.row_of = {}           # 路径 -> 显示的行号
+        self.meta = {}             # 路径 -> ((大小, 修改时间), 元数据)
+        self.imported = {}
+        self.requested = set()
+
+    def set_entries(self, entries, meta, imported):
+        self.beginResetModel()
+        self.entries = entries
+        self.names = [entry[1].lower() for entry in entries]
+        self.checked = bytearray(len(entries))
+        self.meta = meta
+        self.imported = imported
+        self.requested = set()
+        self.visible = list(range(len(entries)))
+        self.row_of = {entry[0]: row for row, entry in enumerate(entries)}
+        self.endResetModel()
+        self.check_changed.emit()
+
+    def set_filter(self, text):
+        """按文件名筛选（不区分大小写的包含匹配），勾选状态保留"""
+        text = text.strip().lower()
+        self.beginResetModel()
+        if text:
+            self.visible = [i for i, name in enumerate(self.names) if text in name]
+        else:
+            self.visible = list(range(len(self.entries)))
+        self.row_of = {self.entries[i][0]: row for row, i in enumerate(self.visible)}
+        self.endResetModel()
+
+    def set_all_checked(self, checked):
+        """勾选/取消全部显示中的文件"""
+        value = 1 if checked else 0
+        if len(self.visible) == len(self.entries):
+            self.checked = bytearray([value]) * len(self.entries)
+        else:
+            for i in self.visible:
+                self.checked[i] = value
+        if self.visible:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.visible) - 1, 0),
+                                  [Qt.ItemDataRole.CheckStateRole])
+        self.check_changed.emit()
+
+    def checked_files(self):
+        """全部勾选的文件路径（含被筛选隐藏的），按文件名顺序"""
+        return [entry[0] for entry in itertools.compress(self.entries, self.checked)]
+
+    def checked_count(self):
+        return self.checked.count(1)
+
+    def update_meta(self, path, meta):
+        """后台算出元数据后更新对应行"""
+        row = self.row_of.get(path)
+        if row is None:
+            return
+        _, _, size, mtime = self.entries[self.visible[row]]
+        self.meta[path] = ((size, mtime), meta)
+        self.dataChanged.emit(self.index(row, 3), self.index(row, 4), [Qt.ItemDataRole.DisplayRole])
+
+    def _metadata(self, path, size, mtime):
+        cached = self.meta.get(path)
+        if cached is not None and cached[0] == (size, mtime):
+            return cached[1]
+        if path not in self.requested and self.request_meta is not None:
+            self.requested.add(path)
+            self.request_meta(path, size, mtime)
+        return None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.visible)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def flags(self, index):
+        flags = Qt.ItemFlag.ItemIsEnabled
+        if index.column() == 0:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        i = self.visible[index.row()]
+        path, name, size, mtime = self.entries[i]
+        column = index.column()
+        if role == Qt.ItemDataRole.CheckStateRole and column == 0:
+            return Qt.CheckState.Checked if self.checked[i] else Qt.CheckState.Unchecked
+        if role == Qt.ItemDataRole.ToolTipRole and column == 0:
+            return path
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if column == 0:
+            return name
+        if column == 1:
+            return f"{size / 1024:,.0f}"
+        if column == 2:
+            return datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M')
+        if column == 5:
+            return Data01_file_index.import_status(self.imported, path, size, mtime)
+        meta = self._metadata(path, size, mtime)
+        if meta is None:
+            return "…"
+        rows, first, last, error = meta
+        if error:
+            return "读取失败" if column == 3 else error
+        if column == 3:
+            return f"{rows:,}"
+        return f"{first} ~ {last}" if first else ""
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role != Qt.ItemDataRole.CheckStateRole or index.column() != 0:
+            return False
+        i = self.visible[index.row()]
+        checked = value == Qt.CheckState.Checked or value == Qt.CheckState.Checked.value
+        self.checked[i] = 1 if checked else 0
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.CheckStateRole])
+        self.check_changed.emit()
+        return True
+
 
 class Form2(QWidget):
     def __init__(self):
         super().__init__()
-        self.csv_files = []  # 存储文件路径列表
-        self.checkboxes = []  # 存储复选框，便于全选
         self.db_type = "mssql"  # 默认数据库类型
+        self.worker = None      # 导入工作线程
+        self.scan_worker = None  # 目录扫描线程
+        # 文件元数据（行数、日期范围）后台计算线程
+        self.meta_worker = MetadataWorker()
+        self.meta_worker.meta_ready.connect(self.on_meta_ready)
+        self.meta_worker.start()
         self.init_ui()
         self.load_csv_files()
     
@@ -38,6 +298,12 @@ class Form2(QWidget):
         # 全选复选框
         self.cb_select_all = QCheckBox("全选")
         self.cb_select_all.stateChanged.connect(self.toggle_select_all)
+
+        # 按文件名筛选（全选只作用于筛选后显示的文件）
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("按文件名筛选，如 600000 或 _min")
+        self.filter_edit.textChanged.connect(self.apply_filter)
+        self.label_selected = QLabel("共 0 个文件，已选 0 个")
         
         # 数据库类型选择
         self.label_db_type = QLabel("请设置要导入的数据库类型：")
@@ -59,18 +325,34 @@ class Form2(QWidget):
         
         self.setup_db_params()
         
-        # 文件列表控件
-        self.list_widget = QListWidget()
-        self.list_widget.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        # 文件列表：模型/视图，只为可见行取数据
+        self.file_model = FileListModel(request_meta=self.meta_worker.request)
+        self.file_model.check_changed.connect(self.update_selected_label)
+        self.file_view = QTableView()
+        self.file_view.setModel(self.file_model)
+        self.file_view.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.file_view.verticalHeader().setVisible(False)
+        self.file_view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.file_view.verticalHeader().setDefaultSectionSize(22)
+        self.file_view.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
         
+        # 导入清单：默认跳过自上次导入到同一数据库以来未变化的文件
+        self.cb_force = QCheckBox("强制重新导入（不跳过未变化的文件）")
         self.btn_import = QPushButton("导入到数据库")
         self.btn_import.clicked.connect(self.import_to_db)
+        self.btn_cancel = QPushButton("取消导入")
+        self.btn_cancel.clicked.connect(self.cancel_import)
+        self.btn_cancel.setEnabled(False)
         
         # 布局
         vbox = QVBoxLayout()
         vbox.addWidget(self.label_info)
-        vbox.addWidget(self.cb_select_all)
-        vbox.addWidget(self.list_widget)
+        select_layout = QHBoxLayout()
+        select_layout.addWidget(self.cb_select_all)
+        select_layout.addWidget(self.filter_edit)
+        select_layout.addWidget(self.label_selected)
+        vbox.addLayout(select_layout)
+        vbox.addWidget(self.file_view)
         
         # 数据库类型选择布局
         db_type_layout = QHBoxLayout()
@@ -88,7 +370,9 @@ class Form2(QWidget):
         # 初始状态设置
         self.update_db_param_visibility()
         
+        vbox.addWidget(self.cb_force)
         vbox.addWidget(self.btn_import)
+        vbox.addWidget(self.btn_cancel)
 
         # ----- 新增：进度显示区域 -----
         self.total_label = QLabel("总文件数: 0")
@@ -99,6 +383,9 @@ class Form2(QWidget):
 
         self.current_file_label = QLabel("当前文件: ")
         self.status_label = QLabel("状态: 等待开始")
+        # 各项用时（解析、质量检查、写库、派生表），导入中实时刷新
+        self.metrics_label = QLabel("")
+        self.metrics_label.setWordWrap(True)
         self.error_textedit = QTextEdit()
         self.error_textedit.setPlaceholderText("失败详情将显示在这里，您可以复制此信息")
         self.error_textedit.setReadOnly(False)  # 可编辑以便复制
@@ -110,6 +397,7 @@ class Form2(QWidget):
         vbox.addWidget(self.time_label)          # 新增
         vbox.addWidget(self.current_file_label)
         vbox.addWidget(self.status_label)
+        vbox.addWidget(self.metrics_label)
         vbox.addWidget(QLabel("失败详情（可复制）:"))
         vbox.addWidget(self.error_textedit)
 
@@ -161,185 +449,84 @@ class Form2(QWidget):
         self.mssql_group.setVisible(self.db_type == "mssql")
     
     def load_csv_files(self):
-        """加载下载目录中的所有csv文件，并显示在列表中"""
-        self.csv_files = Data01_file_utils.get_csv_files(Data01_config.STOCK_DATA_DIR)
-        self.list_widget.clear()
-        self.checkboxes.clear()
-        for file_path in self.csv_files:
-            item = QListWidgetItem(self.list_widget)
-            # 修改点1：使用 Qt.ItemFlag.ItemIsUserCheckable
-            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
-            item.setCheckState(Qt.CheckState.Unchecked)
-            item.setText(os.path.basename(file_path))
-            item.setData(Qt.ItemDataRole.UserRole, file_path)
-            self.list_widget.addItem(item)
-            self.checkboxes.append(item)
-    
+        """在后台扫描下载目录中的所有数据文件（csv/parquet/feather），完成后显示在列表中"""
+        self.label_info.setText("正在扫描数据文件...")
+        self.scan_worker = FileScanWorker(Data01_config.STOCK_DATA_DIR)
+        self.scan_worker.scanned.connect(self.on_files_scanned)
+        self.scan_worker.start()
+
+    def on_files_scanned(self, entries, meta, imported):
+        """扫描完成：填充文件列表模型"""
+        self.file_model.set_entries(entries, meta, imported)
+        self.apply_filter(self.filter_edit.text())
+        self.label_info.setText("请选择要导入的CSV文件：")
+
+    def on_meta_ready(self, path, meta):
+        """后台算出某个文件的行数和日期范围"""
+        self.file_model.update_meta(path, meta)
+
+    def apply_filter(self, text):
+        """按文件名筛选列表"""
+        self.file_model.set_filter(text)
+        self.update_selected_label()
+
+    def update_selected_label(self):
+        self.label_selected.setText(f"共 {self.file_model.rowCount()} 个文件，"
+                                    f"已选 {self.file_model.checked_count()} 个")
+
     def toggle_select_all(self, state):
         """全选/全不选"""
         # 修改点2：比较 state 与枚举的整数值
-        check_state = Qt.CheckState.Checked if state == Qt.CheckState.Checked.value else Qt.CheckState.Unchecked
-        for i in range(self.list_widget.count()):
-            item = self.list_widget.item(i)
-            item.setCheckState(check_state)
+        self.file_model.set_all_checked(state == Qt.CheckState.Checked.value)
     
     def get_selected_files(self):
         """获取用户选中的文件路径列表"""
-        selected = []
-        for i in range(self.list_widget.count()):
-            item = self.list_widget.item(i)
-            if item.checkState() == Qt.CheckState.Checked:
-                file_path = item.data(Qt.ItemDataRole.UserRole)
-                selected.append(file_path)
-        return selected
+        return self.file_model.checked_files()
     
+    def get_mssql_params(self):
+        """读取MS SQL Server连接参数（在GUI线程中调用）"""
+        return {
+            'server': self.mssql_server.text().strip(),
+            'database': self.mssql_database_name.text().strip(),
+            'username': self.mssql_username.text().strip(),
+            'password': self.mssql_password.text().strip(),
+        }
+
+    def get_mysql_params(self):
+        """读取MySQL连接参数（在GUI线程中调用）"""
+        return {
+            'host': self.mysql_host.text().strip(),
+            'port': self.mysql_port.text().strip(),
+            'user': self.mysql_user.text().strip(),
+            'password': self.mysql_password.text().strip(),
+            'database': self.mysql_database.text().strip(),
+        }
+
+    @staticmethod
+    def connect_mssql(params):
+        """根据参数获取MS SQL Server数据库连接"""
+        return Data01_db_utils.connect_mssql(params)
+
+    @staticmethod
+    def connect_mysql(params):
+        """根据参数获取MySQL数据库连接（来自连接池，多次导入复用同一连接）"""
+        return Data01_db_utils.connect_mysql(params)
+
     def get_db_connection_mssql(self):
         """获取MS SQL Server数据库连接"""
-        try:
-            import pyodbc
-            server = self.mssql_server.text().strip()
-            database = self.mssql_database_name.text().strip()
-            username = self.mssql_username.text().strip()
-            password = self.mssql_password.text().strip()
-            
-            if not all([server, database]):
-                raise ValueError("MS SQL Server参数不完整")
-            
-            # 构建连接字符串
-            if username and password:
-                conn_str = f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password}'
-            else:
-                conn_str = f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};Trusted_Connection=yes;'
-            
-            conn = pyodbc.connect(conn_str)
-            return conn
-        except ImportError:
-            raise Exception("请安装pyodbc包: pip install pyodbc")
-        except Exception as e:
-            raise Exception(f"MS SQL Server连接失败: {str(e)}")
-    
+        return self.connect_mssql(self.get_mssql_params())
+
     def get_db_connection_mysql(self):
         """获取MySQL数据库连接"""
-        try:
-            import pymysql
-            host = self.mysql_host.text().strip()
-            port = int(self.mysql_port.text().strip())
-            user = self.mysql_user.text().strip()
-            password = self.mysql_password.text().strip()
-            database = self.mysql_database.text().strip()
-            
-            if not all([host, user, database]):
-                raise ValueError("MySQL参数不完整")
-            
-            conn = pymysql.connect(
-                host=host,
-                port=port,
-                user=user,
-                password=password,
-                database=database,
-                charset='utf8mb4'
-            )
-            return conn
-        except ImportError:
-            raise Exception("请安装pymysql包: pip install pymysql")
-        except Exception as e:
-            raise Exception(f"MySQL连接失败: {str(e)}")
+        return self.connect_mysql(self.get_mysql_params())
     
-    def import_day_data_mssql(self, conn, stock_code, df):
-        """导入日线数据到MS SQL Server"""
-        table_name = f"stock_{stock_code}_day"
-        
-        # 转换 trade_date 列：从 YYYYMMDD 整数转为 Python date 对象
-        if 'trade_date' in df.columns:
-            # 使用 pandas 将整数（如 20250101）解析为 datetime，再提取 date
-            df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d').dt.date
-
-
-        # 创建表（如果不存在）
-        create_sql = f"""
-        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{table_name}' AND xtype='U')
-        CREATE TABLE {table_name} (
-            [trade_date] DATE PRIMARY KEY,
-            [open] DECIMAL(10,2),
-            [high] DECIMAL(10,2),
-            [low] DECIMAL(10,2),
-            [close] DECIMAL(10,2),
-            [pre_close] DECIMAL(10,2),
-            [change] DECIMAL(10,2),
-            [pct_chg] DECIMAL(10,2),
-            [vol] BIGINT,
-            [amount] DECIMAL(20,4),
-            [ts_code] VARCHAR(20)
-        )
-        """
-        cursor = conn.cursor()
-        cursor.execute(create_sql)
-        conn.commit()
-        
-        # 插入数据 确定DataFrame中存在的列
-        columns = ['trade_date', 'open', 'high', 'low', 'close', 'pre_close', 'change', 'pct_chg', 'vol', 'amount', 'ts_code']
-        cols_present = [col for col in columns if col in df.columns]
-        # 将列名用方括号括起来
-        cols_quoted = [f"[{col}]" for col in cols_present]
-        
-        # 使用MERGE语句实现upsert - 列名加方括号
-        merge_sql = f"""
-        MERGE {table_name} AS target
-        USING (VALUES ({','.join(['?' for _ in cols_present])})) AS source ({','.join(cols_quoted)})
-        ON target.[trade_date] = source.[trade_date]
-        WHEN MATCHED THEN
-            UPDATE SET {','.join([f'target.[{col}] = source.[{col}]' for col in cols_present if col != 'trade_date'])}
-        WHEN NOT MATCHED THEN
-            INSERT ({','.join(cols_quoted)}) VALUES ({','.join([f'source.[{col}]' for col in cols_present])});
-        """
-        
-        for _, row in df.iterrows():
-            values = [row[col] for col in cols_present]
-            cursor.execute(merge_sql, values)
-        conn.commit()
+    def import_day_data_mssql(self, conn, stock_code, df, commit=True):
+        """导入日线数据到MS SQL Server（commit=False 时写入调用方的事务而不提交）"""
+        Data01_db_utils.import_day_data_mssql(conn, stock_code, df, commit)
     
-    def import_min_data_mssql(self, conn, stock_code, df):
-        """导入分钟数据到MS SQL Server"""
-        table_name = f"stock_{stock_code}_min"
-        
-        # 创建表（如果不存在）
-        create_sql = f"""
-        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{table_name}' AND xtype='U')
-        CREATE TABLE {table_name} (
-            [trade_time] DATETIME PRIMARY KEY,
-            [open] DECIMAL(10,2),
-            [high] DECIMAL(10,2),
-            [low] DECIMAL(10,2),
-            [close] DECIMAL(10,2),
-            [volume] BIGINT,
-            [amount] DECIMAL(20,4),
-            [ts_code] VARCHAR(20)
-        )
-        """
-        cursor = conn.cursor()
-        cursor.execute(create_sql)
-        conn.commit()
-        
-        # 插入数据
-        columns = ['trade_time', 'open', 'high', 'low', 'close', 'volume', 'amount', 'ts_code']
-        cols_present = [col for col in columns if col in df.columns]
-        cols_quoted = [f"[{col}]" for col in cols_present]
-        
-        # 使用MERGE语句实现upsert
-        merge_sql = f"""
-        MERGE {table_name} AS target
-        USING (VALUES ({','.join(['?' for _ in cols_present])})) AS source ({','.join(cols_quoted)})
-        ON target.[trade_time] = source.[trade_time]
-        WHEN MATCHED THEN
-            UPDATE SET {','.join([f'target.[{col}] = source.[{col}]' for col in cols_present if col != 'trade_time'])}
-        WHEN NOT MATCHED THEN
-            INSERT ({','.join(cols_quoted)}) VALUES ({','.join([f'source.[{col}]' for col in cols_present])});
-        """
-        
-        for _, row in df.iterrows():
-            values = [row[col] for col in cols_present]
-            cursor.execute(merge_sql, values)
-        conn.commit()
+    def import_min_data_mssql(self, conn, stock_code, df, commit=True):
+        """导入分钟数据到MS SQL Server（commit=False 时写入调用方的事务而不提交）"""
+        Data01_db_utils.import_min_data_mssql(conn, stock_code, df, commit)
     
     def format_time(self, seconds):
         """将秒数格式化为 HH:MM:SS（小时可超过24）"""
@@ -349,13 +536,15 @@ class Form2(QWidget):
         return f"{hours:02d}:{minutes:02d}:{secs:02d}"
 
     def update_time_display(self, processed_count):
-        """根据已处理文件数更新时间标签"""
+        """
+        根据已处理文件数更新时间标签：预计总时间 = 已用时间 + 剩余字节数 / 最近实测的字节吞吐量
+        （Data01_metrics 的 import 阶段），大小不同的文件不再按相同用时估计
+        """
         elapsed = time.time() - self.start_time
         elapsed_str = self.format_time(elapsed)
-        if processed_count > 0:
-            avg_time = elapsed / processed_count
-            total_estimate = avg_time * self.total_files
-            total_estimate_str = self.format_time(total_estimate)
+        remaining = Data01_metrics.eta('import') if processed_count > 0 else None
+        if remaining is not None:
+            total_estimate_str = self.format_time(elapsed + remaining)
             self.time_label.setText(f"已用时间: {elapsed_str} | 预计总时间: {total_estimate_str}")
         else:
             self.time_label.setText(f"已用时间: {elapsed_str} | 预计总时间: 计算中...")
@@ -363,120 +552,111 @@ class Form2(QWidget):
 
 
     def import_to_db(self):
-        """执行导入数据库操作"""
+        """启动后台导入：解析进程池预读CSV，工作线程独占连接写库"""
         selected_files = self.get_selected_files()
 
-
         if not selected_files:
             QMessageBox.warning(self, "警告", "请至少选择一个文件")
             return
         
-        # 获取数据库连接
-        try:
-            if self.db_type == "mysql":
-                conn = self.get_db_connection_mysql()
-                cursor = conn.cursor()
-                cursor.execute("SELECT DB_NAME()")
-                db_name = cursor.fetchone()[0]
-                print(f"当前连接的数据库：{db_name}")
-
-
-
-                import_func_day = Data01_db_utils.import_day_data
-                import_func_min = Data01_db_utils.import_min_data
-            else:  # mssql
-                conn = self.get_db_connection_mssql()
-                import_func_day = self.import_day_data_mssql
-                import_func_min = self.import_min_data_mssql
-        except Exception as e:
-            QMessageBox.critical(self, "数据库连接失败", str(e))
-            return
+        # 连接参数在GUI线程读取，连接本身在工作线程中建立
+        if self.db_type == "mysql":
+            params = self.get_mysql_params()
+            connect = lambda: self.connect_mysql(params)
+            import_func_day = Data01_db_utils.import_day_data
+            import_func_min = Data01_db_utils.import_min_data
+            table_for = None
+        else:  # mssql
+            params = self.get_mssql_params()
+            connect = lambda: self.connect_mssql(params)
+            import_func_day = self.import_day_data_mssql
+            import_func_min = self.import_min_data_mssql
+            # MS SQL Server 始终按股票分表
+            table_for = lambda code, kind: Data01_db_utils.table_for(code, kind, consolidated=False)
+        target = Data01_db_utils.target_key(self.db_type, params)
         
         # 记录开始时间和总文件数
         self.start_time = time.time()
         self.total_files = len(selected_files)      # 保存到实例变量
         self.total_label.setText(f"总文件数: {self.total_files}")
+        self.status_label.setText("状态: 处理中...")
+        self.error_textedit.clear()
+
+        self.btn_import.setEnabled(False)
+        self.btn_cancel.setEnabled(True)
+
+        self.worker = ImportWorker(selected_files, connect, import_func_day, import_func_min,
+                                   target, table_for, self.cb_force.isChecked())
+        self.worker.file_started.connect(self.on_file_started)
+        self.worker.file_done.connect(self.on_file_done)
+        self.worker.finished.connect(self.on_import_finished)
+        self.worker.chunk_done.connect(self.on_chunk_done)
+        self.worker.metrics.connect(self.on_metrics)
+        self.metrics_label.setText("")
+        self.worker.start()
 
+    def cancel_import(self):
+        """取消导入：当前文件写完后停止"""
+        if self.worker is not None:
+            self.worker.cancel()
+            self.btn_cancel.setEnabled(False)
+            self.status_label.setText("状态: 正在取消...")
 
+    def on_file_started(self, idx, filename):
+        """开始写入某个文件"""
+        self.current_index_label.setText(f"正在导入第 {idx} 个文件")
+        self.current_file_label.setText(f"当前文件: {filename}")
 
-        success_count = 0
-        fail_count = 0
-
-
-
-        for idx, file_path in enumerate(selected_files, start=1):
-            # 更新当前进度
-            self.current_index_label.setText(f"正在导入第 {idx} 个文件")
-            filename = os.path.basename(file_path)
-            self.current_file_label.setText(f"当前文件: {filename}")
-            self.status_label.setText("状态: 处理中...")
-            self.error_textedit.clear()
-            # 刷新界面
-            QApplication.processEvents()
-            
-            # 根据文件名判断是日数据还是分钟数据
-            if "_day" in filename:
-                data_type = "day"
-            elif "_min" in filename:
-                data_type = "min"
-            else:
-                print(f"跳过未知类型文件: {filename}")
-                self.status_label.setText("状态: 跳过（未知类型）")
-                QApplication.processEvents()
-                fail_count += 1
-                # 即使跳过，也更新时间显示（已处理数增加）
-                self.update_time_display(idx)
-                continue
-            
-            # 提取股票代码（前6位数字）
-            match = re.search(r'(\d{6})', filename)
-            if not match:
-                print(f"无法从文件名提取股票代码: {filename}")
-                self.status_label.setText("状态: 跳过（无法提取代码）")
-                QApplication.processEvents()
-                fail_count += 1
-                self.update_time_display(idx)
-
-
-                continue
-            stock_code = match.group(1)
-            
-            # 读取csv文件到DataFrame
-            try:
-                df = pd.read_csv(file_path, encoding='utf-8-sig')
-            except Exception as e:
-                error_msg = f"读取CSV失败: {e}"
-                print(f"{error_msg} {file_path}")
-                self.status_label.setText("状态: 失败")
-                self.error_textedit.setPlainText(error_msg)
-                QApplication.processEvents()
-                fail_count += 1
-                continue
-            
-            # 调用对应的导入函数
-            try:
-                if data_type == "day":
-                    import_func_day(conn, stock_code, df)
-                else:
-                    import_func_min(conn, stock_code, df)
-                self.status_label.setText("状态: 成功")
-                self.error_textedit.clear()
-                success_count += 1
-            except Exception as e:
-                error_msg = f"导入数据失败: {e}"
-                print(f"{error_msg} {file_path}")
-                self.status_label.setText("状态: 失败")
-                self.error_textedit.setPlainText(error_msg)
-                QApplication.processEvents()
-                fail_count += 1
-            
-            # 处理完成后统一更新时间显示
-            self.update_time_display(idx)
-
-        conn.close()
-        QMessageBox.information(self, "完成", f"导入完成！成功：{success_count}，失败：{fail_count}")
+    def on_chunk_done(self, idx, number, rows, speed):
+        """大文件流式导入：每写完一块更新状态"""
+        self.status_label.setText(f"状态: 第 {idx} 个文件 第 {number} 块 {rows} 行，{speed:,.0f} 行/秒")
+
+    def on_metrics(self, snapshot):
+        """显示用时最多的几项指标"""
+        self.metrics_label.setText("\n".join(Data01_metrics.summary_lines(snapshot, limit=5)))
+
+    def on_file_done(self, idx, filename, ok, message):
+        """某个文件处理完成"""
+        if ok:
+            self.status_label.setText("状态: 成功")
+        else:
+            print(f"{message} {filename}")
+            self.status_label.setText("状态: 失败")
+            # 失败详情累积显示，便于复制
+            self.error_textedit.append(f"{filename}: {message}")
+        # 处理完成后统一更新时间显示
+        self.update_time_display(idx)
+
+    def on_import_finished(self, success_count, fail_count, skipped_count, total_seconds):
+        """导入结束（完成或取消）"""
+        self.btn_import.setEnabled(True)
+        self.btn_cancel.setEnabled(False)
+        cancelled = self.worker is not None and self.worker.cancel_event.is_set()
+        quality = self.worker.pipeline.quality_summary if self.worker is not None else None
+        metrics_file = self.worker.pipeline.metrics_file if self.worker is not None else None
+        self.worker = None
+        title = "已取消" if cancelled else "完成"
+        message = f"导入{title}！成功：{success_count}，失败：{fail_count}，未变化跳过：{skipped_count}"
+        if quality is not None:
+            import Data01_quality
+            message += "\n" + Data01_quality.format_summary(quality)
+        if metrics_file:
+            message += f"\n各项用时见 {metrics_file}"
+        QMessageBox.information(self, title, message)
         # 可选刷新列表或关闭窗口
-        self.close()
+        if not cancelled:
+            self.close()
+
+    def closeEvent(self, event):
+        """关闭窗口时停止后台导入、目录扫描和元数据计算"""
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancel()
+            self.worker.wait()
+        if self.scan_worker is not None:
+            self.scan_worker.wait()
+        self.meta_worker.stop()
+        self.meta_worker.wait()
+        super().closeEvent(event)
 
 # 独立测试
 if __name__ == '__main__':
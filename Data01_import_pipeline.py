@@ -0,0 +1,338 @@
+# """
+# 数据文件导入流水线：解析与写库重叠执行。
+#   - 解析：进程池提前读取CSV/列式文件并完成类型转换，最多 queue_size 个文件在途（有界队列）
+#   - 写库：调用 run 的线程独占数据库连接，按文件顺序逐个写入
+#   - 大文件（不小于 IMPORT_STREAM_THRESHOLD_MB）不经过进程池，由写库线程按块读取、逐块写入，
+#     整个文件一个事务，峰值内存只与 IMPORT_CHUNK_ROWS 有关
+#   - 指定目标数据库 target 时查导入清单（Data01_file_index），自上次导入以来未变化的文件在解析前跳过
+#   - QUALITY_CHECK 时每个文件在解析进程中经过数据质量闸门（Data01_quality），不合格的行不写入数据库、记入隔离表；
+#     流式导入的大文件在写库线程中逐块检查
+#   - 解析、写库等各项用时记入 Data01_metrics，导入阶段的工作量为文件字节数，
+#     剩余时间按实测的字节吞吐量估算（大小不同的文件不再按同样的用时估计）；每次 run 结束写出指标文件
+# 不依赖PyQt，Form2 的后台线程与命令行都可以使用。
+# """
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import Data01_config
+import Data01_db_utils
+import Data01_file_utils
+import Data01_file_index
+import Data01_metrics
+
+
+def classify_file(file_path):
+#    """
+#    根据文件名判断数据类型并提取股票代码（规则与Form2一致）。
+#    返回 (data_type, stock_code)，data_type 为 'day' 或 'min'；无法识别时抛出 ValueError。
+#    """
+    filename = os.path.basename(file_path)
+    if "_day" in filename:
+        data_type = "day"
+    elif "_min" in filename:
+        data_type = "min"
+    else:
+        raise ValueError("跳过（未知类型）")
+    match = re.search(r'(\d{6})', filename)
+    if not match:
+        raise ValueError("跳过（无法提取代码）")
+    return data_type, match.group(1)
+
+
+class ParsedFile:
+#    """
+#    解析结果：df为None时 error 给出失败原因；stream=True 表示由写库线程流式读取；
+#    skipped=True 表示文件自上次导入以来未变化，不再导入；
+#    quality 为质量检查的结果 (检查行数, 不合格的行, 各原因行数, 检查耗时)，df 中只剩合格的行
+#    """
+    def __init__(self, file_path, data_type=None, stock_code=None, df=None, error=None, seconds=0.0,
+                 stream=False, skipped=False, quality=None):
+        self.file_path = file_path
+        self.data_type = data_type
+        self.stock_code = stock_code
+        self.df = df
+        self.error = error
+        self.seconds = seconds
+        self.stream = stream
+        self.skipped = skipped
+        self.quality = quality
+
+
+def parse_file(file_path, check_quality=False):
+#    """读取并转换单个数据文件（在解析进程中执行，必须是模块级函数以便序列化）；check_quality 时同时做质量检查"""
+    start = time.perf_counter()
+    try:
+        data_type, stock_code = classify_file(file_path)
+    except ValueError as e:
+        return ParsedFile(file_path, error=str(e))
+    try:
+        df = Data01_file_utils.read_data_file(file_path)
+    except Exception as e:
+        return ParsedFile(file_path, data_type, stock_code, error=f"读取文件失败: {e}")
+    quality = None
+    if check_quality:
+        import Data01_quality
+        checked = time.perf_counter()
+        rows = len(df)
+        df, rejected, counts = Data01_quality.check_frame(df, data_type)
+        quality = (rows, rejected, counts, time.perf_counter() - checked)
+    return ParsedFile(file_path, data_type, stock_code, df=df,
+                      seconds=time.perf_counter() - start, quality=quality)
+
+
+class _StreamedFile:
+#    """流式导入的大文件：不提交给解析进程，与 Future 一样通过 result() 取得 ParsedFile"""
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def result(self):
+        try:
+            data_type, stock_code = classify_file(self.file_path)
+        except ValueError as e:
+            return ParsedFile(self.file_path, error=str(e))
+        return ParsedFile(self.file_path, data_type, stock_code, stream=True)
+
+
+class _SkippedFile:
+#    """导入清单判定未变化的文件：不读取，result() 直接返回 skipped 的 ParsedFile"""
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def result(self):
+        return ParsedFile(self.file_path, skipped=True)
+
+
+class ImportPipeline:
+#    """
+#    导入流水线。
+#    connect: 无参函数，返回数据库连接（在写库线程中调用，连接只在该线程使用）
+#    import_day / import_min: 形如 import_day_data(conn, stock_code, df, commit=True) 的写库函数，
+#        流式导入时以 commit=False 逐块调用，由流水线在文件结束时统一提交
+#    chunk_rows / stream_threshold_mb: 流式导入的块行数与文件大小阈值，默认取配置
+#    target: 目标数据库标识（见 Data01_db_utils.target_key）。指定时使用导入清单：
+#        大小、修改时间（或内容哈希）和目标表都与上次导入相同的文件跳过，导入成功的文件记入清单
+#    table_for: (stock_code, data_type) -> 目标表名，默认 Data01_db_utils.table_for；force=True 时不跳过任何文件
+#    check_quality: 是否经过数据质量闸门，默认取 Data01_config.QUALITY_CHECK；
+#        每次 run 的质量汇总（见 Data01_quality.QualityGate.summary）保存在 quality_summary
+#    每次 run 的起点 checkpoint、结束时的指标快照 metrics（Data01_metrics.snapshot）与指标文件路径 metrics_file
+#    """
+    def __init__(self, connect, import_day, import_min, parser_workers=None, queue_size=None,
+                 chunk_rows=None, stream_threshold_mb=None, target=None, table_for=None, force=False,
+                 check_quality=None):
+        self.connect = connect
+        self.import_day = import_day
+        self.import_min = import_min
+        self.target = target
+        self.table_for = table_for or Data01_db_utils.table_for
+        self.force = force
+        self.file_index = None
+        self.file_states = {}     # 路径 -> 解析前取得的 (目标表, 大小, 修改时间)
+        self.file_sizes = {}      # 路径 -> 字节数（导入阶段的工作量）
+        self.skipped = 0          # 最近一次 run 跳过的未变化文件数
+        self.check_quality = Data01_config.QUALITY_CHECK if check_quality is None else check_quality
+        self.gate = None
+        self.quality_summary = None
+        self.checkpoint = None
+        self.metrics = None
+        self.metrics_file = None
+        self.parser_workers = parser_workers or Data01_config.IMPORT_PARSER_WORKERS
+        self.queue_size = queue_size or Data01_config.IMPORT_QUEUE_SIZE
+        self.chunk_rows = chunk_rows or Data01_config.IMPORT_CHUNK_ROWS
+        if stream_threshold_mb is None:
+            stream_threshold_mb = Data01_config.IMPORT_STREAM_THRESHOLD_MB
+        self.stream_threshold = stream_threshold_mb * 1024 * 1024
+
+    def run(self, files, on_start=None, on_done=None, cancel_event=None, on_chunk=None):
+        """
+        导入文件列表。
+        on_start(index, file_path)：开始写入第 index 个文件（从1开始）时回调
+        on_done(index, file_path, ok, message)：该文件处理完成时回调
+        cancel_event：threading.Event，被设置后不再开始新的文件
+        on_chunk(index, file_path, chunk_no, rows, rows_per_sec)：流式导入每写完一块时回调
+        返回 (success_count, fail_count)；未变化而跳过的文件不计入两者，数量见 self.skipped
+        （跳过的文件也会以 ok=True 回调 on_done）
+        """
+        self.skipped = 0
+        self.file_states = {}
+        self.quality_summary = None
+        self.checkpoint = Data01_metrics.checkpoint()
+        self.metrics = self.metrics_file = None
+        self.file_sizes = {file_path: self._size(file_path) for file_path in files}
+        Data01_metrics.start_stage('import', sum(self.file_sizes.values()))
+        start = time.perf_counter()
+        conn = self.connect()
+        executor = ProcessPoolExecutor(max_workers=self.parser_workers)
+        if self.target is not None:
+            self.file_index = Data01_file_index.FileIndex()
+        if self.check_quality:
+            import Data01_quality
+            self.gate = Data01_quality.QualityGate(self.target)
+        try:
+            # 导入期间使用 bulk-load 配置档，结束后恢复
+            with Data01_db_utils.bulk_load(conn):
+                success_count, fail_count = self._run(conn, executor, files, on_start, on_done,
+                                                      cancel_event, on_chunk)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            conn.close()
+            if self.file_index is not None:
+                self.file_index.close()
+                self.file_index = None
+            if self.gate is not None:
+                self.quality_summary = self.gate.finish()
+                self.gate = None
+            Data01_metrics.observe('stage_seconds', time.perf_counter() - start, stage='import')
+            self.metrics = Data01_metrics.snapshot(since=self.checkpoint)
+            try:
+                self.metrics_file = Data01_metrics.write_snapshot(self.metrics, 'import')
+            except Exception as e:
+                print(f"写出指标文件失败: {e}")
+        return success_count, fail_count
+
+    @staticmethod
+    def _size(file_path):
+        try:
+            return os.path.getsize(file_path)
+        except OSError:
+            return 0
+
+    def _unchanged(self, file_path):
+        """按导入清单判断文件是否未变化（一次 stat 加一次主键查询），同时记下导入前的文件状态"""
+        if self.file_index is None:
+            return False
+        try:
+            data_type, stock_code = classify_file(file_path)
+            stat = os.stat(file_path)
+        except (ValueError, OSError):
+            return False   # 交给解析报告错误
+        table = self.table_for(stock_code, data_type)
+        self.file_states[file_path] = (table, stat.st_size, stat.st_mtime)
+        return not self.force and self.file_index.unchanged(file_path, self.target, table,
+                                                            stat.st_size, stat.st_mtime)
+
+    def _record(self, file_path):
+        # 导入成功后记入清单（清单写入失败不影响导入结果）
+        state = self.file_states.pop(file_path, None)
+        if self.file_index is None or state is None:
+            return
+        try:
+            self.file_index.record_import(file_path, self.target, *state)
+        except Exception as e:
+            print(f"记录导入清单失败: {file_path} {e}")
+
+    def _should_stream(self, file_path):
+        try:
+            return os.path.getsize(file_path) >= self.stream_threshold
+        except OSError:
+            return False   # 交给解析进程报告读取错误
+
+    def _stream(self, conn, parsed, index, on_chunk):
+        """
+        逐块读取并写入一个大文件：每块类型转换（及质量检查）后以 commit=False 写入，全部成功后一次提交。
+        返回未通过质量检查的行数。
+        """
+        import_func = self.import_day if parsed.data_type == "day" else self.import_min
+        rejected = 0
+        try:
+            last = time.perf_counter()
+            chunks = Data01_file_utils.iter_data_file(parsed.file_path, self.chunk_rows)
+            for number, chunk in enumerate(chunks, start=1):
+                rows = len(chunk)
+                # 从上一块写完到取得本块的时间即读取与类型转换的用时
+                Data01_metrics.observe('parse_seconds', time.perf_counter() - last, data_type=parsed.data_type)
+                if self.gate is not None:
+                    chunk, bad = self.gate.check(chunk, parsed.data_type, parsed.stock_code, parsed.file_path)
+                    rejected += bad
+                if len(chunk):
+                    with Data01_metrics.timer('db_write_seconds', data_type=parsed.data_type):
+                        import_func(conn, parsed.stock_code, chunk, commit=False)
+                    Data01_metrics.inc('import_rows_total', len(chunk), data_type=parsed.data_type)
+                now = time.perf_counter()
+                # 每块的速度包含读取、类型转换与写库
+                if on_chunk:
+                    on_chunk(index, parsed.file_path, number, rows, rows / (now - last) if now > last else 0.0)
+                last = now
+            with Data01_metrics.timer('db_write_seconds', data_type=parsed.data_type):
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return rejected
+
+    def _run(self, conn, executor, files, on_start, on_done, cancel_event, on_chunk):
+        # 写库主循环：按提交顺序取解析结果，同时补充新的解析任务
+        success_count = 0
+        fail_count = 0
+        pending = deque()
+        next_index = 0
+
+        def fill():
+            # 保持最多 queue_size 个文件在解析中或等待写入
+            nonlocal next_index
+            while next_index < len(files) and len(pending) < self.queue_size:
+                file_path = files[next_index]
+                if self._unchanged(file_path):
+                    pending.append(_SkippedFile(file_path))
+                elif self._should_stream(file_path):
+                    pending.append(_StreamedFile(file_path))
+                else:
+                    pending.append(executor.submit(parse_file, file_path, self.gate is not None))
+                next_index += 1
+
+        def done(parsed, status, message):
+            # 文件处理完成：计数，按字节数推进导入阶段，再回调 on_done
+            Data01_metrics.inc('import_files_total', status=status)
+            Data01_metrics.advance('import', self.file_sizes.get(parsed.file_path, 0))
+            if on_done:
+                on_done(index, parsed.file_path, status != 'failed', message)
+
+        fill()
+        index = 0
+        while pending:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            parsed = pending.popleft().result()
+            fill()
+            index += 1
+            if on_start:
+                on_start(index, parsed.file_path)
+
+            if parsed.skipped:
+                self.skipped += 1
+                done(parsed, 'skipped', "未变化，已跳过")
+                continue
+
+            if parsed.df is None and not parsed.stream:
+                fail_count += 1
+                done(parsed, 'failed', parsed.error)
+                continue
+
+            try:
+                rejected = 0
+                if not parsed.stream:
+                    # 解析进程中的用时（含质量检查）
+                    Data01_metrics.observe('parse_seconds', parsed.seconds, data_type=parsed.data_type)
+                if parsed.quality is not None and self.gate is not None:
+                    rows, rejected_rows, counts, seconds = parsed.quality
+                    self.gate.record(rows, rejected_rows, counts, seconds, parsed.data_type, parsed.stock_code,
+                                     parsed.file_path)
+                    rejected = len(rejected_rows)
+                if parsed.stream:
+                    rejected = self._stream(conn, parsed, index, on_chunk)
+                elif parsed.df.empty and rejected:
+                    pass   # 全部行未通过质量检查，没有可写入的行
+                else:
+                    import_func = self.import_day if parsed.data_type == "day" else self.import_min
+                    with Data01_metrics.timer('db_write_seconds', data_type=parsed.data_type):
+                        import_func(conn, parsed.stock_code, parsed.df)
+                    Data01_metrics.inc('import_rows_total', len(parsed.df), data_type=parsed.data_type)
+                success_count += 1
+                self._record(parsed.file_path)
+                done(parsed, 'ok', f"质量检查隔离 {rejected} 行" if rejected else "")
+            except Exception as e:
+                fail_count += 1
+                done(parsed, 'failed', f"导入数据失败: {e}")
+        return success_count, fail_count
@@ -0,0 +1,350 @@
+# """
+# 技术指标引擎：基于数据库中已导入的日线，为全部股票计算 Data01_config.INDICATORS 中配置的指标，
+# 结果写入指标表 stock_indicators（主键 ts_code, trade_date）。
+#   ma_<n>                 n日简单移动平均（收盘价）
+#   ema_<n>                n日指数移动平均，alpha = 2/(n+1)，以第一根K线的收盘价为初值
+#   rsi_<n>                相对强弱指标，涨跌幅按 alpha = 1/n 平滑（Wilder），前n根K线为空
+#   macd_<f>_<s>_<g>       DIF = EMA(f) - EMA(s)；macd_signal_* 为DIF的g日EMA（DEA）；macd_hist_* = DIF - DEA
+#   atr_<n>                平均真实波幅，真实波幅按 alpha = 1/n 平滑，前n-1根K线为空
+#   vol_<n>                n日对数收益率的标准差，按每年 TRADING_DAYS 个交易日年化
+# 一批股票的K线拼接为一个按 (股票, 日期) 排列的长数组：滚动窗口类指标用累计和一次算出；
+# 递推类指标（EMA、RSI、MACD、ATR）按“第几根新K线”逐步推进，每一步同时处理这一批的所有股票。
+# 每只股票的滚动状态（最近一个窗口的收盘价、各递推指标的当前值、已处理的K线数）保存在 indicator_state 表，
+# 每日增量更新只读取和计算新的K线，耗时与历史长度无关；指标配置变化或 rebuild=True 时整只股票重新计算。
+# 日线导入退回整体upsert（历史数据被修订）或复权价格整只股票重新计算时，导入函数删除该股票的状态
+# （Data01_db_utils.import_day_data），下次更新时同样从头计算，不会在过时的状态上继续递推。
+# 用法：python Data01_indicators.py [--rebuild] [--codes 000001 600000]
+# """
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import Data01_config
+import Data01_db_utils
+import Data01_db_query
+
+INDICATOR_TABLE = "stock_indicators"
+STATE_TABLE = "indicator_state"
+# 波动率年化使用的每年交易日数
+TRADING_DAYS = 252
+
+
+def indicator_columns(spec=None):
+#     """按指标配置返回指标表的列名（不含 ts_code, trade_date）"""
+    spec = Data01_config.INDICATORS if spec is None else spec
+    columns = [f"ma_{n}" for n in spec.get('ma', [])]
+    columns += [f"ema_{n}" for n in spec.get('ema', [])]
+    columns += [f"rsi_{n}" for n in spec.get('rsi', [])]
+    for fast, slow, signal in spec.get('macd', []):
+        suffix = f"{fast}_{slow}_{signal}"
+        columns += [f"macd_{suffix}", f"macd_signal_{suffix}", f"macd_hist_{suffix}"]
+    columns += [f"atr_{n}" for n in spec.get('atr', [])]
+    columns += [f"vol_{n}" for n in spec.get('vol', [])]
+    return columns
+
+
+def window_length(spec):
+#     """状态中需要保留的收盘价个数：最长均线窗口减一，或最长波动率窗口（n个收益率需要n+1个收盘价）"""
+    lengths = [n - 1 for n in spec.get('ma', [])] + list(spec.get('vol', []))
+    return max(lengths + [1])
+
+
+def _grouped_rolling_sum(values, window):
+    # 长数组上的滚动求和：第 i 个结果为 values[i-window+1 .. i] 之和，调用方只取不跨越股票边界的位置
+    cumulative = np.concatenate([[0.0], np.cumsum(values)])
+    index = np.arange(len(values))
+    return cumulative[index + 1] - cumulative[np.maximum(index + 1 - window, 0)]
+
+
+def _date_text(dates):
+    # datetime64 列转换为 'YYYYMMDD' 文本（按年月日整数拼接，比 strftime 快得多）
+    days = dates.to_numpy().astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    years = days.astype('datetime64[Y]').astype(np.int64) + 1970
+    numbers = years * 10000 + (months.astype(np.int64) % 12 + 1) * 100 + (days - months).astype(np.int64) + 1
+    return numbers.astype(str)
+
+
+def compute_batch(groups, spec):
+#     """
+#     计算一批股票的指标。
+#     参数:
+#         groups: 列表，每项为 (state, high, low, close)；state 为上次保存的状态（没有时为None），
+#                 high / low / close 为新K线的 float64 数组（按日期升序，至少一根）
+#         spec: 指标配置，见 Data01_config.INDICATORS
+#     返回:
+#         (各列的 float64 数组组成的dict（所有股票的新K线按顺序拼接）, 新的状态列表)
+#     """
+    n_groups = len(groups)
+    lookback = window_length(spec)
+    buffers = [state['closes'] if state else [] for state, _, _, _ in groups]
+    new_counts = np.array([len(close) for _, _, _, close in groups], dtype=np.int64)
+    buffer_counts = np.array([len(buffer) for buffer in buffers], dtype=np.int64)
+    bars_before = np.array([state['bars'] if state else 0 for state, _, _, _ in groups], dtype=np.int64)
+
+    # 长数组：每只股票依次为 [状态中的收盘价窗口, 新K线]
+    ext_counts = buffer_counts + new_counts
+    ext_starts = np.concatenate([[0], np.cumsum(ext_counts)[:-1]])
+    close = np.concatenate([np.concatenate([np.asarray(buffer, dtype=np.float64), group[3]])
+                            for buffer, group in zip(buffers, groups)])
+    high = np.concatenate([group[1] for group in groups])
+    low = np.concatenate([group[2] for group in groups])
+    position = np.arange(len(close)) - np.repeat(ext_starts, ext_counts)
+    is_new = position >= np.repeat(buffer_counts, ext_counts)
+    # 在整个历史中的K线序号（从0开始）
+    bar_index = np.repeat(bars_before - buffer_counts, ext_counts) + position
+    previous = np.concatenate([[np.nan], close[:-1]])
+    previous[position == 0] = np.nan
+
+    out = {}
+    for n in spec.get('ma', []):
+        values = _grouped_rolling_sum(close, n) / n
+        values[bar_index < n - 1] = np.nan
+        out[f"ma_{n}"] = values
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_ret = np.log(close / previous)
+    log_ret[~np.isfinite(log_ret)] = np.nan
+    ret_filled = np.nan_to_num(log_ret)
+    for n in spec.get('vol', []):
+        total = _grouped_rolling_sum(ret_filled, n)
+        squares = _grouped_rolling_sum(ret_filled ** 2, n)
+        variance = np.maximum(squares - total * total / n, 0.0) / max(n - 1, 1)
+        values = np.sqrt(variance * TRADING_DAYS)
+        values[bar_index < n] = np.nan
+        out[f"vol_{n}"] = values
+
+    # 递推类指标：只在新K线上推进，第 j 步处理每只股票的第 j 根新K线
+    new_close = close[is_new]
+    new_previous = previous[is_new]
+    new_bar = bar_index[is_new]
+    tr = np.maximum.reduce([high - low, np.abs(high - new_previous), np.abs(low - new_previous)])
+    tr = np.where(np.isnan(new_previous), high - low, tr)
+    change = new_close - new_previous
+    gain = np.maximum(change, 0.0)
+    loss = np.maximum(-change, 0.0)
+
+    def carry(kind, key, size=1):
+        # 上次保存的递推值（没有状态时为NaN），形状为 (股票数, size)
+        values = np.full((n_groups, size), np.nan)
+        for i, (state, _, _, _) in enumerate(groups):
+            if state and str(key) in state[kind]:
+                values[i] = state[kind][str(key)]
+        return values
+
+    emas = {n: carry('ema', n)[:, 0] for n in spec.get('ema', [])}
+    macds = {tuple(m): carry('macd', '_'.join(map(str, m)), 3) for m in spec.get('macd', [])}
+    rsis = {n: carry('rsi', n, 2) for n in spec.get('rsi', [])}
+    atrs = {n: carry('atr', n)[:, 0] for n in spec.get('atr', [])}
+    recursive = {col: np.full(len(new_close), np.nan) for col in indicator_columns(spec)
+                 if not col.startswith(('ma_', 'vol_'))}
+
+    new_starts = np.concatenate([[0], np.cumsum(new_counts)[:-1]])
+    for step in range(int(new_counts.max()) if n_groups else 0):
+        active = np.nonzero(new_counts > step)[0]
+        index = new_starts[active] + step
+        x = new_close[index]
+        first = new_bar[index] == 0
+        for n, ema in emas.items():
+            alpha = 2.0 / (n + 1)
+            ema[active] = np.where(first, x, ema[active] + alpha * (x - ema[active]))
+            recursive[f"ema_{n}"][index] = ema[active]
+        for (fast, slow, signal), state in macds.items():
+            values = state[active]
+            values[:, 0] = np.where(first, x, values[:, 0] + 2.0 / (fast + 1) * (x - values[:, 0]))
+            values[:, 1] = np.where(first, x, values[:, 1] + 2.0 / (slow + 1) * (x - values[:, 1]))
+            dif = values[:, 0] - values[:, 1]
+            values[:, 2] = np.where(first, dif, values[:, 2] + 2.0 / (signal + 1) * (dif - values[:, 2]))
+            state[active] = values
+            suffix = f"{fast}_{slow}_{signal}"
+            recursive[f"macd_{suffix}"][index] = dif
+            recursive[f"macd_signal_{suffix}"][index] = values[:, 2]
+            recursive[f"macd_hist_{suffix}"][index] = dif - values[:, 2]
+        bar = new_bar[index]
+        for n, state in rsis.items():
+            values = state[active]
+            g, l = gain[index], loss[index]
+            seed = bar == 1
+            for column, current in ((0, g), (1, l)):
+                values[:, column] = np.where(seed, current, values[:, column] + (current - values[:, column]) / n)
+            values[bar == 0] = np.nan
+            state[active] = values
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rsi = np.where(values[:, 1] == 0, 100.0, 100.0 - 100.0 / (1.0 + values[:, 0] / values[:, 1]))
+            recursive[f"rsi_{n}"][index] = np.where(bar >= n, rsi, np.nan)
+        for n, atr in atrs.items():
+            t = tr[index]
+            atr[active] = np.where(first, t, atr[active] + (t - atr[active]) / n)
+            recursive[f"atr_{n}"][index] = np.where(bar >= n - 1, atr[active], np.nan)
+
+    columns = {col: (out[col][is_new] if col in out else recursive[col]) for col in indicator_columns(spec)}
+
+    # 新状态：最近 lookback 个收盘价、递推值、累计K线数
+    ext_ends = ext_starts + ext_counts
+    states = []
+    for i in range(n_groups):
+        keep = min(int(ext_counts[i]), lookback)
+        states.append({
+            'bars': int(bars_before[i] + new_counts[i]),
+            'closes': close[ext_ends[i] - keep:ext_ends[i]].tolist(),
+            'ema': {str(n): float(ema[i]) for n, ema in emas.items()},
+            'macd': {'_'.join(map(str, m)): state[i].tolist() for m, state in macds.items()},
+            'rsi': {str(n): state[i].tolist() for n, state in rsis.items()},
+            'atr': {str(n): float(atr[i]) for n, atr in atrs.items()},
+        })
+    return columns, states
+
+
+class IndicatorEngine:
+#    """
+#    指标引擎：conn 为行情数据库连接（指标表与状态表建在同一数据库中），
+#    spec 默认取 Data01_config.INDICATORS，price 为 "hfq"（后复权价格，见 Data01_adjust）或 "raw"（日线原始价格）。
+#    """
+    def __init__(self, conn, spec=None, price=None, batch_stocks=None):
+        self.conn = conn
+        self.spec = Data01_config.INDICATORS if spec is None else spec
+        self.price = price or Data01_config.INDICATOR_PRICE
+        self.batch_stocks = batch_stocks or Data01_config.INDICATOR_BATCH_STOCKS
+        self.columns = indicator_columns(self.spec)
+        self.spec_key = json.dumps(self.spec, sort_keys=True)
+        self.ph = '?' if Data01_config.DB_TYPE == "sqlite" else '%s'
+        self._create_tables()
+
+    def _create_tables(self):
+        sqlite = Data01_config.DB_TYPE == "sqlite"
+        date_type, code_type, real_type = ("TEXT", "TEXT", "REAL") if sqlite else ("DATE", "VARCHAR(20)", "DOUBLE")
+        cursor = self.conn.cursor()
+        columns = ''.join(f", {col} {real_type}" for col in self.columns)
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {INDICATOR_TABLE} (ts_code {code_type} NOT NULL, "
+                       f"trade_date {date_type} NOT NULL{columns}, PRIMARY KEY (ts_code, trade_date))"
+                       f"{' WITHOUT ROWID' if sqlite else ''}")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} (ts_code {code_type} PRIMARY KEY, "
+                       f"last_date {code_type}, bars INTEGER, spec TEXT, state TEXT)")
+        # 配置中新增的指标：给已有的指标表补充列
+        if sqlite:
+            cursor.execute(f"PRAGMA table_info({INDICATOR_TABLE})")
+            existing = {row[1] for row in cursor.fetchall()}
+        else:
+            cursor.execute("SELECT column_name FROM information_schema.columns "
+                           "WHERE table_schema = DATABASE() AND table_name = %s", (INDICATOR_TABLE,))
+            existing = {row[0] for row in cursor.fetchall()}
+        for col in self.columns:
+            if col not in existing:
+                cursor.execute(f"ALTER TABLE {INDICATOR_TABLE} ADD COLUMN {col} {real_type}")
+        self.conn.commit()
+
+    def stored_codes(self):
+        """数据库中有日线数据的全部股票（分表结构为6位代码，合并表为 ts_code）"""
+        suffix = 'adj' if self.price == 'hfq' else 'day'
+        if Data01_config.DB_SCHEMA == "consolidated":
+            cursor = self.conn.cursor()
+            cursor.execute(f"SELECT DISTINCT ts_code FROM stock_{suffix}")
+            return sorted(row[0] for row in cursor.fetchall())
+        return [table.split('_')[1] for table in Data01_db_utils.list_per_stock_tables(self.conn, suffix)]
+
+    def load_states(self, codes):
+        """读取状态：{代码: 状态dict}；指标配置已变化的状态视为不存在"""
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT ts_code, last_date, spec, state FROM {STATE_TABLE}")
+        wanted = set(codes)
+        states = {}
+        for code, last_date, spec_key, state in cursor.fetchall():
+            if code in wanted and spec_key == self.spec_key:
+                states[code] = dict(json.loads(state), last_date=last_date)
+        return states
+
+    def _load_bars(self, codes, start):
+        # 读取K线（按股票、日期升序），列统一为 ts_code, trade_date, high, low, close
+        if self.price == 'hfq':
+            df = Data01_db_query.load_adjusted(codes, start, None, ['high_hfq', 'low_hfq', 'close_hfq'],
+                                               conn=self.conn, use_cache=False)
+            return df.rename(columns={'high_hfq': 'high', 'low_hfq': 'low', 'close_hfq': 'close'})
+        return Data01_db_query.load_day(codes, start, None, ['high', 'low', 'close'],
+                                        conn=self.conn, use_cache=False)
+
+    def _update_batch(self, codes, states):
+        # 已有状态的股票从最早的状态日期开始读，再按各自的状态日期过滤
+        resumed = [code for code in codes if code in states]
+        fresh = [code for code in codes if code not in states]
+        frames = []
+        if fresh:
+            frames.append(self._load_bars(fresh, None))
+        if resumed:
+            frames.append(self._load_bars(resumed, min(states[code]['last_date'] for code in resumed)))
+        bars = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        bars = bars.dropna(subset=['close'])
+        if bars.empty:
+            return 0
+        last_dates = pd.to_datetime(bars['ts_code'].map({code: states[code]['last_date'] for code in resumed}),
+                                    format='%Y%m%d')
+        bars = bars[(last_dates.isna() | (bars['trade_date'] > last_dates)).to_numpy()]
+        if bars.empty:
+            return 0
+        bars = bars.assign(trade_date=_date_text(bars['trade_date']))
+
+        codes_in_batch = bars['ts_code'].to_numpy()
+        bounds = np.flatnonzero(codes_in_batch[1:] != codes_in_batch[:-1]) + 1
+        starts = np.concatenate([[0], bounds])
+        ends = np.concatenate([bounds, [len(bars)]])
+        high = bars['high'].to_numpy(dtype=np.float64)
+        low = bars['low'].to_numpy(dtype=np.float64)
+        close = bars['close'].to_numpy(dtype=np.float64)
+        group_codes = codes_in_batch[starts]
+        groups = [(states.get(code), high[s:e], low[s:e], close[s:e])
+                  for code, s, e in zip(group_codes, starts, ends)]
+        columns, new_states = compute_batch(groups, self.spec)
+
+        result = pd.DataFrame({'ts_code': codes_in_batch, 'trade_date': bars['trade_date'].to_numpy(), **columns})
+        dates = bars['trade_date'].to_numpy()
+        verb = "INSERT OR REPLACE INTO" if Data01_config.DB_TYPE == "sqlite" else "REPLACE INTO"
+        state_rows = [(code, dates[e - 1], state['bars'], self.spec_key, json.dumps(state))
+                      for code, e, state in zip(group_codes, ends, new_states)]
+        try:
+            Data01_db_utils.upsert_dataframe(self.conn, INDICATOR_TABLE, result,
+                                             ['ts_code', 'trade_date'] + self.columns, commit=False)
+            self.conn.cursor().executemany(
+                f"{verb} {STATE_TABLE} (ts_code, last_date, bars, spec, state) VALUES "
+                f"({', '.join([self.ph] * 5)})", state_rows)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return len(result)
+
+    def update(self, codes=None, rebuild=False, progress=None):
+        """
+        增量更新指标表：每只股票只计算上次状态之后的新K线（没有状态时计算全部历史）。
+        codes 默认为数据库中的全部股票；rebuild=True 时忽略已保存的状态全部重新计算。
+        progress: 回调 progress(已完成股票数, 总股票数)
+        返回 {'stocks', 'rows', 'seconds'}
+        """
+        start = time.perf_counter()
+        codes = list(codes) if codes is not None else self.stored_codes()
+        states = {} if rebuild else self.load_states(codes)
+        rows = 0
+        for i in range(0, len(codes), self.batch_stocks):
+            rows += self._update_batch(codes[i:i + self.batch_stocks], states)
+            if progress:
+                progress(min(i + self.batch_stocks, len(codes)), len(codes))
+        return {'stocks': len(codes), 'rows': rows, 'seconds': time.perf_counter() - start}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="增量计算技术指标并写入指标表")
+    parser.add_argument("--codes", nargs="*", help="只计算这些股票（默认数据库中的全部股票）")
+    parser.add_argument("--rebuild", action="store_true", help="忽略已保存的状态，全部重新计算")
+    args = parser.parse_args(argv)
+    conn = Data01_db_utils.get_db_connection()
+    try:
+        stats = IndicatorEngine(conn).update(args.codes, rebuild=args.rebuild)
+    finally:
+        conn.close()
+    print(f"股票 {stats['stocks']} 只，写入 {stats['rows']} 行，用时 {stats['seconds']:.2f} 秒")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,287 @@
+# """
+# 运行指标：计数器、耗时直方图与计时器，记录下载与导入各阶段的次数与用时——
+# 接口调用（按接口名区分）、限流等待、写数据文件、覆盖清单与Excel日志、解析、质量检查、写库、派生表等。
+# 各阶段用 start_stage / add_work 登记工作量、advance 报告完成量，eta 按最近 RATE_WINDOW_SECONDS 秒
+# 实测的吞吐量估算剩余时间（下载以接口请求为单位，导入以文件字节数为单位）。
+# 只依赖标准库、线程安全；全局注册表 REGISTRY 在进程内累计（与Prometheus计数器的语义一致），
+# 一次运行用 checkpoint() 记下起点，snapshot(since=...) 取本次运行的增量，
+# 结束时 write_snapshot 写出 JSON 或 Prometheus 文本格式的指标文件（Data01_config.METRICS_FORMAT）：
+# JSON 每次运行一个带时间的文件；Prometheus 每种运行只有一个固定文件，原子替换，供 textfile collector 收集。
+# 解析进程中的用时不在本进程的注册表里，由写库线程按 ParsedFile.seconds 记录。
+# """
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import Data01_config
+
+# 耗时直方图各桶的上界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 估算剩余时间时使用最近多少秒的吞吐量
+RATE_WINDOW_SECONDS = 30.0
+# Prometheus 文本格式中指标名的前缀
+PROMETHEUS_PREFIX = "stock_"
+
+# 直方图（秒）的中文名，用于日志与界面
+HISTOGRAM_NAMES = {
+    'stage_seconds': '阶段',
+    'api_request_seconds': '接口调用',
+    'api_rate_limit_wait_seconds': '限流等待',
+    'file_write_seconds': '写文件',
+    'parse_seconds': '解析',
+    'quality_check_seconds': '质量检查',
+    'db_write_seconds': '写库(含派生表)',
+    'db_upsert_seconds': '写数据表',
+    'derive_seconds': '派生表',
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class _Progress:
+#    """一个阶段的工作量与完成量；samples 保留窗口内的 (时间, 完成量)，外加一个窗口之前的样本作为起点"""
+    def __init__(self, total, now):
+        self.total = total
+        self.done = 0
+        self.start = now
+        self.samples = deque([(now, 0)])
+
+    def advance(self, units, now):
+        self.done += units
+        self.samples.append((now, self.done))
+        while len(self.samples) > 2 and self.samples[1][0] <= now - RATE_WINDOW_SECONDS:
+            self.samples.popleft()
+
+    def rate(self, now):
+        # 从窗口起点到现在（而不是到最后一次完成）的吞吐量：停滞时估计随之变慢
+        since, done = self.samples[0]
+        if now <= since or self.done <= done:
+            return None
+        return (self.done - done) / (now - since)
+
+    def summary(self, now):
+        rate = self.rate(now)
+        remaining = max(self.total - self.done, 0)
+        eta = 0.0 if remaining == 0 else (remaining / rate if rate else None)
+        return {'done': self.done, 'total': self.total, 'seconds': now - self.start,
+                'rate': rate, 'eta_seconds': eta}
+
+
+class Metrics:
+#    """
+#    指标注册表（线程安全）。
+#    计数器与直方图按 (名称, 标签) 区分，标签以关键字参数给出，如 observe('api_request_seconds', 0.3, endpoint='daily')。
+#    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.counters = {}      # (名称, 标签) -> 数值
+        self.histograms = {}    # (名称, 标签) -> [各桶次数..., 超出最大上界的次数, 总和]
+        self.stages = {}        # 阶段名 -> _Progress
+
+    def inc(self, name, value=1, **labels):
+        """计数器加 value"""
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """在直方图中记录一次用时（秒）"""
+        key = _key(name, labels)
+        slot = bisect_left(self.buckets, seconds)
+        with self.lock:
+            values = self.histograms.get(key)
+            if values is None:
+                values = self.histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            values[slot] += 1
+            values[-1] += seconds
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """计时 with 块（出现异常时同样记录），用时记入直方图 name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def start_stage(self, stage, total=0):
+        """开始（或重新开始）一个阶段并登记工作量"""
+        with self.lock:
+            self.stages[stage] = _Progress(total, time.monotonic())
+
+    def add_work(self, stage, units):
+        """阶段进行中追加工作量（如分钟数据窗口被截断拆分）；阶段未开始时忽略"""
+        with self.lock:
+            progress = self.stages.get(stage)
+            if progress is not None:
+                progress.total += units
+
+    def advance(self, stage, units=1):
+        """报告阶段完成了 units 个单位的工作；阶段未开始时忽略"""
+        with self.lock:
+            progress = self.stages.get(stage)
+            if progress is not None:
+                progress.advance(units, time.monotonic())
+
+    def eta(self, stage):
+        """按实测吞吐量估算阶段的剩余秒数；阶段未开始或尚无完成量时返回None"""
+        with self.lock:
+            progress = self.stages.get(stage)
+            return None if progress is None else progress.summary(time.monotonic())['eta_seconds']
+
+    def checkpoint(self):
+        """当前计数器与直方图的副本，传给 snapshot(since=...) 取此后的增量"""
+        with self.lock:
+            return dict(self.counters), {key: list(values) for key, values in self.histograms.items()}
+
+    def snapshot(self, since=None):
+        """
+        返回可序列化为JSON的快照：counters / histograms（累计桶计数、次数、总和）/ stages（各阶段进度与剩余时间）。
+        since 为 checkpoint() 的返回值时只包含此后的增量。
+        """
+        counters, histograms = self.checkpoint()
+        with self.lock:
+            now = time.monotonic()
+            stages = {stage: progress.summary(now) for stage, progress in self.stages.items()}
+        base_counters, base_histograms = since or ({}, {})
+        snapshot = {'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'counters': [], 'histograms': [],
+                    'stages': stages}
+        for (name, labels), value in sorted(counters.items()):
+            value -= base_counters.get((name, labels), 0)
+            if value:
+                snapshot['counters'].append({'name': name, 'labels': dict(labels), 'value': value})
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        for (name, labels), values in sorted(histograms.items()):
+            base = base_histograms.get((name, labels))
+            if base is not None:
+                values = [value - old for value, old in zip(values, base)]
+            count = sum(values[:-1])
+            if not count:
+                continue
+            cumulative, buckets = 0, {}
+            for bound, value in zip(bounds, values):
+                cumulative += value
+                buckets[bound] = cumulative
+            snapshot['histograms'].append({'name': name, 'labels': dict(labels), 'count': count,
+                                           'sum': values[-1], 'buckets': buckets})
+        return snapshot
+
+    def reset(self):
+        """清空全部指标与阶段进度"""
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.stages.clear()
+
+
+# 进程内的全局注册表及其快捷方式
+REGISTRY = Metrics()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+start_stage = REGISTRY.start_stage
+add_work = REGISTRY.add_work
+advance = REGISTRY.advance
+eta = REGISTRY.eta
+checkpoint = REGISTRY.checkpoint
+snapshot = REGISTRY.snapshot
+
+
+def _prometheus_labels(labels, extra=None):
+    items = list(labels.items()) + list((extra or {}).items())
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + '}'
+
+
+def to_prometheus(snapshot, run=None):
+#     """
+#     把快照转换为 Prometheus 文本格式。快照只含一次运行的增量，每次运行覆盖上一次的文件，
+#     所以全部声明为 gauge（计数器与直方图加 last_run_ 前缀，直方图展开为 _bucket/_sum/_count 三组），
+#     不声明为 counter/histogram——否则下一次运行较小的数值会被当作计数器重置，rate()/increase() 出错。
+#     run 给出时作为标签附加到每个序列，下载与导入的指标文件中不会出现相同的序列。
+#     """
+    lines = []
+    typed = set()
+    extra = {'run': run} if run else {}
+
+    def gauge(name, labels, value):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name}{_prometheus_labels(labels, extra)} {value}")
+
+    for item in snapshot['counters']:
+        # gauge 不使用计数器专用的 _total 后缀
+        base = item['name'][:-len('_total')] if item['name'].endswith('_total') else item['name']
+        name = PROMETHEUS_PREFIX + 'last_run_' + base
+        gauge(name, item['labels'], item['value'])
+    for item in snapshot['histograms']:
+        name = PROMETHEUS_PREFIX + 'last_run_' + item['name']
+        for bound, count in item['buckets'].items():
+            gauge(f"{name}_bucket", {**item['labels'], 'le': bound}, count)
+        gauge(f"{name}_sum", item['labels'], f"{item['sum']:.6f}")
+        gauge(f"{name}_count", item['labels'], item['count'])
+    for field, suffix in (('done', 'done_units'), ('total', 'total_units'), ('seconds', 'elapsed_seconds'),
+                          ('eta_seconds', 'eta_seconds')):
+        name = f"{PROMETHEUS_PREFIX}stage_{suffix}"
+        for stage, progress in snapshot['stages'].items():
+            if progress[field] is not None:
+                gauge(name, {'stage': stage}, progress[field])
+    return '\n'.join(lines) + '\n'
+
+
+def write_snapshot(snapshot, run, fmt=None, directory=None):
+#     """
+#     把快照写入 <directory>/metrics_<run>_<时间>.json 或 <directory>/metrics_<run>.prom，返回文件路径。
+#     .prom 文件每种运行只有一个，先写入 .part 临时文件再替换，textfile collector 不会读到写了一半的文件，
+#     目录中也不会积累重复的序列。
+#     fmt 默认取 Data01_config.METRICS_FORMAT（"json" / "prometheus"），为 None 时不写出并返回 None。
+#     """
+    fmt = fmt if fmt is not None else Data01_config.METRICS_FORMAT
+    if not fmt:
+        return None
+    if fmt not in ('json', 'prometheus'):
+        raise ValueError(f"不支持的指标文件格式: {fmt}")
+    directory = directory or Data01_config.METRICS_DIR
+    os.makedirs(directory, exist_ok=True)
+    if fmt == 'json':
+        path = os.path.join(directory, f"metrics_{run}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        return path
+    path = os.path.join(directory, f"metrics_{run}.prom")
+    temp_path = path + '.part'
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(to_prometheus(snapshot, run))
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return path
+
+
+def summary_lines(snapshot, limit=None):
+#     """
+#     快照的文字说明：每个直方图（按标签区分）一行——次数、合计与平均用时，按合计用时从多到少排列。
+#     并发执行的操作（如各线程的接口调用）合计用时可能超过实际经过的时间。
+#     """
+    items = sorted(snapshot['histograms'], key=lambda item: -item['sum'])
+    lines = []
+    for item in items[:limit]:
+        label = HISTOGRAM_NAMES.get(item['name'], item['name'])
+        if item['labels']:
+            label += ' ' + '/'.join(item['labels'].values())
+        lines.append(f"{label}: {item['count']} 次，合计 {item['sum']:.2f} 秒，"
+                     f"平均 {item['sum'] / item['count'] * 1000:.1f} 毫秒")
+    return lines
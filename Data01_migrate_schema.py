@@ -0,0 +1,33 @@
+# """
+# 表结构迁移工具：把每只股票一张表（stock_<代码>_day/_min）的数据
+# 批量复制到合并表 stock_day / stock_min。
+# 用法：python Data01_migrate_schema.py [--drop-old]
+# 迁移完成后把 Data01_config.DB_SCHEMA 改为 "consolidated"，导入程序即写入合并表。
+# """
+import argparse
+
+import Data01_config
+import Data01_db_utils
+
+
+def main():
+    parser = argparse.ArgumentParser(description="迁移分表数据到合并表 stock_day / stock_min")
+    parser.add_argument("--drop-old", action="store_true", help="复制成功后删除原来的分表")
+    args = parser.parse_args()
+
+    conn = Data01_db_utils.get_db_connection()
+    try:
+        def progress(done, total, table, rows):
+            print(f"[{done}/{total}] {table}: {rows} 行")
+
+        stats = Data01_db_utils.migrate_to_consolidated(conn, drop_old=args.drop_old, progress=progress)
+    finally:
+        conn.close()
+
+    print(f"迁移完成：{stats['tables']} 张表，{stats['rows']} 行，用时 {stats['seconds']:.1f} 秒")
+    if Data01_config.DB_SCHEMA != "consolidated":
+        print('请将 Data01_config.DB_SCHEMA 设置为 "consolidated" 以使用合并表')
+
+
+if __name__ == '__main__':
+    main()
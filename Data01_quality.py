@@ -0,0 +1,238 @@
+# """
+# 写库前的数据质量闸门：对一个文件（或流式导入的一块）的全部行，按列用NumPy向量运算一次算出各条规则的布尔掩码，
+# 合并为每行一个原因位图；不合格的行不写入数据库，连同原因代码记入隔离表 quarantine。
+# 规则（原因代码）：
+#   MISSING_KEY         日期 / 时间为空
+#   DUPLICATE_KEY       日期 / 时间重复（保留最后一行，与upsert的结果一致；流式导入只在同一块内判断）
+#   NAN_PRICE           开盘、最高、最低、收盘价有缺失
+#   NONPOSITIVE_PRICE   价格不大于0
+#   HIGH_LT_LOW         最高价低于最低价
+#   OPEN_OUT_OF_RANGE   开盘价不在 [最低价, 最高价] 内
+#   CLOSE_OUT_OF_RANGE  收盘价不在 [最低价, 最高价] 内
+#   PCT_CHG_MISMATCH    涨跌幅与 (收盘价 / 昨收 - 1) × 100 不符（日线）
+#   NEGATIVE_VOLUME     成交量或成交额为负
+# 隔离表和每次导入的汇总（quality_runs）保存在本地SQLite（Data01_config.QUALITY_DB_PATH）中；
+# 没有不合格的行时不访问隔离库，闸门的开销只有向量运算本身。
+# """
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import Data01_config
+import Data01_file_utils
+import Data01_metrics
+
+# 原因代码，顺序即位图中的位
+REASONS = ['MISSING_KEY', 'DUPLICATE_KEY', 'NAN_PRICE', 'NONPOSITIVE_PRICE', 'HIGH_LT_LOW',
+           'OPEN_OUT_OF_RANGE', 'CLOSE_OUT_OF_RANGE', 'PCT_CHG_MISMATCH', 'NEGATIVE_VOLUME']
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+
+
+def _values(df, col):
+    # 一列的 float64 数组；CSV中混入文本等无法解析的值时按NaN处理
+    series = df[col]
+    if series.dtype.kind in 'fiub':
+        return series.to_numpy(dtype=np.float64)
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64)
+
+
+def rule_masks(df, data_type):
+#     """
+#     计算各条规则的掩码，返回 {原因代码: 布尔数组}（True 表示该行违反规则）。
+#     文件中没有的列对应的规则不检查。
+#     """
+    key = 'trade_date' if data_type == 'day' else 'trade_time'
+    tolerance = Data01_config.QUALITY_PRICE_TOLERANCE
+    masks = {}
+    if key in df.columns:
+        keys = df[key]
+        missing = keys.isna().to_numpy(copy=True)
+        # 列式文件按固定schema写入时，缺失的日期可能被转换成了文本 'nan'
+        missing |= keys.isin(['', 'nan']).to_numpy(dtype=bool)
+        masks['MISSING_KEY'] = missing
+        # 文件按日期排序（tushare为降序）时重复的键必然相邻，比较相邻两行即可，不必建哈希表
+        following = keys.shift(-1)
+        ordered = not missing.any() and ((keys <= following).iloc[:-1].all() or (keys >= following).iloc[:-1].all())
+        if ordered:
+            duplicate = (keys == following).fillna(False).to_numpy(dtype=bool)
+        else:
+            duplicate = keys.duplicated(keep='last').to_numpy()
+        masks['DUPLICATE_KEY'] = duplicate & ~missing
+    prices = {col: _values(df, col) for col in PRICE_COLUMNS if col in df.columns}
+    if prices:
+        with np.errstate(invalid='ignore'):
+            masks['NAN_PRICE'] = np.logical_or.reduce([np.isnan(v) for v in prices.values()])
+            masks['NONPOSITIVE_PRICE'] = np.logical_or.reduce([v <= 0 for v in prices.values()])
+            if 'high' in prices and 'low' in prices:
+                high, low = prices['high'], prices['low']
+                masks['HIGH_LT_LOW'] = high < low - tolerance
+                for col, reason in (('open', 'OPEN_OUT_OF_RANGE'), ('close', 'CLOSE_OUT_OF_RANGE')):
+                    if col in prices:
+                        masks[reason] = (prices[col] < low - tolerance) | (prices[col] > high + tolerance)
+    if data_type == 'day' and {'pct_chg', 'close', 'pre_close'} <= set(df.columns):
+        close, pre_close, pct_chg = _values(df, 'close'), _values(df, 'pre_close'), _values(df, 'pct_chg')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            expected = (close / pre_close - 1) * 100
+            # 昨收缺失或不大于0、涨跌幅缺失时无法判断，不算违反
+            masks['PCT_CHG_MISMATCH'] = ((pre_close > 0) & ~np.isnan(pct_chg)
+                                         & (np.abs(pct_chg - expected) > Data01_config.QUALITY_PCT_CHG_TOLERANCE))
+    volume_columns = [col for col in ('vol', 'volume', 'amount') if col in df.columns]
+    if volume_columns:
+        with np.errstate(invalid='ignore'):
+            masks['NEGATIVE_VOLUME'] = np.logical_or.reduce([_values(df, col) < 0 for col in volume_columns])
+    return masks
+
+
+def check_frame(df, data_type):
+#     """
+#     检查一个DataFrame，返回 (合格的行, 不合格的行, 各原因的行数)。
+#     不合格的行附加 reasons 列（逗号分隔的原因代码）；一行可能违反多条规则，各原因分别计数。
+#     """
+    codes = np.zeros(len(df), dtype=np.int64)
+    counts = {}
+    for reason, mask in rule_masks(df, data_type).items():
+        bit = REASONS.index(reason)
+        codes |= mask.astype(np.int64) << bit
+        count = int(np.count_nonzero(mask))
+        if count:
+            counts[reason] = count
+    if not counts:
+        return df, df.iloc[:0], counts
+    bad = codes != 0
+    rejected = df[bad].copy()
+    rejected['reasons'] = [','.join(reason for bit, reason in enumerate(REASONS) if code >> bit & 1)
+                           for code in codes[bad]]
+    return df[~bad], rejected, counts
+
+
+class QualityGate:
+#    """
+#    一次导入运行的质量闸门（导入流水线在写库线程中使用）。
+#    check() 检查并过滤一个DataFrame，记下不合格的行；record() 把解析进程中已检查出的不合格行记入隔离表；
+#    finish() 把本次运行的汇总写入 quality_runs 并返回汇总dict。target 为目标数据库标识，只用于汇总记录。
+#    """
+    def __init__(self, target=None, db_path=None):
+        self.target = target
+        self.db_path = db_path or Data01_config.QUALITY_DB_PATH
+        self.run_id = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        self.started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.rows = 0
+        self.rejected = 0
+        self.by_reason = {}
+        self.files = set()        # 有不合格行的文件
+        self.seconds = 0.0        # 检查所用的时间（含解析进程中的检查）
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        if self.conn is None:
+            Data01_file_utils.ensure_dir(os.path.dirname(self.db_path))
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS quarantine (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id TEXT NOT NULL,
+                    file_path TEXT,
+                    data_type TEXT,
+                    stock_code TEXT,
+                    row_key TEXT,
+                    reasons TEXT,
+                    row_data TEXT,
+                    quarantined_at TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_quarantine_stock ON quarantine (stock_code, data_type);
+                CREATE TABLE IF NOT EXISTS quality_runs (
+                    run_id TEXT PRIMARY KEY,
+                    target TEXT,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    rows INTEGER,
+                    rejected INTEGER,
+                    files INTEGER,
+                    by_reason TEXT,
+                    seconds REAL
+                );
+            """)
+        return self.conn
+
+    def check(self, df, data_type, stock_code, file_path=None):
+        """检查并返回 (合格的行, 不合格的行数)，不合格的行记入隔离表"""
+        start = time.perf_counter()
+        clean, rejected, counts = check_frame(df, data_type)
+        self.record(len(df), rejected, counts, time.perf_counter() - start, data_type, stock_code, file_path)
+        return clean, len(rejected)
+
+    def record(self, rows, rejected, counts, seconds, data_type, stock_code, file_path=None):
+        """累计检查行数与耗时，不合格的行（check_frame 的结果）写入隔离表"""
+        Data01_metrics.observe('quality_check_seconds', seconds, data_type=data_type)
+        with self.lock:
+            self.rows += rows
+            self.seconds += seconds
+            if rejected is None or rejected.empty:
+                return
+            self.rejected += len(rejected)
+            for reason, count in counts.items():
+                self.by_reason[reason] = self.by_reason.get(reason, 0) + count
+            if file_path:
+                self.files.add(file_path)
+            key = 'trade_date' if data_type == 'day' else 'trade_time'
+            keys = rejected[key].astype(str).tolist() if key in rejected.columns else [None] * len(rejected)
+            data = rejected.drop(columns='reasons').to_json(orient='records', force_ascii=False, date_format='iso')
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            rows_to_insert = [(self.run_id, file_path, data_type, stock_code, row_key, reasons,
+                               json.dumps(row, ensure_ascii=False), now)
+                              for row_key, reasons, row in zip(keys, rejected['reasons'].tolist(), json.loads(data))]
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO quarantine (run_id, file_path, data_type, stock_code, row_key, reasons, row_data, "
+                    "quarantined_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows_to_insert)
+
+    def summary(self):
+        """本次运行的汇总：检查行数、隔离行数、涉及文件数、各原因的行数、检查耗时与速度"""
+        with self.lock:
+            return {
+                'run_id': self.run_id,
+                'rows': self.rows,
+                'rejected': self.rejected,
+                'files': len(self.files),
+                'by_reason': dict(sorted(self.by_reason.items(), key=lambda item: -item[1])),
+                'seconds': self.seconds,
+                'rows_per_sec': self.rows / self.seconds if self.seconds > 0 else 0.0,
+            }
+
+    def finish(self):
+        """写入本次运行的汇总并关闭隔离库，返回 summary()"""
+        summary = self.summary()
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO quality_runs (run_id, target, started_at, finished_at, rows, rejected, "
+                    "files, by_reason, seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (self.run_id, self.target, self.started_at, datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                     summary['rows'], summary['rejected'], summary['files'], json.dumps(summary['by_reason']),
+                     summary['seconds']))
+        finally:
+            self.close()
+        return summary
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def format_summary(summary):
+#     """汇总的一行文字说明，供界面与命令行输出"""
+    if not summary['rejected']:
+        return f"质量检查：{summary['rows']} 行全部通过"
+    reasons = '，'.join(f"{reason} {count}" for reason, count in summary['by_reason'].items())
+    return (f"质量检查：{summary['rows']} 行中隔离 {summary['rejected']} 行（{summary['files']} 个文件；{reasons}），"
+            f"详见 {Data01_config.QUALITY_DB_PATH} 的 quarantine 表")
@@ -0,0 +1,241 @@
+# """
+# 分钟线合成：导入分钟数据后，由1分钟K线合成 Data01_config.RESAMPLE_MINUTES 中各周期的K线，
+# 写入 stock_<代码>_min<周期>（合并表结构为 stock_min<周期>），列见 Data01_db_utils.RESAMPLED_COLUMNS：
+#   open / close   周期内第一根 / 最后一根分钟线的开盘价 / 收盘价
+#   high / low     周期内的最高价 / 最低价
+#   volume / amount  成交量 / 成交额之和
+#   vwap           成交量加权平均价 = 成交额 / 成交量（成交量为0时为空）
+#   bars           合成的分钟线根数（不足一个周期说明该K线尚未走完或有缺失）
+# K线按A股交易时段划分：上午 09:31-11:30、下午 13:01-15:00 各120分钟，周期须能整除120，
+# 因此K线不会跨越午休，也不会跨日；trade_time 为K线结束时间（如60分钟线为 10:30, 11:30, 14:00, 15:00）。
+# 09:30 的集合竞价成交并入第一根，15:00 之后的盘后成交并入最后一根。
+# 一只股票的分钟线按时间排序后，每个周期只需一次分组归约（numpy ufunc.reduceat）。
+# 增量合成：只读取已合成K线中最后一天及之后的分钟线（至多多读240行），只重写最后一根（可能尚未走完的）K线及之后的K线；
+# 新增周期从头合成，导入时历史分钟线被修订（append 模式退回upsert）则从修订数据最早的一天开始重新合成。
+# 用法：python Data01_resample.py [--rebuild] [--codes 000001 600000]
+# """
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import Data01_config
+import Data01_db_utils
+
+# 半个交易时段（上午或下午）的分钟数，以及全天的交易分钟数
+SESSION_MINUTES = 120
+DAY_MINUTES = 240
+# 上午 09:30、下午 13:00 距零点的分钟数（交易时段内第一根分钟线的结束时间减一分钟）
+MORNING_OPEN = 9 * 60 + 30
+AFTERNOON_OPEN = 13 * 60
+_NS_PER_MINUTE = 60 * 10 ** 9
+_NS_PER_DAY = 24 * 60 * _NS_PER_MINUTE
+_PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'amount']
+
+
+def check_minutes(minutes):
+#     """检查合成周期：须为能整除120的正整数，返回整数列表"""
+    minutes = [int(n) for n in minutes]
+    invalid = [n for n in minutes if n <= 0 or SESSION_MINUTES % n]
+    if invalid:
+        raise ValueError(f"K线周期须能整除{SESSION_MINUTES}分钟: {invalid}")
+    return minutes
+
+
+def session_ordinals(minute_of_day):
+#     """
+#     分钟线结束时间（距零点的分钟数）在当天交易时段中的序号 1..240：
+#     上午 09:31-11:30 为 1..120，下午 13:01-15:00 为 121..240。
+#     09:30 及之前并入1，午休中的分钟并入120，15:00 之后并入240。
+#     """
+    morning = minute_of_day - MORNING_OPEN
+    afternoon = minute_of_day - AFTERNOON_OPEN + SESSION_MINUTES
+    ordinal = np.where(morning <= SESSION_MINUTES, morning,
+                       np.where(afternoon <= SESSION_MINUTES, SESSION_MINUTES, afternoon))
+    return np.clip(ordinal, 1, DAY_MINUTES)
+
+
+def _ordinal_minute(ordinal):
+    # session_ordinals 的逆映射：交易时段序号 -> 距零点的分钟数
+    return np.where(ordinal <= SESSION_MINUTES, MORNING_OPEN + ordinal, AFTERNOON_OPEN + ordinal - SESSION_MINUTES)
+
+
+def _time_text(ns):
+    # int64 纳秒时间戳 -> 'YYYY-MM-DD HH:MM:SS'，与分钟表的 trade_time 文本一致
+    text = np.datetime_as_string(ns.astype('datetime64[ns]'), unit='s')
+    return np.char.replace(text, 'T', ' ')
+
+
+def resample_minutes(times, values, minutes):
+#     """
+#     把一只股票按时间升序的分钟线合成为各周期K线。
+#     参数:
+#         times: datetime64 数组，分钟线的结束时间
+#         values: dict，open/high/low/close/volume/amount 的 float64 数组（与 times 对齐，不含NaN价格）
+#         minutes: 周期列表
+#     返回:
+#         {周期: DataFrame(trade_time 文本, open, high, low, close, volume, amount, vwap, bars)}
+#     """
+    ns = np.asarray(times, dtype='datetime64[ns]').astype(np.int64)
+    day = ns - ns % _NS_PER_DAY
+    ordinal = session_ordinals((ns % _NS_PER_DAY) // _NS_PER_MINUTE)
+    count = len(ns)
+    result = {}
+    for n in minutes:
+        # 同一周期的分钟线有相同的结束时间标签；输入已排序，相同标签连续出现
+        label_ordinal = np.minimum((ordinal - 1) // n * n + n, DAY_MINUTES)
+        label = day + _ordinal_minute(label_ordinal) * _NS_PER_MINUTE
+        starts = np.flatnonzero(np.concatenate([[True], label[1:] != label[:-1]])) if count else np.empty(0, int)
+        ends = np.append(starts[1:], count)
+        volume = np.add.reduceat(values['volume'], starts) if count else np.empty(0)
+        amount = np.add.reduceat(values['amount'], starts) if count else np.empty(0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vwap = np.where(volume > 0, amount / volume, np.nan)
+        result[n] = pd.DataFrame({
+            'trade_time': _time_text(label[starts]),
+            'open': values['open'][starts],
+            'high': np.maximum.reduceat(values['high'], starts) if count else np.empty(0),
+            'low': np.minimum.reduceat(values['low'], starts) if count else np.empty(0),
+            'close': values['close'][ends - 1],
+            'volume': volume,
+            'amount': amount,
+            'vwap': vwap,
+            'bars': ends - starts,
+        })
+    return result
+
+
+def _day_start(value):
+    # 时间（文本或 datetime）所在日的零点，文本形式
+    return f"{str(value)[:10]} 00:00:00"
+
+
+def update_resampled(conn, stock_code, df=None, since=None, full=False, minutes=None, commit=True):
+#     """
+#     导入分钟数据后更新一只股票的合成K线（由 Data01_db_utils.import_min_data 调用）。
+#     参数:
+#         stock_code: 分表结构下为表名中的6位代码
+#         df: 刚导入的分钟数据，提供 ts_code（可选）
+#         since: 从该时间所在的一天开始重新合成（历史分钟线被修订时）
+#         full: True 时全部重新合成
+#         minutes: 周期列表，默认 Data01_config.RESAMPLE_MINUTES
+#         commit: False 时写入调用方的事务而不提交
+#     返回:
+#         dict，包含 tables, rows（写入K线数）, minutes（读取的分钟线行数）, seconds
+#     """
+    start = time.perf_counter()
+    minutes = check_minutes(Data01_config.RESAMPLE_MINUTES if minutes is None else minutes)
+    ph = '?' if Data01_config.DB_TYPE == "sqlite" else '%s'
+    ts_code = stock_code
+    if df is not None and 'ts_code' in df.columns and df['ts_code'].notna().any():
+        ts_code = df['ts_code'].dropna().iloc[0]
+    if Data01_config.DB_SCHEMA == "consolidated":
+        source = Data01_db_utils.CONSOLIDATED_MIN_TABLE
+        cond, params = f"ts_code = {ph}", (ts_code,)
+    else:
+        source = f"stock_{stock_code}_min"
+        cond, params = None, ()
+    cursor = conn.cursor()
+
+    # 各周期已合成的最后一根K线可能尚未走完：从它所在的一天开始读分钟线，写入从它开始的K线；
+    # 没有K线（新增周期）为None，即从头合成
+    tables = {}
+    keep = {}
+    for n in minutes:
+        tables[n] = Data01_db_utils.create_resampled_table_if_not_exists(conn, stock_code, n, commit)
+        last = None
+        if not full:
+            cursor.execute(f"SELECT MAX(trade_time) FROM {tables[n]}{f' WHERE {cond}' if cond else ''}", params)
+            last = cursor.fetchone()[0]
+        keep[n] = None if last is None else Data01_db_utils._key_text(last)
+        if since is not None and keep[n] is not None:
+            keep[n] = min(keep[n], _day_start(since))
+    begin = None if any(value is None for value in keep.values()) else _day_start(min(keep.values()))
+
+    conditions = [c for c in (cond, None if begin is None else f"trade_time >= {ph}") if c]
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    cursor.execute(f"SELECT trade_time, {', '.join(_PRICE_COLUMNS)}, ts_code FROM {source}{where} "
+                   f"ORDER BY trade_time", (*params, *(() if begin is None else (begin,))))
+    bars = pd.DataFrame.from_records(cursor.fetchall(), columns=['trade_time', *_PRICE_COLUMNS, 'ts_code'])
+    for col in _PRICE_COLUMNS:
+        bars[col] = pd.to_numeric(bars[col], errors='coerce').astype(np.float64)
+    bars = bars.dropna(subset=['open', 'high', 'low', 'close'])
+    if bars.empty:
+        return {'tables': list(tables.values()), 'rows': 0, 'minutes': 0, 'seconds': time.perf_counter() - start}
+    if bars['ts_code'].notna().any():
+        ts_code = bars['ts_code'].dropna().iloc[-1]
+
+    # SQLite 中为文本，MySQL 中为 DATETIME
+    if isinstance(bars['trade_time'].iloc[0], str):
+        times = pd.to_datetime(bars['trade_time'], format='%Y-%m-%d %H:%M:%S').to_numpy()
+    else:
+        times = pd.to_datetime(bars['trade_time']).to_numpy()
+    values = {col: bars[col].to_numpy() for col in _PRICE_COLUMNS}
+    values['volume'] = np.nan_to_num(values['volume'])
+    values['amount'] = np.nan_to_num(values['amount'])
+
+    # 各周期在同一个事务中写入
+    rows = 0
+    try:
+        for n, frame in resample_minutes(times, values, minutes).items():
+            if keep[n] is not None:
+                frame = frame[frame['trade_time'] >= keep[n]]
+            stats = Data01_db_utils.upsert_dataframe(conn, tables[n], frame.assign(ts_code=ts_code),
+                                                     Data01_db_utils.RESAMPLED_COLUMNS, commit=False)
+            rows += stats['rows']
+        if commit:
+            conn.commit()
+    except Exception:
+        if commit:
+            conn.rollback()
+        raise
+    for n in minutes:
+        Data01_db_utils.notify_write(stock_code, f"min{n}")
+    return {'tables': list(tables.values()), 'rows': rows, 'minutes': len(bars),
+            'seconds': time.perf_counter() - start}
+
+
+def stored_codes(conn):
+#     """数据库中有分钟数据的全部股票（分表结构为6位代码，合并表为 ts_code）"""
+    if Data01_config.DB_SCHEMA == "consolidated":
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT DISTINCT ts_code FROM {Data01_db_utils.CONSOLIDATED_MIN_TABLE}")
+        return sorted(row[0] for row in cursor.fetchall())
+    return [table.split('_')[1] for table in Data01_db_utils.list_per_stock_tables(conn, 'min')]
+
+
+def resample_all(conn, codes=None, rebuild=False, progress=None):
+#     """
+#     为多只股票补齐合成K线（已有数据库首次启用或修改周期后使用），每只股票提交一次。
+#     codes 默认为数据库中的全部股票；rebuild=True 时全部重新合成。
+#     progress: 回调 progress(已完成股票数, 总股票数)
+#     返回 {'stocks', 'rows', 'seconds'}
+#     """
+    start = time.perf_counter()
+    codes = list(codes) if codes is not None else stored_codes(conn)
+    rows = 0
+    for i, code in enumerate(codes):
+        rows += update_resampled(conn, code, full=rebuild)['rows']
+        if progress:
+            progress(i + 1, len(codes))
+    return {'stocks': len(codes), 'rows': rows, 'seconds': time.perf_counter() - start}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="由分钟线合成多周期K线并写入数据库")
+    parser.add_argument("--codes", nargs="*", help="只合成这些股票（默认数据库中的全部股票）")
+    parser.add_argument("--rebuild", action="store_true", help="忽略已合成的K线，全部重新合成")
+    args = parser.parse_args(argv)
+    conn = Data01_db_utils.get_db_connection()
+    try:
+        stats = resample_all(conn, args.codes, rebuild=args.rebuild)
+    finally:
+        conn.close()
+    print(f"股票 {stats['stocks']} 只，写入 {stats['rows']} 根K线，用时 {stats['seconds']:.2f} 秒")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
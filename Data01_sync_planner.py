@@ -0,0 +1,297 @@
+# """
+# 增量同步规划模块：在下载前计算每只股票真正缺失的日期区间。
+# 覆盖范围来源：
+#   log  - 下载覆盖清单（Data01_file_utils.DownloadManifest）中实际下载到的日期区间
+#   db   - 数据库中 stock_<代码>_day/_min 表的 MIN/MAX 日期
+#   both - 两者任一覆盖即视为已覆盖
+# 同时合并清单中同一股票重复或重叠的行，完全覆盖的股票直接跳过。
+# 请求的结束日期先截到最近收盘的交易日：清单中的结束日期常在未来，尚无数据的日期不算缺失，
+# 也不会因为下载过一次就被当作已覆盖；缺失区间全部是周末时同样不下载。
+# 计划中的 delta 列标记增量区间（股票已有部分覆盖，或被拆成多个区间）：下载时写入带区间的文件名，
+# 不覆盖该股票完整区间的数据文件（见 Data01_download_engine.build_tasks）。
+# choose_fetch_mode 再为日线区间选择获取方式：逐股票 pro.daily(ts_code=...)
+# 或逐交易日全市场 pro.daily(trade_date=...)，使接口调用次数最少。
+# """
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import Data01_config
+import Data01_tushare_utils
+
+STOCK_LIST_COLUMNS = ['stock_code', 'start_date', 'end_date', 'data_type']
+# plan_downloads 返回的计划在清单列之后附加 delta 列
+PLAN_COLUMNS = STOCK_LIST_COLUMNS + ['delta']
+
+# 一条 UNION ALL 查询最多包含的表数量（SQLite 复合查询上限为500）
+_UNION_BATCH = 200
+
+
+def _to_date(value):
+    return datetime.strptime(str(value)[:8], '%Y%m%d').date()
+
+
+def _to_str(day):
+    return day.strftime('%Y%m%d')
+
+
+def _normalize_date(value):
+    """把 '2023-08-25 09:31:00'、'20230825'、20230825 统一为 'YYYYMMDD'"""
+    digits = re.sub(r'\D', '', str(value))
+    return digits[:8] if len(digits) >= 8 else None
+
+
+def merge_ranges(ranges):
+    """合并重叠或相邻（相差一天）的日期区间，ranges 为 [(start, end), ...] 的YYYYMMDD字符串"""
+    intervals = sorted((_to_date(s), _to_date(e)) for s, e in ranges if s and e and s <= e)
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(_to_str(s), _to_str(e)) for s, e in merged]
+
+
+def subtract_ranges(start_date, end_date, covered):
+    """返回 [start_date, end_date] 中未被 covered 区间覆盖的子区间列表"""
+    missing = []
+    cursor = _to_date(start_date)
+    end = _to_date(end_date)
+    for cov_start, cov_end in merge_ranges(covered):
+        cov_start, cov_end = _to_date(cov_start), _to_date(cov_end)
+        if cov_end < cursor:
+            continue
+        if cov_start > end:
+            break
+        if cov_start > cursor:
+            missing.append((_to_str(cursor), _to_str(cov_start - timedelta(days=1))))
+        cursor = max(cursor, cov_end + timedelta(days=1))
+        if cursor > end:
+            break
+    if cursor <= end:
+        missing.append((_to_str(cursor), _to_str(end)))
+    return missing
+
+
+def _has_weekday(start_date, end_date):
+    # 区间内是否有工作日（周末没有行情，只含周末的缺失区间不必下载）
+    start, end = _to_date(start_date), _to_date(end_date)
+    return (end - start).days >= 7 or any(
+        (start + timedelta(days=offset)).weekday() < 5 for offset in range((end - start).days + 1))
+
+
+def _table_code(stock_code):
+    """与Form2一致：从股票代码中取6位数字作为表名的一部分"""
+    match = re.search(r'(\d{6})', str(stock_code))
+    return match.group(1) if match else None
+
+
+def _table_and_key(data_type):
+    if data_type == '日数据':
+        return 'day', 'trade_date'
+    return 'min', 'trade_time'
+
+
+def _existing_tables(conn):
+    cursor = conn.cursor()
+    if Data01_config.DB_TYPE == "sqlite":
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    else:  # mysql
+        cursor.execute("SHOW TABLES")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _load_consolidated_coverage(conn, stock_codes, suffix, key):
+    # 合并表：一条 GROUP BY 查询得到全部股票的覆盖范围
+    table = f"stock_{suffix}"
+    if table not in _existing_tables(conn):
+        return {}
+    wanted = set(stock_codes)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT ts_code, MIN({key}), MAX({key}) FROM {table} GROUP BY ts_code")
+    coverage = {}
+    for ts_code, min_value, max_value in cursor.fetchall():
+        start, end = _normalize_date(min_value), _normalize_date(max_value)
+        if ts_code in wanted and start and end:
+            coverage[ts_code] = [(start, end)]
+    return coverage
+
+
+def load_db_coverage(conn, stock_codes, data_type):
+    """
+    查询数据库中各股票表的 MIN/MAX 日期，返回 {stock_code: [(start, end)]}。
+    多张表合并为 UNION ALL 批量查询，避免每只股票一次往返。
+    """
+    suffix, key = _table_and_key(data_type)
+    if Data01_config.DB_SCHEMA == "consolidated":
+        return _load_consolidated_coverage(conn, stock_codes, suffix, key)
+    existing = _existing_tables(conn)
+    table_to_codes = {}
+    for code in stock_codes:
+        table = f"stock_{_table_code(code)}_{suffix}"
+        if table in existing:
+            table_to_codes.setdefault(table, []).append(code)
+
+    coverage = {}
+    tables = list(table_to_codes)
+    cursor = conn.cursor()
+    for i in range(0, len(tables), _UNION_BATCH):
+        batch = tables[i:i + _UNION_BATCH]
+        sql = " UNION ALL ".join(
+            f"SELECT '{table}', MIN({key}), MAX({key}) FROM {table}" for table in batch)
+        cursor.execute(sql)
+        for table, min_value, max_value in cursor.fetchall():
+            start, end = _normalize_date(min_value), _normalize_date(max_value)
+            if start and end:
+                for code in table_to_codes[table]:
+                    coverage.setdefault(code, []).append((start, end))
+    return coverage
+
+
+def plan_downloads(stock_list_df, source="both", conn=None, manifest=None, last_closed=None):
+    """
+    生成增量下载计划。
+    参数:
+        stock_list_df: read_stock_list 返回的清单
+        source: 'log'、'db' 或 'both'
+        conn: 数据库连接，source含db时使用；为None时自动用 get_db_connection 打开
+        manifest: 下载覆盖清单，source含log时使用；为None时自动打开
+        last_closed: 请求结束日期的上限 YYYYMMDD，默认 Data01_tushare_utils.last_closed_trade_date()
+    返回:
+        (plan_df, summary)
+        plan_df 为清单各列加 delta 列，每行是一个需要下载的缺失区间；
+        delta 为False表示该行就是这只股票请求的完整区间（唯一一行），True表示只是其中一部分；
+        summary 包含 requested/merged/skipped/partial/ranges 计数
+    """
+    # 合并同一股票、同一数据类型的重复/重叠行；结束日期截到最近收盘的交易日，起始日期在此之后的行没有可下载的数据
+    last_closed = last_closed or Data01_tushare_utils.last_closed_trade_date()
+    requests = {}
+    for row in stock_list_df.itertuples(index=False):
+        ranges = requests.setdefault((row.stock_code, row.data_type), [])
+        start_date, end_date = str(row.start_date), min(str(row.end_date), last_closed)
+        if start_date <= end_date:
+            ranges.append((start_date, end_date))
+
+    own_conn = False
+    if source in ("db", "both") and conn is None:
+        import Data01_db_utils
+        conn = Data01_db_utils.get_db_connection()
+        own_conn = True
+    own_manifest = False
+    if source in ("log", "both") and manifest is None:
+        import Data01_file_utils
+        manifest = Data01_file_utils.DownloadManifest()
+        own_manifest = True
+
+    try:
+        coverage = {}
+        for data_type in {data_type for _, data_type in requests}:
+            codes = [code for code, dtype in requests if dtype == data_type]
+            per_type = {}
+            if source in ("log", "both"):
+                for code, ranges in manifest.coverage(data_type).items():
+                    per_type.setdefault(code, []).extend(ranges)
+            if source in ("db", "both"):
+                for code, ranges in load_db_coverage(conn, codes, data_type).items():
+                    per_type.setdefault(code, []).extend(ranges)
+            coverage[data_type] = per_type
+    finally:
+        if own_conn:
+            conn.close()
+        if own_manifest:
+            manifest.close()
+
+    rows = []
+    skipped = 0
+    partial = 0
+    merged_count = 0
+    for (code, data_type), ranges in requests.items():
+        wanted = merge_ranges(ranges)
+        merged_count += len(wanted)
+        covered = coverage.get(data_type, {}).get(code, [])
+        missing = []
+        for start, end in wanted:
+            missing.extend(gap for gap in subtract_ranges(start, end, covered) if _has_weekday(*gap))
+        if not missing:
+            skipped += 1
+            continue
+        if missing != wanted:
+            partial += 1
+        delta = missing != wanted or len(missing) > 1
+        for start, end in missing:
+            rows.append([code, start, end, data_type, delta])
+
+    plan_df = pd.DataFrame(rows, columns=PLAN_COLUMNS)
+    summary = {
+        'requested': len(stock_list_df),
+        'merged': merged_count,
+        'skipped': skipped,
+        'partial': partial,
+        'ranges': len(plan_df),
+    }
+    return plan_df, summary
+
+
+def choose_fetch_mode(plan_df, trade_dates, mode="auto"):
+    """
+    为下载计划中的日线区间选择获取方式。
+    逐股票：每个区间一次调用；按交易日：每个交易日一次调用，覆盖当天全部股票。
+    auto 时按区间长度（交易日数）从短到长依次改为按交易日获取，取总调用次数最少的划分：
+    许多股票×少量天数（日常更新）几乎全部按交易日，少量股票×多年历史保持逐股票。
+    参数:
+        plan_df: plan_downloads 返回的计划（分钟数据行总是逐股票）
+        trade_dates: 覆盖计划日期范围的开市日列表 'YYYYMMDD'
+        mode: 'auto'、'per_stock' 或 'by_date'
+    返回:
+        (by_date, summary)
+        by_date 为与 plan_df 行对齐的布尔数组，True 表示该区间按交易日获取；
+        summary 包含 per_stock_calls/by_date_calls/calls/baseline_calls 计数
+    """
+    if mode not in ("auto", "per_stock", "by_date"):
+        raise ValueError(f"未知的获取方式: {mode}")
+    calendar = np.array(sorted(trade_dates), dtype=object)
+    is_daily = (plan_df['data_type'] == '日数据').to_numpy()
+    starts = plan_df['start_date'].astype(str).to_numpy()
+    ends = plan_df['end_date'].astype(str).to_numpy()
+    lo = np.searchsorted(calendar, starts, side='left')
+    hi = np.searchsorted(calendar, ends, side='right')
+    lengths = np.where(is_daily, hi - lo, 0)
+
+    daily_rows = np.flatnonzero(is_daily)
+    by_date = np.zeros(len(plan_df), dtype=bool)
+    if mode == "by_date":
+        by_date[daily_rows] = True
+    elif mode == "auto" and len(daily_rows):
+        # 按区间长度升序逐个加入“按交易日”集合，维护所需交易日的并集
+        order = daily_rows[np.argsort(lengths[daily_rows], kind='stable')]
+        covered = np.zeros(len(calendar), dtype=bool)
+        union = 0
+        best_cost, best_count = len(daily_rows), 0
+        for count, row in enumerate(order, start=1):
+            window = covered[lo[row]:hi[row]]
+            union += int(len(window) - window.sum())
+            window[:] = True
+            # 区间长度相同的行必须一起决定，否则划分依赖排序的偶然顺序
+            if count < len(order) and lengths[order[count]] == lengths[row]:
+                continue
+            cost = (len(daily_rows) - count) + union
+            if cost < best_cost:
+                best_cost, best_count = cost, count
+        by_date[order[:best_count]] = True
+
+    dates = set()
+    for row in np.flatnonzero(by_date):
+        dates.update(calendar[lo[row]:hi[row]])
+    per_stock_calls = int(len(plan_df) - by_date.sum())
+    summary = {
+        'per_stock_calls': per_stock_calls,
+        'by_date_ranges': int(by_date.sum()),
+        'by_date_calls': len(dates),
+        'calls': per_stock_calls + len(dates),
+        'baseline_calls': len(plan_df),
+    }
+    return by_date, summary
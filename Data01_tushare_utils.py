@@ -1,21 +1,247 @@
 # """
 # tushare数据下载工具模块，封装下载函数。
-# 需要安装tushare包。
+# 需要安装tushare包（在 init_tushare 中导入，离线使用 FakePro 时无需安装）。
 # """
-import tushare as ts
+import os
+import json
+import zlib
+import pickle
+import sqlite3
+import threading
 import pandas as pd
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
+import Data01_config
+import Data01_file_utils
+import Data01_metrics
+
+class RateLimitError(Exception):
+#    """tushare接口访问频率超限（每分钟调用次数超过积分允许的上限）"""
+    pass
+
+# tushare频率超限时返回的错误信息中包含的关键字
+_RATE_LIMIT_KEYWORDS = ('每分钟最多访问', '访问频率', '频次', 'rate limit', 'too many requests')
+
+def is_rate_limit_error(exc):
+#    """判断异常是否为接口频率超限"""
+    if isinstance(exc, RateLimitError):
+        return True
+    message = str(exc).lower()
+    return any(keyword.lower() in message for keyword in _RATE_LIMIT_KEYWORDS)
+
+class DownloadCancelled(Exception):
+#    """下载被取消（由调用方的 before_call 钩子抛出）"""
+    pass
+
+def endpoint_for(data_type):
+#    """返回某数据类型实际调用的tushare接口名，用于按接口限流"""
+    return 'stk_mins' if data_type == '分钟数据' else 'daily'
+
+# 各分钟周期每个交易日的K线根数上限（多算一根，兼容包含09:30开盘集合竞价的返回）
+_BARS_PER_DAY = {'1min': 241, '5min': 49, '15min': 17, '30min': 9, '60min': 5}
+
+def minute_windows(start_date, end_date, freq=None, row_limit=None):
+#    """
+#    把 [start_date, end_date]（YYYYMMDD）切分为单次请求不超过 row_limit 行的时间窗口，
+#    返回 [('YYYY-MM-DD 00:00:00', 'YYYY-MM-DD 23:59:59'), ...]，按时间升序。
+#    按工作日计算（不扣除节假日），估计偏保守，窗口之间不重叠。
+#    """
+    freq = freq or Data01_config.MIN_FREQ
+    row_limit = row_limit or Data01_config.MIN_ROW_LIMIT
+    if freq not in _BARS_PER_DAY:
+        raise ValueError(f"不支持的分钟周期: {freq}")
+    days_per_window = max(1, row_limit // _BARS_PER_DAY[freq])
+    days = pd.bdate_range(pd.to_datetime(str(start_date), format='%Y%m%d'),
+                          pd.to_datetime(str(end_date), format='%Y%m%d'))
+    windows = []
+    for i in range(0, len(days), days_per_window):
+        chunk = days[i:i + days_per_window]
+        windows.append((chunk[0].strftime('%Y-%m-%d 00:00:00'), chunk[-1].strftime('%Y-%m-%d 23:59:59')))
+    return windows
+
+def split_minute_window(start_time, end_time):
+#    """把窗口按日期对半拆分（返回结果被截断时使用）；只有一天时无法拆分，返回None"""
+    days = pd.bdate_range(pd.Timestamp(start_time).normalize(), pd.Timestamp(end_time).normalize())
+    if len(days) < 2:
+        return None
+    mid = len(days) // 2
+    return [(start_time, days[mid - 1].strftime('%Y-%m-%d 23:59:59')),
+            (days[mid].strftime('%Y-%m-%d 00:00:00'), end_time)]
+
+def last_closed_trade_date(now=None):
+#    """
+#    最近一个已收盘的交易日（YYYYMMDD）：工作日15:30以后为当天，否则为上一个工作日。
+#    不考虑节假日——节假日没有新数据，按工作日计算只会更保守。
+#    """
+    now = now or datetime.now()
+    day = now.date()
+    if now.weekday() >= 5 or (now.hour, now.minute) < (15, 30):
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day.strftime('%Y%m%d')
+
+class ResponseCache:
+#    """
+#    tushare接口响应的磁盘缓存（SQLite文件，DataFrame以 pickle+zlib 压缩存储）。
+#    键为规范化后的请求（接口名 + 排序后的参数）。
+#    结束日期早于最近已收盘交易日的请求永不过期；包含当天的请求只缓存 ttl_seconds 秒。
+#    总大小超过 max_bytes 时按最近访问时间淘汰（LRU）。
+#    """
+    def __init__(self, path=None, max_bytes=None, ttl_seconds=None):
+        self.path = path or Data01_config.RESPONSE_CACHE_PATH
+        self.max_bytes = max_bytes or Data01_config.RESPONSE_CACHE_MAX_MB * 1024 * 1024
+        self.ttl_seconds = Data01_config.RESPONSE_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        Data01_file_utils.ensure_dir(os.path.dirname(self.path))
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT,
+                payload BLOB,
+                nbytes INTEGER,
+                expires REAL,
+                last_access REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses (last_access)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(endpoint, params):
+        """规范化请求：去掉None参数，按参数名排序"""
+        normalized = {k: str(v) for k, v in params.items() if v is not None}
+        return endpoint + ':' + json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+
+    def _expires(self, params, now):
+        end = params.get('end_date') or params.get('trade_date')
+        if end:
+            end = ''.join(ch for ch in str(end) if ch.isdigit())[:8]
+            if end < last_closed_trade_date():
+                return None
+        return now + self.ttl_seconds
+
+    def get(self, endpoint, params):
+        """命中返回DataFrame，未命中或已过期返回None"""
+        key = self.make_key(endpoint, params)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT payload, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+        return pickle.loads(zlib.decompress(row[0]))
+
+    def put(self, endpoint, params, df):
+        key = self.make_key(endpoint, params)
+        payload = zlib.compress(pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL))
+        if len(payload) > self.max_bytes:
+            return
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT nbytes FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, payload, nbytes, expires, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, payload, len(payload), self._expires(params, now), now))
+            self.total_bytes += len(payload) - (old[0] if old else 0)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        # 超过上限时删除最久未访问的条目
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT key, nbytes FROM responses ORDER BY last_access LIMIT 64").fetchall()
+            if not rows:
+                break
+            for key, nbytes in rows:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= nbytes
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def stats(self):
+        """命中/未命中次数与占用字节数"""
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': self.total_bytes}
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+            self.total_bytes = 0
+
+    def close(self):
+        self.conn.close()
+
+_RESPONSE_CACHE = None
+_RESPONSE_CACHE_LOCK = threading.Lock()
+
+def get_response_cache():
+#    """返回全局响应缓存；Data01_config.RESPONSE_CACHE_ENABLED 为False时返回None"""
+    global _RESPONSE_CACHE
+    if not Data01_config.RESPONSE_CACHE_ENABLED:
+        return None
+    with _RESPONSE_CACHE_LOCK:
+        if _RESPONSE_CACHE is None:
+            _RESPONSE_CACHE = ResponseCache()
+        return _RESPONSE_CACHE
+
+def call_api(pro, endpoint, cache=None, before_call=None, **params):
+#    """
+#    通过缓存调用tushare接口：命中则直接返回，否则调用 pro.<endpoint>(**params) 并写入缓存。
+#    before_call 在真正发起网络请求前调用（如限流取令牌），缓存命中时不会调用。
+#    """
+    if cache is not None:
+        df = cache.get(endpoint, params)
+        if df is not None:
+            Data01_metrics.inc('api_cache_hits_total', endpoint=endpoint)
+            return df
+    if before_call is not None:
+        before_call()
+    # 按接口记录请求次数（成功 / 频率超限 / 其他错误）与网络请求用时
+    start = time.perf_counter()
+    try:
+        df = getattr(pro, endpoint)(**params)
+    except Exception as e:
+        status = 'rate_limited' if is_rate_limit_error(e) else 'error'
+        Data01_metrics.inc('api_requests_total', endpoint=endpoint, status=status)
+        raise
+    finally:
+        Data01_metrics.observe('api_request_seconds', time.perf_counter() - start, endpoint=endpoint)
+    Data01_metrics.inc('api_requests_total', endpoint=endpoint, status='ok')
+    if cache is not None and df is not None:
+        cache.put(endpoint, params, df)
+    return df
+
+def _resolve_cache(cache):
+    # None 使用全局缓存，False 不使用缓存
+    if cache is None:
+        return get_response_cache()
+    if cache is False:
+        return None
+    return cache
 
 def init_tushare(token):
 #    """初始化tushare，设置token"""
+    import tushare as ts
     ts.set_token(token)
     pro = ts.pro_api()
     return pro
 
 
 
-def download_stock_data(pro, stock_code, start_date, end_date, data_type):
+def download_stock_data(pro, stock_code, start_date, end_date, data_type, raise_rate_limit=False,
+                        cache=None, before_call=None, raise_errors=False):
 #     """
 #     下载单只股票数据。
 #     参数:
@@ -24,32 +250,37 @@ def download_stock_data(pro, stock_code, start_date, end_date, data_type):
 #         start_date: 起始日期，格式 'YYYYMMDD'
 #         end_date: 结束日期，格式 'YYYYMMDD'
 #         data_type: '日数据' 或 '分钟数据'
+#         raise_rate_limit: 为True时遇到频率超限抛出 RateLimitError，由调用方退避重试
+#         cache: 响应缓存，默认使用 get_response_cache()；传 False 不使用缓存
+#         before_call: 真正请求接口前调用的钩子（缓存命中时不调用），可抛出 DownloadCancelled
+#         raise_errors: 为True时其他错误（网络、超时、权限等）也抛出原异常，由调用方记录原因并重试
 #     返回:
-#         DataFrame，下载的数据，失败返回None
+#         DataFrame，下载的数据；没有数据时返回None，失败时（raise_errors 为False）同样返回None
 #     """
+    cache = _resolve_cache(cache)
     try:
         if data_type == '日数据':
             # 日线行情接口：daily
-            df = pro.daily(ts_code=stock_code, start_date=start_date, end_date=end_date)
+            df = call_api(pro, 'daily', cache, before_call,
+                          ts_code=stock_code, start_date=start_date, end_date=end_date)
         elif data_type == '分钟数据':
-            # 分钟数据接口：可以使用 pro.daily 的 freq 参数，或者使用其他接口如 pro.stk_mins
-            # 这里假设使用pro.stk_mins，需要确认tushare版本
-            # 注意：分钟数据可能需要不同权限，此处简化，使用pro.daily并添加频率参数
-            # 实际上tushare分钟数据需要调用其他接口，如pro.mins（可能收费）
-            # 为示例，我们使用pro.daily作为替代，并标记为分钟数据。
-            # 实际应用中请根据tushare文档调整。
-            # 为了演示，我们模拟下载分钟数据，实际请替换为正确的接口。
-            # 这里假设下载5分钟线，使用 pro.stk_mins(ts_code=stock_code, start_date=start_date, end_date=end_date, freq='5min')
-            # 但由于权限问题，可能无法使用。这里我们用一个占位。
-            # 我们暂时使用daily接口并添加一列模拟，实际开发需要根据需求修改。
-            # 为代码完整，我们调用一个假设的接口，但注释说明需要调整。
-            # 下面代码仅作示意，实际请根据tushare最新文档。
-            # 由于tushare分钟数据需要积分，这里我们使用一个模拟函数。
-            # 为了演示，我们仍然调用daily，并认为它是分钟数据。
-            # 注意：实际使用时请用正确的分钟数据接口。
-            print(f"警告：分钟数据下载使用了模拟实现，实际请替换为正确接口")
-            df = pro.daily(ts_code=stock_code, start_date=start_date, end_date=end_date)
-            # 或者调用 pro.mins 等
+            # 分钟数据接口 stk_mins 单次返回行数有上限：按窗口依次获取，返回被截断时拆分窗口重取
+            row_limit = Data01_config.MIN_ROW_LIMIT
+            windows = minute_windows(start_date, end_date)[::-1]
+            frames = []
+            while windows:
+                window = windows.pop()
+                part = download_minute_window(pro, stock_code, *window, raise_rate_limit=raise_rate_limit,
+                                              cache=cache or False, before_call=before_call,
+                                              raise_errors=raise_errors)
+                if part is None:
+                    return None
+                halves = split_minute_window(*window) if len(part) >= row_limit else None
+                if halves:
+                    windows.extend(halves[::-1])
+                    continue
+                frames.append(part)
+            df = merge_minute_frames(frames)
         else:
             raise ValueError(f"未知数据类型: {data_type}")
         
@@ -64,11 +295,137 @@ def download_stock_data(pro, stock_code, start_date, end_date, data_type):
         else:
             print(f"未下载到数据: {stock_code} {start_date}-{end_date}")
             return None
+    except DownloadCancelled:
+        raise
     except Exception as e:
+        if raise_rate_limit and is_rate_limit_error(e):
+            raise RateLimitError(str(e)) from e
+        if raise_errors:
+            raise
         print(f"下载股票 {stock_code} 数据失败: {e}")
         return None
 
+def get_trade_dates(pro, start_date, end_date, raise_rate_limit=False, cache=None, before_call=None):
+#     """
+#     查询交易日历（trade_cal接口，上交所），返回 [start_date, end_date] 内升序的开市日 'YYYYMMDD' 列表。
+#     失败时抛出异常——没有日历无法规划按交易日下载。
+#     """
+    cache = _resolve_cache(cache)
+    try:
+        df = call_api(pro, 'trade_cal', cache, before_call,
+                      exchange='SSE', start_date=start_date, end_date=end_date, is_open='1')
+    except DownloadCancelled:
+        raise
+    except Exception as e:
+        if raise_rate_limit and is_rate_limit_error(e):
+            raise RateLimitError(str(e)) from e
+        raise
+    if df is None or df.empty:
+        return []
+    if 'is_open' in df.columns:
+        df = df[df['is_open'].astype(int) == 1]
+    return sorted(df['cal_date'].astype(str))
+
+def download_market_daily(pro, trade_date, raise_rate_limit=False, cache=None, before_call=None,
+                          raise_errors=False):
+#     """
+#     按交易日下载全市场日线：一次 pro.daily(trade_date=...) 返回当天所有股票。
+#     返回 DataFrame（当天无数据时为空表），失败返回None（raise_errors 为True时抛出原异常）。
+#     """
+    cache = _resolve_cache(cache)
+    try:
+        df = call_api(pro, 'daily', cache, before_call, trade_date=trade_date)
+    except DownloadCancelled:
+        raise
+    except Exception as e:
+        if raise_rate_limit and is_rate_limit_error(e):
+            raise RateLimitError(str(e)) from e
+        if raise_errors:
+            raise
+        print(f"下载 {trade_date} 全市场日线失败: {e}")
+        return None
+    if df is None:
+        return pd.DataFrame()
+    if 'trade_date' in df.columns:
+        df['trade_date'] = df['trade_date'].astype(str)
+    return df
+
+def download_adj_factor(pro, stock_code=None, start_date=None, end_date=None, trade_date=None,
+                        raise_rate_limit=False, cache=None, before_call=None, raise_errors=False):
+#     """
+#     下载复权因子（adj_factor接口）：指定 stock_code 时取该股票区间内的因子，指定 trade_date 时取当天全市场。
+#     返回 DataFrame（ts_code, trade_date, adj_factor），失败返回None（raise_errors 为True时抛出原异常）。
+#     """
+    cache = _resolve_cache(cache)
+    params = {'trade_date': trade_date} if trade_date else {
+        'ts_code': stock_code, 'start_date': start_date, 'end_date': end_date}
+    try:
+        df = call_api(pro, 'adj_factor', cache, before_call, **params)
+    except DownloadCancelled:
+        raise
+    except Exception as e:
+        if raise_rate_limit and is_rate_limit_error(e):
+            raise RateLimitError(str(e)) from e
+        if raise_errors:
+            raise
+        print(f"下载复权因子失败: {stock_code or trade_date} {e}")
+        return None
+    if df is None:
+        return pd.DataFrame(columns=['ts_code', 'trade_date', 'adj_factor'])
+    if 'trade_date' in df.columns:
+        df['trade_date'] = df['trade_date'].astype(str)
+    return df
+
+def merge_adj_factor(df, factors):
+#     """把复权因子按 (ts_code, trade_date) 合并为日线数据的 adj_factor 列，没有因子的行为空值"""
+    if df is None or df.empty or factors is None or factors.empty:
+        return df
+    df = df.drop(columns='adj_factor', errors='ignore')
+    factors = factors[['ts_code', 'trade_date', 'adj_factor']].drop_duplicates(['ts_code', 'trade_date'])
+    return df.merge(factors, on=['ts_code', 'trade_date'], how='left')
+
+def download_minute_window(pro, stock_code, start_time, end_time, freq=None, raise_rate_limit=False,
+                           cache=None, before_call=None, raise_errors=False):
+#     """
+#     下载一个时间窗口的分钟数据（stk_mins接口）。
+#     返回按 trade_time 升序的 DataFrame，vol 改名为 volume 与分钟表一致；窗口内无数据时为空表，
+#     失败返回None（raise_errors 为True时抛出原异常）。
+#     """
+    cache = _resolve_cache(cache)
+    try:
+        df = call_api(pro, 'stk_mins', cache, before_call, ts_code=stock_code,
+                      freq=freq or Data01_config.MIN_FREQ, start_date=start_time, end_date=end_time)
+    except DownloadCancelled:
+        raise
+    except Exception as e:
+        if raise_rate_limit and is_rate_limit_error(e):
+            raise RateLimitError(str(e)) from e
+        if raise_errors:
+            raise
+        print(f"下载股票 {stock_code} 分钟数据失败 ({start_time} ~ {end_time}): {e}")
+        return None
+    if df is None or df.empty:
+        return pd.DataFrame()
+    df = df.rename(columns={'vol': 'volume'})
+    df['trade_time'] = df['trade_time'].astype(str)
+    if 'ts_code' not in df.columns:
+        df['ts_code'] = stock_code
+    return df.sort_values('trade_time', ignore_index=True)
+
+def merge_minute_frames(frames):
+#     """合并各窗口的分钟数据：按时间升序，去掉窗口边界上重复的K线"""
+    frames = [df for df in frames if df is not None and not df.empty]
+    if not frames:
+        return None
+    df = pd.concat(frames, ignore_index=True)
+    return df.drop_duplicates('trade_time').sort_values('trade_time', ignore_index=True)
+
 def save_data_to_csv(df, filepath):
 #     """将DataFrame保存为CSV文件，使用utf-8-sig编码"""
     df.to_csv(filepath, index=False, encoding='utf-8-sig')
-    print(f"数据已保存到: {filepath}")
\ No newline at end of file
+    print(f"数据已保存到: {filepath}")
+
+def save_data(df, filepath):
+#     """按文件扩展名保存下载数据（.csv/.parquet/.feather），格式由 Data01_config.STORAGE_FORMAT 决定"""
+    Data01_file_utils.save_data_file(df, filepath)
+    print(f"数据已保存到: {filepath}")
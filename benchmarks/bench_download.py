@@ -0,0 +1,114 @@
+# """
+# 下载引擎离线压测：用 FakePro 模拟 tushare，验证吞吐量与限流合规。
+# 用法：python benchmarks/bench_download.py --stocks 330 --workers 8 --rate 120 --window 5
+# （window 为限流窗口秒数，缩短窗口可在几秒内验证“每分钟调用上限”逻辑）
+# 加 --cache 时使用临时响应缓存再跑一遍，验证重复下载由本地缓存提供、不再调用接口。
+# --mode by_date/auto 比较按交易日全市场下载：如 --stocks 3000 --start 20251013 --end 20251017 --mode auto
+# --minutes 改为下载分钟数据（stk_mins 单次行数受限，按窗口分页），写入临时目录并校验无截断、无重复：
+#   python benchmarks/bench_download.py --minutes --stocks 20 --start 20230101 --end 20241231 --rate 100 --window 1
+# """
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import Data01_download_engine
+import Data01_file_utils
+import Data01_sync_planner
+import Data01_tushare_utils
+from Data01_fake_pro import FakePro
+
+
+def main():
+    parser = argparse.ArgumentParser(description="下载引擎离线压测")
+    parser.add_argument("--stocks", type=int, default=330, help="股票数量")
+    parser.add_argument("--workers", type=int, default=8, help="并发线程数")
+    parser.add_argument("--rate", type=int, default=120, help="每个窗口允许的调用次数")
+    parser.add_argument("--window", type=float, default=5.0, help="限流窗口（秒）")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟接口延迟（秒）")
+    parser.add_argument("--server-rate", type=int, default=None,
+                        help="模拟服务端的真实上限，默认与 --rate 相同；设小可测试退避")
+    parser.add_argument("--cache", action="store_true", help="使用临时响应缓存并重复下载一遍")
+    parser.add_argument("--start", default="20250101", help="起始日期")
+    parser.add_argument("--end", default="20251231", help="结束日期")
+    parser.add_argument("--mode", default="per_stock", choices=["per_stock", "by_date", "auto"],
+                        help="日线获取方式")
+    parser.add_argument("--minutes", action="store_true", help="下载分钟数据（分窗口、流式写盘）")
+    parser.add_argument("--row-limit", type=int, default=8000, help="模拟 stk_mins 单次返回行数上限")
+    args = parser.parse_args()
+
+    data_type = '分钟数据' if args.minutes else '日数据'
+    endpoint = Data01_tushare_utils.endpoint_for(data_type)
+    server_rate = args.server_rate or args.rate
+    pro = FakePro(latency=args.latency, rate_limits={endpoint: server_rate}, window=args.window,
+                  market_size=max(args.stocks, 5000), min_row_limit=args.row_limit)
+    cache_dir = tempfile.mkdtemp(prefix="bench_cache_") if args.cache else None
+    cache = Data01_tushare_utils.ResponseCache(os.path.join(cache_dir, "cache.db")) if args.cache else False
+    scheduler = Data01_download_engine.DownloadScheduler(
+        pro, workers=args.workers, rate_limits={endpoint: args.rate},
+        per=args.window, backoff_seconds=args.window / 10, log=lambda msg: None, cache=cache,
+        min_row_limit=args.row_limit)
+
+    plan = pd.DataFrame([[code, args.start, args.end, data_type] for code in pro.universe[:args.stocks]],
+                        columns=Data01_sync_planner.STOCK_LIST_COLUMNS)
+    # 分钟数据流式写入临时目录；日线只在内存中统计
+    save_dir = tempfile.mkdtemp(prefix="bench_minutes_") if args.minutes else ""
+    tasks = Data01_download_engine.build_tasks(plan, save_dir=save_dir)
+    if not args.minutes:
+        for task in tasks:
+            task.filepath = None
+    trade_dates = []
+    by_date = [False] * len(tasks)
+    if args.mode != "per_stock":
+        trade_dates = scheduler.trade_dates(args.start, args.end)
+        by_date, summary = Data01_sync_planner.choose_fetch_mode(plan, trade_dates, args.mode)
+        print(f"获取方式: {summary}")
+    per_stock_tasks = [task for task, flag in zip(tasks, by_date) if not flag]
+    by_date_tasks = [task for task, flag in zip(tasks, by_date) if flag]
+
+    failed = False
+    try:
+        for run in range(2 if args.cache else 1):
+            calls_before = len(pro.calls.get(endpoint, []))
+            start = time.perf_counter()
+            results = list(scheduler.run(per_stock_tasks)) + list(scheduler.run_by_date(by_date_tasks, trade_dates))
+            ok = sum(1 for result in results if result.ok)
+            seconds = time.perf_counter() - start
+            calls = len(pro.calls.get(endpoint, [])) - calls_before
+            rows = sum(result.rows for result in results)
+            print(f"第 {run + 1} 遍：成功 {ok}/{args.stocks}，用时 {seconds:.2f} 秒，"
+                  f"{ok / seconds:.1f} 只/秒，{rows / seconds:,.0f} 行/秒，接口调用 {calls} 次")
+            failed = failed or ok != args.stocks
+
+        peak = pro.max_calls_in_window(endpoint)
+        print(f"任意 {args.window:g} 秒窗口内最大调用次数 {peak}（上限 {server_rate}），"
+              f"被拒绝 {pro.rejected.get(endpoint, 0)} 次")
+        if args.minutes:
+            # 每只股票应有 240 根/工作日，时间唯一且升序
+            expected = 240 * len(pd.bdate_range(pd.to_datetime(args.start), pd.to_datetime(args.end)))
+            bad = 0
+            for task in tasks:
+                times = Data01_file_utils.read_data_file(task.filepath, columns=['trade_time'])['trade_time']
+                if len(times) != expected or not times.is_unique or not times.is_monotonic_increasing:
+                    bad += 1
+            print(f"分钟文件校验: {len(tasks) - bad}/{len(tasks)} 完整（每只 {expected} 行）")
+            failed = failed or bad > 0
+        if args.cache:
+            print(f"响应缓存: {cache.stats()}")
+            cache.close()
+    finally:
+        for path in (cache_dir, save_dir):
+            if path:
+                shutil.rmtree(path, ignore_errors=True)
+    if failed or peak > server_rate:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# """
+# 技术指标引擎基准：在临时SQLite数据库中生成 N 只股票、不同历史长度的日线，
+# 对每个历史长度分别测量
+#   全量计算    - 没有状态时为全部历史计算指标（Data01_indicators.IndicatorEngine.update(rebuild=True)）
+#   增量更新    - 每只股票追加一根K线后的 update()，只处理新K线
+#   逐只重算    - 原来的做法：逐只股票读取全部历史，用 pandas rolling / ewm 重新计算
+# 增量更新的耗时应基本不随历史长度增长。
+# 用法：python benchmarks/bench_indicators.py [--stocks 200] [--days 250 1000 4000] [--price raw]
+# """
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import Data01_config
+import Data01_db_utils
+import Data01_db_query
+import Data01_indicators
+
+
+def make_day_frame(ts_code, dates, rng):
+    """随机游走的日线（按日期升序）"""
+    n = len(dates)
+    close = np.round(10 * np.exp(np.cumsum(rng.normal(0, 0.02, n))), 2)
+    pre_close = np.append(close[:1], close[:-1])
+    return pd.DataFrame({
+        'ts_code': ts_code,
+        'trade_date': dates,
+        'open': pre_close,
+        'high': np.round(close * (1 + rng.random(n) * 0.02), 2),
+        'low': np.round(close * (1 - rng.random(n) * 0.02), 2),
+        'close': close,
+        'pre_close': pre_close,
+        'vol': rng.uniform(1e4, 1e6, n).round(2),
+        'amount': 1.0,
+    })
+
+
+def pandas_recompute(conn, codes, price):
+    """逐只股票读取全部历史，用 pandas 重新计算同样的指标（不写库），作为对照"""
+    for code in codes:
+        if price == 'hfq':
+            df = Data01_db_query.load_adjusted(code, fields=['high_hfq', 'low_hfq', 'close_hfq'], conn=conn,
+                                               use_cache=False)
+            df = df.rename(columns={'high_hfq': 'high', 'low_hfq': 'low', 'close_hfq': 'close'})
+        else:
+            df = Data01_db_query.load_day(code, fields=['high', 'low', 'close'], conn=conn, use_cache=False)
+        close, high, low = df['close'], df['high'], df['low']
+        spec = Data01_config.INDICATORS
+        for n in spec.get('ma', []):
+            close.rolling(n).mean()
+        for n in spec.get('ema', []):
+            close.ewm(span=n, adjust=False).mean()
+        change = close.diff()
+        for n in spec.get('rsi', []):
+            change.clip(lower=0).ewm(alpha=1 / n, adjust=False).mean()
+            (-change).clip(lower=0).ewm(alpha=1 / n, adjust=False).mean()
+        for fast, slow, signal in spec.get('macd', []):
+            dif = close.ewm(span=fast, adjust=False).mean() - close.ewm(span=slow, adjust=False).mean()
+            dif.ewm(span=signal, adjust=False).mean()
+        previous = close.shift()
+        true_range = pd.concat([high - low, (high - previous).abs(), (low - previous).abs()], axis=1).max(axis=1)
+        for n in spec.get('atr', []):
+            true_range.ewm(alpha=1 / n, adjust=False).mean()
+        for n in spec.get('vol', []):
+            np.log(close / previous).rolling(n).std()
+
+
+def run_case(stocks, days, price, work_dir):
+    db_path = os.path.join(work_dir, f"bench_{days}.db")
+    conn = sqlite3.connect(db_path)
+    rng = np.random.default_rng(days)
+    dates = pd.bdate_range('2000-01-03', periods=days + 1).strftime('%Y%m%d')
+    codes = [f"{i + 1:06d}" for i in range(stocks)]
+    frames = {code: make_day_frame(f"{code}.SZ", dates, rng) for code in codes}
+    for code, df in frames.items():
+        Data01_db_utils.import_day_data(conn, code, df.iloc[:-1])
+
+    engine = Data01_indicators.IndicatorEngine(conn, price=price)
+    full = engine.update(codes, rebuild=True)
+    # 每只股票追加一根K线
+    for code, df in frames.items():
+        Data01_db_utils.import_day_data(conn, code, df.iloc[-1:])
+    incremental = engine.update(codes)
+    start = time.perf_counter()
+    pandas_recompute(conn, codes, price)
+    naive_seconds = time.perf_counter() - start
+    conn.close()
+    return full, incremental, naive_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="技术指标引擎：全量计算 / 增量更新 / 逐只重算 耗时对比")
+    parser.add_argument("--stocks", type=int, default=200, help="股票数量")
+    parser.add_argument("--days", type=int, nargs="+", default=[250, 1000, 4000], help="各测试的历史长度（交易日）")
+    parser.add_argument("--price", choices=["raw", "hfq"], default="raw",
+                        help="指标使用的价格（hfq 时导入同时计算复权价格）")
+    args = parser.parse_args()
+
+    Data01_config.DB_TYPE = "sqlite"
+    Data01_config.DB_SCHEMA = "per_stock"
+    Data01_config.DERIVE_ADJUSTED = args.price == "hfq"
+    work_dir = tempfile.mkdtemp(prefix="bench_indicators_")
+    print(f"{args.stocks} 只股票，指标: {', '.join(Data01_indicators.indicator_columns())}")
+    print(f"{'历史长度':>8}{'全量计算(秒)':>14}{'增量更新(秒)':>14}{'增量行数':>10}{'逐只重算(秒)':>14}")
+    try:
+        incremental_seconds = []
+        for days in args.days:
+            full, incremental, naive_seconds = run_case(args.stocks, days, args.price, work_dir)
+            incremental_seconds.append(incremental['seconds'])
+            print(f"{days:>8}{full['seconds']:>14.3f}{incremental['seconds']:>14.3f}"
+                  f"{incremental['rows']:>10}{naive_seconds:>14.3f}")
+        if len(incremental_seconds) > 1:
+            growth = incremental_seconds[-1] / incremental_seconds[0] if incremental_seconds[0] > 0 else 0.0
+            history = args.days[-1] / args.days[0]
+            print(f"历史长度增加 {history:.0f} 倍，增量更新耗时变化 {growth:.2f} 倍")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+# """
+# 下载 → 保存文件 → 读取 → 导入数据库 全流程离线基准测试。
+# 用 FakePro 生成 N 只股票 × M 个交易日的日线（以及部分股票的分钟线），
+# 逐阶段记录耗时、行/秒、峰值内存，并与保存的基线比较以发现性能回退。
+# tracemalloc 会显著拖慢Python代码，因此计时与内存分两遍运行：第一遍只计时，第二遍只统计峰值内存。
+#
+# 用法：
+#   python benchmarks/bench_pipeline.py --save-baseline        # 生成/更新基线
+#   python benchmarks/bench_pipeline.py                        # 与基线比较，回退时退出码为1
+#   python benchmarks/bench_pipeline.py --stocks 500 --days 2500 --latency 0.05 --output result.json
+# """
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import Data01_config
+import Data01_db_utils
+import Data01_file_utils
+import Data01_download_engine
+from Data01_fake_pro import FakePro
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_pipeline.json")
+
+
+class StageTimer:
+#    """记录一个阶段的耗时与处理行数；trace=True 时改为记录该阶段的峰值内存"""
+    def __init__(self, results, name, trace=False):
+        self.results = results
+        self.name = name
+        self.trace = trace
+        self.rows = 0
+
+    def __enter__(self):
+        if self.trace:
+            tracemalloc.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        if self.trace:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.results[self.name] = {'peak_mb': round(peak / 1024 / 1024, 2)}
+            return False
+        self.results[self.name] = {
+            'rows': self.rows,
+            'seconds': round(seconds, 4),
+            'rows_per_sec': round(self.rows / seconds, 1) if seconds > 0 else 0.0,
+        }
+        return False
+
+
+def run_pipeline(args, work_dir, trace=False):
+    results = {}
+    end = pd.Timestamp("2025-12-31")
+    start = (end - pd.tseries.offsets.BDay(args.days - 1)).strftime('%Y%m%d')
+    end = end.strftime('%Y%m%d')
+    codes = [f"{600000 + i:06d}.SH" for i in range(args.stocks)]
+    pro = FakePro(latency=args.latency)
+
+    # 1. 下载（并发调度 + 模拟接口延迟）
+    tasks = [Data01_download_engine.DownloadTask(code, start, end, '日数据') for code in codes]
+    scheduler = Data01_download_engine.DownloadScheduler(
+        pro, workers=args.workers, rate_limits={'daily': 10 ** 9}, log=lambda msg: None, cache=False)
+    frames = {}
+    with StageTimer(results, 'download_day', trace) as stage:
+        for result in scheduler.run(tasks):
+            frames[result.task.stock_code] = result.df
+            stage.rows += len(result.df)
+
+    # 2. 保存文件
+    paths = {}
+    ext = Data01_file_utils.data_file_ext(args.format)
+    with StageTimer(results, f'save_{args.format}', trace) as stage:
+        for code, df in frames.items():
+            path = os.path.join(work_dir, f"{code}_day{ext}")
+            Data01_file_utils.save_data_file(df, path)
+            paths[code] = path
+            stage.rows += len(df)
+    del frames
+
+    # 3. 读取文件
+    loaded = {}
+    with StageTimer(results, f'read_{args.format}', trace) as stage:
+        for code, path in paths.items():
+            loaded[code] = Data01_file_utils.read_data_file(path)
+            stage.rows += len(loaded[code])
+
+    # 4. 导入数据库（SQLite，批量upsert）
+    Data01_config.SQLITE_DB_PATH = os.path.join(work_dir, "bench.db")
+    conn = Data01_db_utils.get_db_connection()
+    try:
+        with StageTimer(results, 'import_day', trace) as stage:
+            with Data01_db_utils.bulk_load(conn):
+                for code, df in loaded.items():
+                    stage.rows += Data01_db_utils.import_day_data(conn, code[:6], df)['rows']
+        del loaded
+
+        # 5. 分钟线：生成 + 导入
+        if args.min_stocks:
+            min_start = (pd.Timestamp(end) - pd.tseries.offsets.BDay(args.min_days - 1))
+            min_frames = {}
+            with StageTimer(results, 'download_min', trace) as stage:
+                for code in codes[:args.min_stocks]:
+                    df = pro.stk_mins(ts_code=code, freq='1min',
+                                      start_date=min_start.strftime('%Y-%m-%d 09:00:00'),
+                                      end_date=pd.Timestamp(end).strftime('%Y-%m-%d 15:00:00'))
+                    min_frames[code] = df.rename(columns={'vol': 'volume'})
+                    stage.rows += len(df)
+            with StageTimer(results, 'import_min', trace) as stage:
+                with Data01_db_utils.bulk_load(conn):
+                    for code, df in min_frames.items():
+                        stage.rows += Data01_db_utils.import_min_data(conn, code[:6], df)['rows']
+    finally:
+        conn.close()
+        Data01_db_utils.get_connection_manager().close_all()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """与基线比较：rows_per_sec 低于基线 (1 - tolerance) 倍视为回退"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base or not base.get('rows_per_sec'):
+            continue
+        ratio = current['rows_per_sec'] / base['rows_per_sec']
+        flag = ""
+        if ratio < 1 - tolerance:
+            flag = "  <-- 回退"
+            regressions.append(name)
+        print(f"  {name:<16}{ratio:>8.2f}x 基线{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="下载→文件→数据库 全流程离线基准测试")
+    parser.add_argument("--stocks", type=int, default=200, help="股票数量 N")
+    parser.add_argument("--days", type=int, default=2500, help="每只股票的交易日数 M")
+    parser.add_argument("--min-stocks", type=int, default=10, help="生成分钟线的股票数量（0 表示不测）")
+    parser.add_argument("--min-days", type=int, default=20, help="分钟线的交易日数")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟接口延迟（秒）")
+    parser.add_argument("--workers", type=int, default=Data01_config.DOWNLOAD_WORKERS, help="下载并发数")
+    parser.add_argument("--format", default="csv", choices=sorted(Data01_file_utils.DATA_FILE_EXTENSIONS),
+                        help="文件存储格式")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线文件路径")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的吞吐量下降比例")
+    parser.add_argument("--output", help="把本次结果写入JSON文件")
+    parser.add_argument("--no-memory", action="store_true", help="跳过峰值内存统计（只计时，速度快一倍）")
+    args = parser.parse_args()
+
+    passes = [False] if args.no_memory else [False, True]
+    results = {}
+    for trace in passes:
+        work_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+        try:
+            for name, item in run_pipeline(args, work_dir, trace).items():
+                results.setdefault(name, {'peak_mb': None}).update(item)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{'阶段':<16}{'行数':>10}{'秒':>10}{'行/秒':>14}{'峰值MB':>10}")
+    for name, item in results.items():
+        peak = f"{item['peak_mb']:.1f}" if item['peak_mb'] is not None else "-"
+        print(f"{name:<16}{item['rows']:>10}{item['seconds']:>10.3f}"
+              f"{item['rows_per_sec']:>14,.0f}{peak:>10}")
+
+    skip = ('baseline', 'output', 'save_baseline', 'no_memory')
+    report = {'params': {k: v for k, v in vars(args).items() if k not in skip},
+              'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("未找到基线文件，使用 --save-baseline 生成")
+        return
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('params') != report['params']:
+        print("注意：本次参数与基线不同，比较结果仅供参考")
+    print("与基线比较：")
+    regressions = compare(results, baseline['results'], args.tolerance)
+    if regressions:
+        print(f"发现性能回退: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+# """
+# 数据质量闸门基准：用 FakePro 生成日线，拼接为指定行数的DataFrame（日期降序，与tushare文件一致），
+# 按比例注入不合格的行，测量 Data01_quality.check_frame 的速度，并确认注入的行全部被检出。
+# 用法：python benchmarks/bench_quality.py [--rows 2000000] [--bad-ratio 0.001] [--repeat 3]
+# """
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import Data01_quality
+from Data01_fake_pro import FakePro
+
+
+def make_frame(rows, bad_ratio, rng):
+    """日线拼接为 rows 行，日期改为唯一的降序文本；随机选出的行分别破坏为几类不合格数据"""
+    one = FakePro().daily(ts_code='000001.SZ', start_date='20000101', end_date='20241231')
+    df = pd.concat([one] * (rows // len(one) + 1), ignore_index=True).iloc[:rows].copy()
+    df['trade_date'] = pd.Series(np.arange(rows, 0, -1)).map('{:09d}'.format).astype(str).to_numpy()
+    bad = rng.choice(rows, int(rows * bad_ratio), replace=False)
+    kinds = np.array_split(bad, 4)
+    high, low = df.columns.get_loc('high'), df.columns.get_loc('low')
+    df.iloc[kinds[0], high] = df.iloc[kinds[0], low] - 1
+    df.iloc[kinds[1], df.columns.get_loc('close')] = np.nan
+    df.iloc[kinds[2], df.columns.get_loc('pct_chg')] += 1
+    df.iloc[kinds[3], df.columns.get_loc('vol')] = -1
+    return df, len(bad)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据质量闸门的检查速度")
+    parser.add_argument("--rows", type=int, default=2000000, help="行数")
+    parser.add_argument("--bad-ratio", type=float, default=0.001, help="注入的不合格行比例")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数（取最快一次）")
+    args = parser.parse_args()
+
+    df, injected = make_frame(args.rows, args.bad_ratio, np.random.default_rng(0))
+    best = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        clean, rejected, counts = Data01_quality.check_frame(df, 'day')
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    print(f"{args.rows} 行，注入不合格行 {injected}，检出 {len(rejected)}，合格 {len(clean)}")
+    print(f"各原因: {counts}")
+    print(f"用时 {best:.3f} 秒，{args.rows / best:,.0f} 行/秒")
+    return 0 if len(rejected) == injected else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
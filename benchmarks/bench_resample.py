@@ -0,0 +1,107 @@
+# """
+# 分钟线合成基准：在临时SQLite数据库中生成 N 只股票、不同天数的1分钟线，对每个历史长度分别测量
+#   全量合成    - 全部历史合成各周期K线（Data01_resample.resample_all(rebuild=True)）
+#   增量合成    - 每只股票导入新一天的分钟线，导入时只合成新的分钟线
+#   逐只重算    - 逐只股票读取全部分钟线，用 pandas 按交易时段分组重新合成（不写库），作为对照
+# 增量合成的耗时应基本不随历史长度增长。
+# 用法：python benchmarks/bench_resample.py [--stocks 20] [--days 20 60 120]
+# """
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import Data01_config
+import Data01_db_utils
+import Data01_db_query
+import Data01_resample
+
+
+def make_min_frame(ts_code, days, rng):
+    """随机游走的1分钟线（每天 09:31-11:30、13:01-15:00 共240根，按时间升序）"""
+    offsets = np.concatenate([np.arange(571, 691), np.arange(781, 901)]) * 60 * 10 ** 9
+    times = (np.asarray(days, dtype='datetime64[ns]').astype(np.int64)[:, None] + offsets[None, :]).ravel()
+    n = len(times)
+    close = np.round(10 * np.exp(np.cumsum(rng.normal(0, 0.001, n))), 2)
+    volume = rng.integers(100, 100000, n).astype(float)
+    return pd.DataFrame({
+        'trade_time': pd.DatetimeIndex(times).strftime('%Y-%m-%d %H:%M:%S'),
+        'open': close,
+        'high': np.round(close * 1.001, 2),
+        'low': np.round(close * 0.999, 2),
+        'close': close,
+        'volume': volume,
+        'amount': np.round(volume * close, 2),
+        'ts_code': ts_code,
+    })
+
+
+def pandas_resample(conn, codes, minutes):
+    """逐只股票读取全部分钟线，用 pandas groupby 按 (日期, 交易时段内的周期) 重新合成"""
+    for code in codes:
+        df = Data01_db_query.load_min(code, conn=conn, use_cache=False)
+        minute = df['trade_time'].dt.hour * 60 + df['trade_time'].dt.minute
+        ordinal = Data01_resample.session_ordinals(minute.to_numpy())
+        for n in minutes:
+            keys = [df['trade_time'].dt.date, (ordinal - 1) // n]
+            grouped = df.groupby(keys, sort=False)
+            grouped.agg(open=('open', 'first'), high=('high', 'max'), low=('low', 'min'), close=('close', 'last'),
+                        volume=('volume', 'sum'), amount=('amount', 'sum'))
+
+
+def run_case(stocks, days, work_dir):
+    db_path = os.path.join(work_dir, f"bench_{days}.db")
+    conn = sqlite3.connect(db_path)
+    rng = np.random.default_rng(days)
+    trade_days = pd.bdate_range('2024-01-02', periods=days + 1)
+    codes = [f"{i + 1:06d}" for i in range(stocks)]
+    frames = {code: make_min_frame(f"{code}.SZ", trade_days, rng) for code in codes}
+    minutes = Data01_config.RESAMPLE_MINUTES
+    Data01_config.RESAMPLE_MINUTES = []
+    for code, df in frames.items():
+        Data01_db_utils.import_min_data(conn, code, df.iloc[:-240])
+    Data01_config.RESAMPLE_MINUTES = minutes
+
+    full = Data01_resample.resample_all(conn, codes, rebuild=True)
+    # 每只股票导入新一天的分钟线，导入时增量合成
+    incremental = 0.0
+    for code, df in frames.items():
+        stats = Data01_db_utils.import_min_data(conn, code, df.iloc[-240:])
+        incremental += stats['resampled']['seconds']
+    start = time.perf_counter()
+    pandas_resample(conn, codes, minutes)
+    naive_seconds = time.perf_counter() - start
+    conn.close()
+    return full, incremental, naive_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分钟线合成：全量合成 / 增量合成 / 逐只重算 耗时对比")
+    parser.add_argument("--stocks", type=int, default=20, help="股票数量")
+    parser.add_argument("--days", type=int, nargs="+", default=[20, 60, 120], help="各测试的历史天数")
+    args = parser.parse_args()
+
+    Data01_config.DB_TYPE = "sqlite"
+    Data01_config.DB_SCHEMA = "per_stock"
+    work_dir = tempfile.mkdtemp(prefix="bench_resample_")
+    print(f"{args.stocks} 只股票，合成周期: {Data01_config.RESAMPLE_MINUTES} 分钟")
+    print(f"{'历史天数':>8}{'分钟线行数':>12}{'全量合成(秒)':>14}{'增量合成(秒)':>14}{'逐只重算(秒)':>14}")
+    try:
+        for days in args.days:
+            full, incremental, naive_seconds = run_case(args.stocks, days, work_dir)
+            print(f"{days:>8}{args.stocks * days * 240:>12}{full['seconds']:>14.3f}{incremental:>14.3f}"
+                  f"{naive_seconds:>14.3f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
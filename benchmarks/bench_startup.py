@@ -0,0 +1,74 @@
+# """
+# 启动耗时检查：用 python -X importtime 在新进程中导入入口模块（默认 main），
+# 统计总导入耗时并列出最慢的模块；超过预算或启动时加载了重量级模块（pandas、tushare、数据库驱动等）时退出码为1。
+# 可放进CI或提交前检查，防止有人在模块顶层重新引入重量级导入。
+# 用法：python benchmarks/bench_startup.py [--module main] [--budget-ms 250] [--repeat 3] [--top 15]
+# """
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 这些模块应在首次使用时才导入（下载、连接数据库、读取文件），不应出现在启动阶段
+DEFERRED_MODULES = ["pandas", "numpy", "tushare", "pymysql", "pyodbc", "openpyxl", "pyarrow"]
+
+
+def measure(module):
+    """在新进程中导入 module，返回 (总耗时毫秒, [(累计毫秒, 自身毫秒, 模块名)], 已导入的模块名集合)"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{proc.stderr[-2000:]}")
+    total_us = 0
+    entries = []
+    names = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # 名称前的缩进表示嵌套层级，只累加顶层导入避免重复计算
+        if not name.startswith("  "):
+            total_us += int(cumulative_us)
+        name = name.strip()
+        names.add(name)
+        entries.append((int(cumulative_us) / 1000, int(self_us) / 1000, name))
+    return total_us / 1000, entries, names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="入口模块导入耗时检查（-X importtime）")
+    parser.add_argument("--module", default="main", help="要导入的入口模块")
+    parser.add_argument("--budget-ms", type=float, default=250.0, help="总导入耗时预算（毫秒，取多次的中位数）")
+    parser.add_argument("--repeat", type=int, default=3, help="测量次数")
+    parser.add_argument("--top", type=int, default=15, help="列出自身耗时最长的模块数")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(max(1, args.repeat))]
+    totals = [total for total, _, _ in runs]
+    median = statistics.median(totals)
+    _, entries, names = runs[0]
+
+    print(f"导入 {args.module}: 第一次（冷启动）{totals[0]:.1f} ms，"
+          f"中位数 {median:.1f} ms（{len(totals)} 次），预算 {args.budget_ms:.0f} ms")
+    print(f"{'自身(ms)':>10}{'累计(ms)':>10}  模块")
+    for cumulative_ms, self_ms, name in sorted(entries, key=lambda e: e[1], reverse=True)[:args.top]:
+        print(f"{self_ms:>10.1f}{cumulative_ms:>10.1f}  {name}")
+
+    failed = False
+    loaded = [name for name in DEFERRED_MODULES if name in names]
+    if loaded:
+        print(f"失败：启动时加载了应延迟导入的模块 {loaded}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"失败：导入耗时 {median:.1f} ms 超过预算 {args.budget_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print("通过")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# """
+# 存储格式对比：CSV 与 Parquet/Feather 的写入耗时、读取耗时、磁盘占用。
+# 默认使用 002_StockDownLoad 目录下的全部 CSV（列式文件写到临时目录，不影响原数据）。
+# 用法：python benchmarks/bench_storage.py [--dir 目录] [--compression zstd]
+# """
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Data01_config
+import Data01_file_utils
+
+
+def measure(frames, out_dir, fmt, compression):
+    """把 frames 写成 fmt 格式再读回，返回 (写入秒数, 读取秒数, 总字节数)"""
+    ext = Data01_file_utils.data_file_ext(fmt)
+    paths = [os.path.join(out_dir, name + ext) for name in frames]
+
+    start = time.perf_counter()
+    for (name, df), path in zip(frames.items(), paths):
+        Data01_file_utils.save_data_file(df, path, compression=compression)
+    write_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for path in paths:
+        Data01_file_utils.read_data_file(path)
+    read_seconds = time.perf_counter() - start
+
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+    return write_seconds, read_seconds, total_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV / Parquet / Feather 存储格式对比")
+    parser.add_argument("--dir", default=Data01_config.STOCK_DATA_DIR, help="CSV所在目录")
+    parser.add_argument("--compression", default=Data01_config.STORAGE_COMPRESSION, help="列式格式压缩算法")
+    args = parser.parse_args()
+
+    csv_files = Data01_file_utils.get_csv_files(args.dir)
+    if not csv_files:
+        print(f"目录中没有CSV文件: {args.dir}")
+        return
+
+    # 原始CSV读取（与Form2导入时一致的读法）
+    start = time.perf_counter()
+    frames = {os.path.splitext(os.path.basename(path))[0]: Data01_file_utils.read_data_file(path)
+              for path in csv_files}
+    csv_read = time.perf_counter() - start
+    csv_bytes = sum(os.path.getsize(path) for path in csv_files)
+    rows = sum(len(df) for df in frames.values())
+    print(f"{len(csv_files)} 个文件，共 {rows} 行")
+
+    results = [("csv(原文件)", None, csv_read, csv_bytes)]
+    out_dir = tempfile.mkdtemp(prefix="bench_storage_")
+    try:
+        results.append(("csv",) + measure(frames, out_dir, "csv", None))
+        for fmt in ("parquet", "feather"):
+            try:
+                results.append((fmt,) + measure(frames, out_dir, fmt, args.compression))
+            except Exception as e:
+                print(f"{fmt}: 跳过（{e}）")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    print(f"{'格式':<12}{'写入(秒)':>10}{'读取(秒)':>10}{'大小(MB)':>10}{'相对CSV':>10}")
+    for fmt, write_seconds, read_seconds, total_bytes in results:
+        write_str = f"{write_seconds:.3f}" if write_seconds is not None else "-"
+        print(f"{fmt:<12}{write_str:>10}{read_seconds:>10.3f}"
+              f"{total_bytes / 1024 / 1024:>10.2f}{total_bytes / csv_bytes:>10.1%}")
+
+
+if __name__ == '__main__':
+    main()
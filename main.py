@@ -1,5 +1,6 @@
 # """
 # 程序启动入口：创建 QApplication 并显示窗体1。
+# 无界面（定时任务、服务器）运行请使用 Data01_batch.py。
 # """
 
 import sys